@@ -0,0 +1,120 @@
+"""
+Measure shell completion latency against a large synthetic library.
+
+Each query is completed the way the 'add' prompt does on every keystroke:
+with an unindexed ILIKE scan, with the full-text search index, and with the
+shell's in-memory trigram index, whose build time and size are also reported.
+
+    python -m benchmarks.bench_completion [--tracks N [N ..]] [--limit N]
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+from sqlalchemy import insert
+
+import groove.db
+import groove.settings
+from groove.db.completion import TrigramIndex
+from groove.db.manager import DatabaseManager
+from benchmarks.bench_sqlite import _manager
+
+QUERIES = ('a', 'gu', 'gun', 'guns bl', 'psyence', 'track 4242', 'zzzz')
+
+WORDS = (
+    'guns', 'blazing', 'drums', 'death', 'psyence', 'fiction', 'bloodstain', 'rabbit', 'in', 'your', 'headlights',
+    'lonely', 'soul', 'nursery', 'rhyme', 'chaos', 'celestial', 'annihilation', 'main', 'title', 'theme', 'unkle',
+)
+
+
+def library(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    for i in range(count):
+        artist = ' '.join(rng.choice(WORDS) for _ in range(2)).title()
+        album = ' '.join(rng.choice(WORDS) for _ in range(3)).title()
+        title = ' '.join(rng.choice(WORDS) for _ in range(3)).title()
+        yield {
+            'artist': artist,
+            'title': f"{title} (Track {i})",
+            'relpath': f"{artist}/{album}/{i % 20:02d} {title} (Track {i}).flac",
+        }
+
+
+def populate(manager: DatabaseManager, count: int, batch: int = 10000) -> float:
+    started = time.perf_counter()
+    session = manager.writers()
+    rows = []
+    for row in library(count):
+        rows.append(row)
+        if len(rows) == batch:
+            session.execute(insert(groove.db.track), rows)
+            rows = []
+    if rows:
+        session.execute(insert(groove.db.track), rows)
+    session.commit()
+    manager.writers.remove()
+    return time.perf_counter() - started
+
+
+def ilike(session, query: str, limit: int):
+    column = groove.db.track.c.relpath
+    return session.query(groove.db.track).filter(column.ilike(f"%{query}%")).all()[:limit]
+
+
+def fts(session, query: str, limit: int):
+    return groove.db.search(session, groove.db.track, query, limit=limit)
+
+
+def build_index(session):
+    started = time.perf_counter()
+    TrigramIndex(groove.db.track.c.relpath).build(session)
+    elapsed = time.perf_counter() - started
+    # Tracing allocations slows the build down, so the index is sized separately.
+    tracemalloc.start()
+    index = TrigramIndex(groove.db.track.c.relpath).build(session)
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (index, elapsed, size)
+
+
+def timed(func, session, query, limit, repeat=5) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(session, query, limit)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    for count in args.tracks:
+        with tempfile.TemporaryDirectory() as root:
+            with _manager(Path(root), groove.settings.SQLITE_PRAGMAS) as manager:
+                elapsed = populate(manager, count)
+                print(f"Inserted {count} tracks in {elapsed:.1f}s")
+                session = manager.readers()
+                (index, elapsed, size) = build_index(session)
+                print(f"Built the in-memory index in {elapsed:.1f}s; {size / 2**20:.0f} MiB, "
+                      f"{size / count:.0f} bytes per track")
+                print(f"{'query':12s} {'ilike ms':>10s} {'fts ms':>10s} {'memory ms':>10s}")
+                for query in QUERIES:
+                    print(f"{query:12s} {timed(ilike, session, query, args.limit):10.2f} "
+                          f"{timed(fts, session, query, args.limit):10.2f} "
+                          f"{timed(lambda s, q, n: index.search(q, n), session, query, args.limit):10.2f}")
+                print()
+                manager.readers.remove()
+                manager.dispose()
+
+
+if __name__ == '__main__':
+    main()
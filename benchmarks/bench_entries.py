@@ -0,0 +1,117 @@
+"""
+Compare saving playlist edits by deleting and re-inserting every entry, the way
+Playlist.save_entries used to, with Playlist.save, which writes only the
+entries that changed and patches the playlist's snapshot to match.
+
+Each edit is applied to a fresh, snapshotted playlist of --entries entries and
+saved in one transaction; the time includes the commit. The 'add' rows compare
+appending tracks one commit at a time, the way the shell's add command used to,
+with Playlist.create_entries, which appends them all in one transaction.
+
+    python -m benchmarks.bench_entries [--entries N] [--add N]
+"""
+import argparse
+import tempfile
+import time
+
+from pathlib import Path
+
+from sqlalchemy import delete, func, insert
+
+import groove.db
+import groove.settings
+from groove.db import ordering
+from groove.playlist import Playlist
+from benchmarks.bench_completion import library
+from benchmarks.bench_sqlite import _manager
+
+
+def _move(ids):
+    return ids[1:] + ids[:1]
+
+
+EDITS = {
+    'unchanged': lambda ids: ids,
+    'append one': lambda ids: ids + [1],
+    'insert one': lambda ids: ids[:len(ids) // 2] + [1] + ids[len(ids) // 2:],
+    'remove one': lambda ids: ids[:len(ids) // 2] + ids[len(ids) // 2 + 1:],
+    'move one': _move,
+    'reverse all': lambda ids: ids[::-1],
+}
+
+
+def create(session, plid: int, entries: int) -> Playlist:
+    session.execute(insert(groove.db.playlist), {
+        'id': plid, 'name': f"Playlist {plid}", 'description': '', 'slug': f"playlist-{plid}"
+    })
+    session.execute(insert(groove.db.entry), [
+        {'playlist_id': plid, 'track': key, 'track_id': n % entries + 1}
+        for (n, key) in enumerate(ordering.keys(entries))
+    ])
+    session.commit()
+    Playlist.refresh_snapshots(session)
+    return Playlist.by_slug(f"playlist-{plid}", session)
+
+
+def rewrite(playlist: Playlist) -> None:
+    session = playlist.session
+    plid = playlist.record.id
+    session.execute(delete(groove.db.entry).where(groove.db.entry.c.playlist_id == plid))
+    session.execute(insert(groove.db.entry), [
+        {'playlist_id': plid, 'track_id': row.id, 'track': n} for (n, row) in enumerate(playlist._entries, start=1)
+    ])
+    session.commit()
+
+
+def save(playlist: Playlist) -> None:
+    playlist.save()
+
+
+def add_one_at_a_time(playlist: Playlist, tracks: list) -> None:
+    session = playlist.session
+    for row in tracks:
+        last = session.query(func.max(groove.db.entry.c.track)).filter_by(playlist_id=playlist.record.id).scalar()
+        session.execute(insert(groove.db.entry), {
+            'playlist_id': playlist.record.id, 'track_id': row.id, 'track': last + 1
+        })
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--add', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        with _manager(Path(root), groove.settings.SQLITE_PRAGMAS) as manager:
+            groove.settings.configure(manager.settings.replace(secret_key='fnord'))
+            session = manager.session
+            session.execute(insert(groove.db.track), list(library(args.entries)))
+            session.commit()
+            tracks = {row.id: row for row in session.query(groove.db.track)}
+
+            plid = 0
+            for (name, edit) in EDITS.items():
+                for write in (rewrite, save):
+                    plid += 1
+                    playlist = create(session, plid, args.entries)
+                    playlist._entries = [tracks[id] for id in edit([row.track_id for row in playlist.entries])]
+                    started = time.perf_counter()
+                    write(playlist)
+                    elapsed = time.perf_counter() - started
+                    print(f"{name:12s} {write.__name__:17s} {elapsed * 1000:8.1f}ms")
+
+            added = list(tracks.values())[:args.add]
+            for append in (add_one_at_a_time, Playlist.create_entries):
+                plid += 1
+                playlist = create(session, plid, args.entries)
+                started = time.perf_counter()
+                append(playlist, added)
+                elapsed = time.perf_counter() - started
+                print(f"{'add ' + str(args.add):12s} {append.__name__:17s} {elapsed * 1000:8.1f}ms")
+            manager.dispose()
+
+
+if __name__ == '__main__':
+    main()
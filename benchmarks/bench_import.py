@@ -0,0 +1,109 @@
+"""
+Measure saving a long playlist from the editor against a large library.
+
+Resolves every "artist": "title" line of the playlist with one query per line,
+the way Playlist.from_yaml used to, and with a few set-based queries, then
+times the whole edit: reading the lines, comparing them with the saved
+playlist and saving the changes. Finally, times writing the playlist out for
+the editor and reading it back, the way the editor used to (building one
+string, then parsing it with PyYAML's pure-Python loader) and the way it does
+now (streaming the entries, then parsing them with libyaml, if available).
+
+    python -m benchmarks.bench_import [--tracks N] [--lines N]
+"""
+import argparse
+import tempfile
+import time
+import yaml
+
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from sqlalchemy import insert
+
+import groove.db
+import groove.settings
+from groove.editor import EDITOR_TEMPLATE, PlaylistEditor
+from groove.playlist import Playlist
+from benchmarks.bench_completion import library
+from benchmarks.bench_sqlite import _manager
+
+
+def one_query_per_line(session, entries: list) -> list:
+    return [
+        session.query(groove.db.track).filter(
+            groove.db.track.c.artist == artist, groove.db.track.c.title == title
+        ).one()
+        for (artist, title) in entries
+    ]
+
+
+def set_based(session, entries: list) -> list:
+    return Playlist('Benchmark', session=session)._get_tracks_by_artist_and_title(entries)
+
+
+def concatenated(playlist: Playlist, path: Path) -> dict:
+    entries = ''
+    for entry in playlist.entries:
+        entries += f'  - "{entry.artist}": "{entry.title}"\n'
+    path.write_bytes(EDITOR_TEMPLATE.format(name=playlist.name, description='', entries=entries).encode())
+    with open(path, 'rb') as fh:
+        return yaml.safe_load(fh)
+
+
+def streamed(playlist: Playlist, path: Path) -> dict:
+    editor = PlaylistEditor()
+    with editor.path as fh:
+        playlist.write_yaml(fh)
+    try:
+        return editor.read()
+    finally:
+        editor.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=100000)
+    parser.add_argument('--lines', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        with _manager(Path(root), groove.settings.SQLITE_PRAGMAS) as manager:
+            groove.settings.configure(manager.settings)
+            session = manager.session
+            session.execute(insert(groove.db.track), [
+                dict(row, artist=f"Artist {n % 1000}", title=f"Title {n}")
+                for (n, row) in enumerate(library(args.tracks))
+            ])
+            session.commit()
+            step = max(args.tracks // args.lines, 1)
+            entries = [(f"Artist {n % 1000}", f"Title {n}") for n in range(0, args.tracks, step)][:args.lines]
+
+            for resolve in (one_query_per_line, set_based):
+                started = time.perf_counter()
+                tracks = resolve(session, entries)
+                elapsed = time.perf_counter() - started
+                print(f"{resolve.__name__:18s} {elapsed * 1000:8.1f}ms ({len(tracks)} lines, {args.tracks} tracks)")
+
+            playlist = Playlist('Benchmark', session=session, create_ok=True)
+            playlist.save()
+            for (name, lines) in (('new', entries), ('edited', entries[1:] + entries[:1])):
+                playlist._editor = MagicMock(edit=MagicMock(return_value={
+                    'Benchmark': {'description': '', 'entries': [{artist: title} for (artist, title) in lines]}
+                }))
+                started = time.perf_counter()
+                playlist.edit()
+                elapsed = time.perf_counter() - started
+                print(f"{'edit (' + name + ')':18s} {elapsed * 1000:8.1f}ms ({len(playlist.entries)} entries saved)")
+
+            for round_trip in (concatenated, streamed):
+                started = time.perf_counter()
+                edits = round_trip(playlist, Path(root) / 'playlist.yaml')
+                elapsed = time.perf_counter() - started
+                entries = len(edits['Benchmark']['entries'])
+                print(f"{round_trip.__name__:18s} {elapsed * 1000:8.1f}ms ({entries} entries)")
+            manager.dispose()
+
+
+if __name__ == '__main__':
+    main()
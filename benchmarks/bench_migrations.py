@@ -0,0 +1,78 @@
+"""
+Measure how long it takes to upgrade a large database created before schema
+migrations, and the longest any other writer would wait on the upgrade.
+
+    python -m benchmarks.bench_migrations [--tracks N] [--batch-size N]
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+import groove.settings
+from groove.db import migrations
+from groove.db.manager import apply_pragmas
+from benchmarks.bench_completion import library
+
+# The schema as it was created before migrations were introduced.
+LEGACY_SCHEMA = [
+    "CREATE TABLE track (id INTEGER NOT NULL PRIMARY KEY, relpath TEXT UNIQUE, artist TEXT, title TEXT)",
+    "CREATE TABLE playlist (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR, description TEXT, slug VARCHAR UNIQUE)",
+    "CREATE TABLE entry (track INTEGER NOT NULL, playlist_id INTEGER REFERENCES playlist (id), "
+    "track_id INTEGER REFERENCES track (id), PRIMARY KEY (playlist_id, track))",
+    "INSERT INTO playlist (id, name, description, slug) VALUES (1, 'bench', '', 'bench')",
+]
+
+
+def legacy_database(path: Path, count: int):
+    engine = apply_pragmas(create_engine(f"sqlite:///{path}", future=True), groove.settings.SQLITE_PRAGMAS)
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(
+            "INSERT INTO track (relpath, artist, title) VALUES (?, ?, ?)",
+            [(row['relpath'], row['artist'], row['title']) for row in library(count)]
+        )
+    return engine
+
+
+def writer(engine, stop: threading.Event, waits: list):
+    """
+    Keep writing to the database the way the shell does, recording how long each write waits.
+    """
+    while not stop.is_set():
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE playlist SET description = description WHERE id = 1")
+        waits.append(time.perf_counter() - started)
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=migrations.BATCH_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        engine = legacy_database(Path(root) / 'groove_on_demand.db', args.tracks)
+        stop = threading.Event()
+        waits = []
+        thread = threading.Thread(target=writer, args=(engine, stop, waits))
+        thread.start()
+        started = time.perf_counter()
+        applied = migrations.migrate(engine, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        thread.join()
+        engine.dispose()
+    print(f"Applied {applied} migrations to {args.tracks} tracks in {elapsed:.1f}s "
+          f"(batches of {args.batch_size}); the longest concurrent write waited {max(waits) * 1000:.0f}ms.")
+
+
+if __name__ == '__main__':
+    main()
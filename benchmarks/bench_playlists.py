@@ -0,0 +1,67 @@
+"""
+Compare listing playlists one at a time, the way the shell's 'list' command
+used to, with summarizing them all in one query.
+
+    python -m benchmarks.bench_playlists [--playlists N] [--entries N]
+"""
+import argparse
+import tempfile
+import time
+
+from pathlib import Path
+
+from sqlalchemy import insert
+
+import groove.db
+import groove.settings
+from groove.playlist import Playlist
+from benchmarks.bench_completion import library
+from benchmarks.bench_sqlite import _manager
+
+
+def populate(session, playlists: int, entries: int) -> None:
+    session.execute(insert(groove.db.track), [
+        dict(row, duration=180.0) for row in library(entries * 10)
+    ])
+    session.execute(insert(groove.db.playlist), [
+        {'id': i, 'name': f"Playlist {i}", 'description': '', 'slug': f"playlist-{i}"}
+        for i in range(1, playlists + 1)
+    ])
+    session.execute(insert(groove.db.entry), [
+        {'playlist_id': i, 'track': n, 'track_id': (i + n) % (entries * 10) + 1}
+        for i in range(1, playlists + 1) for n in range(entries)
+    ])
+    session.commit()
+
+
+def one_at_a_time(session) -> int:
+    tracks = 0
+    query = session.query(groove.db.playlist)
+    for row in groove.db.windowed_query(query, groove.db.playlist.c.id, 1000):
+        tracks += len(Playlist.from_row(row, session).entries)
+    return tracks
+
+
+def summaries(session) -> int:
+    return sum(pl.tracks for pl in Playlist.summaries(session))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--playlists', type=int, default=5000)
+    parser.add_argument('--entries', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        with _manager(Path(root), groove.settings.SQLITE_PRAGMAS) as manager:
+            populate(manager.session, args.playlists, args.entries)
+            for func in (one_at_a_time, summaries):
+                started = time.perf_counter()
+                tracks = func(manager.session)
+                elapsed = time.perf_counter() - started
+                print(f"{func.__name__:14s} {elapsed * 1000:8.1f}ms ({args.playlists} playlists, {tracks} entries)")
+            manager.dispose()
+
+
+if __name__ == '__main__':
+    main()
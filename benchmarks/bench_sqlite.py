@@ -0,0 +1,139 @@
+"""
+Compare SQLite's stock configuration with the Groove on Demand PRAGMA profile.
+
+For each profile, the benchmark imports tracks the way 'groove scan' does (one
+lookup, insert and commit per track), then loads a playlist from several reader
+threads while a scan is in progress, recording read latency and any 'database
+is locked' errors.
+
+    python -m benchmarks.bench_sqlite [--tracks N] [--readers N] [--seconds N]
+"""
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.exc import NoResultFound, OperationalError
+
+import groove.db
+import groove.settings
+from groove.db.manager import DatabaseManager
+from groove.playlist import Playlist
+
+PROFILES = {
+    'stock': (('journal_mode', 'delete'), ('synchronous', 'full'), ('busy_timeout', '5000')),
+    'groove': groove.settings.SQLITE_PRAGMAS,
+}
+
+
+def _manager(root: Path, pragmas: tuple) -> DatabaseManager:
+    settings = groove.settings.Settings(
+        media_root=root,
+        cache_root=root,
+        static_root=root,
+        themes_root=root,
+        assets_root=root,
+        database=root / 'groove_on_demand.db',
+        sqlite_pragmas=pragmas,
+    )
+    return DatabaseManager(settings=settings)
+
+
+def _import(session, relpath: str) -> None:
+    try:
+        session.query(groove.db.track).filter(groove.db.track.c.relpath == relpath).one()
+        return
+    except NoResultFound:
+        pass
+    session.execute(insert(groove.db.track), {'artist': 'Artist', 'title': relpath, 'relpath': relpath})
+    session.commit()
+
+
+def bench_inserts(manager: DatabaseManager, count: int, prefix: str = 'track') -> float:
+    session = manager.writers()
+    started = time.perf_counter()
+    for i in range(count):
+        _import(session, f"{prefix}/{i:07d}.flac")
+    elapsed = time.perf_counter() - started
+    manager.writers.remove()
+    return elapsed
+
+
+def bench_reads(manager: DatabaseManager, readers: int, seconds: float) -> dict:
+    session = manager.writers()
+    session.execute(insert(groove.db.playlist), {'id': 1, 'name': 'bench', 'description': '', 'slug': 'bench'})
+    session.execute(insert(groove.db.entry), [
+        {'playlist_id': 1, 'track': i, 'track_id': i} for i in range(1, 51)
+    ])
+    session.commit()
+    manager.writers.remove()
+
+    latencies = []
+    errors = []
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def read():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                playlist = Playlist.by_slug('bench', session=manager.readers())
+                assert len(playlist.entries) == 50
+            except OperationalError as e:
+                with lock:
+                    errors.append(e)
+            else:
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                manager.readers.remove()
+
+    def scan():
+        i = 0
+        while not stop.is_set():
+            bench_inserts(manager, 50, prefix=f"scan{i}")
+            i += 1
+
+    threads = [threading.Thread(target=scan)] + [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'reads': len(latencies),
+        'errors': len(errors),
+        'median_ms': statistics.median(latencies) * 1000 if latencies else 0,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracks', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':8s} {'inserts/s':>10s} {'reads/s':>10s} {'median ms':>10s} {'p99 ms':>10s} {'locked':>7s}")
+    for (name, pragmas) in PROFILES.items():
+        with tempfile.TemporaryDirectory() as root:
+            with _manager(Path(root), pragmas) as manager:
+                elapsed = bench_inserts(manager, args.tracks)
+                reads = bench_reads(manager, args.readers, args.seconds)
+                manager.dispose()
+        print(
+            f"{name:8s} {args.tracks / elapsed:10.0f} {reads['reads'] / args.seconds:10.0f} "
+            f"{reads['median_ms']:10.2f} {reads['p99_ms']:10.2f} {reads['errors']:7d}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,12 @@
 import logging
-import os
+
+import groove.settings
 
 
 def is_authenticated(username: str, password: str) -> bool:
     """
-    Returns True if the supplied username/password matches the environment.
+    Returns True if the supplied username/password matches the configured credentials.
     """
     logging.debug(f"Authentication attempt for {username}, {password}")
-    return (username == os.environ.get('USERNAME') and password == os.environ.get('PASSWORD'))
+    settings = groove.settings.get()
+    return (username == settings.username and password == settings.password)
@@ -0,0 +1,374 @@
+import glob
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm.session import Session
+
+import groove.db
+import groove.settings
+
+# The least time, in seconds, between reloads of a set of known keys prompted by lookups of unknown keys, which bounds
+# how long a key added by another process can go unrecognized, and how often a burst of misses can reach the database.
+REFRESH_INTERVAL = 10
+
+# The least time, in seconds, between log messages about lookups of unknown keys.
+MISS_LOG_INTERVAL = 60
+
+
+class PageCache:
+    """
+    SYNOPSIS
+
+        A bounded, thread-safe, in-process cache of rendered pages, optionally backed
+        by files on disk so that rendered pages survive a restart.
+
+    USAGE
+
+        PageCache([ARGS])
+
+    ARGS
+
+        size        The maximum number of pages held in memory. 0 disables the cache.
+        path        A directory in which to store rendered pages. Defaults to None,
+                    which disables the on-disk tier.
+
+    EXAMPLES
+
+        cache = PageCache(size=100)
+        cache.set('playlist-one', '"3f2a..."', '<html>...')
+        cache.get('playlist-one', '"3f2a..."')
+        >>> '<html>...'
+
+    Keys are opaque strings that identify a single version of a page, such as the
+    page's ETag, so stale pages are never returned; invalidate() merely reclaims
+    the space they occupy. Only the latest version of each page is kept on disk,
+    since its key can change without the page being invalidated, eg. when the
+    templates are edited.
+    """
+
+    def __init__(self, size: int = 256, path: Union[Path, None] = None) -> None:
+        self._size = size
+        self._path = path
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        if self._path:
+            self._path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def path(self) -> Union[Path, None]:
+        return self._path
+
+    def _filename(self, slug: str, key: str) -> Path:
+        return self._path / Path(f"{slug}.{key.strip(chr(34))}.html")
+
+    def get(self, slug: str, key: str) -> Union[str, None]:
+        if not self._size:
+            return None
+        with self._lock:
+            page = self._pages.get((slug, key))
+            if page is not None:
+                self._pages.move_to_end((slug, key))
+                return page
+        if not self._path:
+            return None
+        try:
+            page = self._filename(slug, key).read_text()
+        except OSError:
+            return None
+        logging.debug(f"Loaded rendered page {slug} from disk.")
+        self._remember(slug, key, page)
+        return page
+
+    def set(self, slug: str, key: str, page: str) -> None:
+        if not self._size:
+            return
+        self._remember(slug, key, page)
+        if not self._path:
+            return
+        filename = self._filename(slug, key)
+        tmp = filename.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_text(page)
+            os.replace(tmp, filename)
+        except OSError as e:  # pragma: no cover
+            logging.warning(f"Could not write rendered page {slug} to disk: {e}")
+            return
+        self._unlink(slug, keep=filename)
+
+    def _remember(self, slug: str, key: str, page: str) -> None:
+        with self._lock:
+            self._pages[(slug, key)] = page
+            self._pages.move_to_end((slug, key))
+            while len(self._pages) > self._size:
+                self._pages.popitem(last=False)
+
+    def invalidate(self, slug: str) -> None:
+        """
+        Discard every cached version of the page identified by slug.
+        """
+        with self._lock:
+            for cached in [cached for cached in self._pages if cached[0] == slug]:
+                del self._pages[cached]
+        if self._path:
+            self._unlink(slug)
+
+    def _unlink(self, slug: str, keep: Union[Path, None] = None) -> None:
+        """
+        Delete the files holding the versions of the page identified by slug, except keep.
+        """
+        for filename in glob.glob(str(self._path / Path(f"{glob.escape(slug)}.*.html"))):
+            if keep and filename == str(keep):
+                continue
+            try:
+                os.unlink(filename)
+            except OSError:  # pragma: no cover
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+
+
+class KnownKeys:
+    """
+    SYNOPSIS
+
+        A thread-safe, in-process set of the keys that exist in the database, such as
+        playlist slugs, so that requests for keys that don't exist can be rejected
+        without querying it.
+
+    USAGE
+
+        KnownKeys(NAME, QUERY, [ARGS])
+
+    ARGS
+
+        name        What the keys are, for log messages.
+        query       A function returning every key, given a database session.
+        interval    The least time between reloads prompted by unknown keys. Defaults
+                    to REFRESH_INTERVAL.
+
+    EXAMPLES
+
+        slugs = KnownKeys('playlist slugs', lambda session: session.scalars(...))
+        slugs.contains('playlist-one', session)
+        >>> True
+        slugs.contains('wp-login.php', session)
+        >>> False
+
+    The keys are loaded by the first lookup. Keys added or removed by this process
+    are recorded with add() and discard(); keys added by another process are found
+    when an unknown key prompts a reload, which happens at most once per interval.
+    A key that has been removed by another process is still reported as known, and
+    its lookup falls through to the database, until the next reload.
+    """
+
+    def __init__(self, name: str, query: Callable[[Session], Iterable], interval: float = REFRESH_INTERVAL) -> None:
+        self._name = name
+        self._query = query
+        self._interval = interval
+        self._keys = None
+        self._loaded = 0
+        self._misses = 0
+        self._logged = 0
+        self._lock = threading.Lock()
+
+    def load(self, session: Session) -> int:
+        """
+        (Re)load every key from the database, returning the number of keys.
+        """
+        with self._lock:
+            self._loaded = time.monotonic()
+        return len(self._reload(session))
+
+    def _reload(self, session: Session) -> set:
+        keys = set(self._query(session))
+        with self._lock:
+            self._keys = keys
+        logging.debug(f"Loaded {len(keys)} {self._name}.")
+        return keys
+
+    def contains(self, key: Hashable, session: Session) -> bool:
+        keys = self._keys
+        if keys is not None and key in keys:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            # Only one thread reloads; the others reject the keys they don't know in the meantime.
+            reload = keys is None or now - self._loaded >= self._interval
+            if reload:
+                self._loaded = now
+        if reload and key in self._reload(session):
+            return True
+        self._missed(key)
+        return False
+
+    def add(self, key: Hashable) -> None:
+        with self._lock:
+            if self._keys is not None:
+                self._keys.add(key)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if self._keys is not None:
+                self._keys.discard(key)
+
+    def _missed(self, key: Hashable) -> None:
+        """
+        Count a lookup of an unknown key, logging the count at most once every MISS_LOG_INTERVAL seconds, so that a
+        burst of requests for keys that don't exist can't flood the log.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._misses += 1
+            if self._logged and now - self._logged < MISS_LOG_INTERVAL:
+                return
+            (misses, self._misses, self._logged) = (self._misses, 0, now)
+        logging.info(f"Rejected {misses} lookup(s) of unknown {self._name}, most recently {key!r}.")
+
+
+class Bitmap:
+    """
+    A set of non-negative integers held in a bit apiece, up to the highest, so that a
+    million database ids cost about 125KB rather than the tens of megabytes a set of
+    ints would.
+    """
+
+    def __init__(self, ids: Iterable[int] = ()) -> None:
+        self._bits = bytearray()
+        self._count = 0
+        self.highest = 0
+        for i in ids:
+            self.add(i)
+
+    def __contains__(self, i: object) -> bool:
+        if not isinstance(i, int) or i < 0 or i >> 3 >= len(self._bits):
+            return False
+        return bool(self._bits[i >> 3] & 1 << (i & 7))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, i: int) -> None:
+        if i >> 3 >= len(self._bits):
+            # Grow geometrically, so that loading ids in ascending order doesn't copy the bitmap for every byte.
+            self._bits.extend(bytes(max((i >> 3) + 1 - len(self._bits), len(self._bits))))
+        if not self._bits[i >> 3] & 1 << (i & 7):
+            self._bits[i >> 3] |= 1 << (i & 7)
+            self._count += 1
+        self.highest = max(self.highest, i)
+
+    def discard(self, i: int) -> None:
+        if i in self:
+            self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xff
+            self._count -= 1
+
+
+class KnownIds(KnownKeys):
+    """
+    SYNOPSIS
+
+        KnownKeys for integer primary keys, held in a Bitmap. A reload prompted by an
+        unknown id fetches only the ids higher than any already known, so a burst of
+        lookups of ids that don't exist costs one cheap indexed query per interval,
+        not a reload of the whole table.
+
+    USAGE
+
+        KnownIds(NAME, QUERY, [ARGS])
+
+    ARGS
+
+        name        What the ids are, for log messages.
+        query       A function returning the ids higher than its second argument,
+                    given a database session.
+        interval    The least time between reloads prompted by unknown ids. Defaults
+                    to REFRESH_INTERVAL.
+
+    This relies on new rows being given ids higher than any existing one, as an
+    autoincrementing primary key does. An id removed by another process is still
+    reported as known until the next call to load().
+    """
+
+    def load(self, session: Session) -> int:
+        with self._lock:
+            self._keys = None
+        return super().load(session)
+
+    def _reload(self, session: Session) -> Bitmap:
+        with self._lock:
+            keys = self._keys
+        if keys is None:
+            keys = Bitmap(self._query(session, 0))
+            with self._lock:
+                self._keys = keys
+            logging.debug(f"Loaded {len(keys)} {self._name}.")
+            return keys
+        added = list(self._query(session, keys.highest))
+        with self._lock:
+            for i in added:
+                keys.add(i)
+        logging.debug(f"Loaded {len(added)} new {self._name}.")
+        return keys
+
+
+_pages = None
+_slugs = None
+_tracks = None
+
+
+def pages() -> PageCache:
+    """
+    Return the rendered page cache, configured from the current settings on first use.
+    """
+    global _pages
+    if _pages is None:
+        settings = groove.settings.get()
+        path = None
+        if settings.page_cache_disk:
+            path = settings.cache_root / Path('pages')
+        _pages = PageCache(size=settings.page_cache_size, path=path)
+    return _pages
+
+
+def known_slugs() -> KnownKeys:
+    """
+    Return the slugs of the playlists in the database.
+    """
+    global _slugs
+    if _slugs is None:
+        _slugs = KnownKeys('playlist slugs', lambda session: session.scalars(select(groove.db.playlist.c.slug)))
+    return _slugs
+
+
+def known_tracks() -> KnownIds:
+    """
+    Return the ids of the tracks in the database.
+    """
+    global _tracks
+    if _tracks is None:
+        _tracks = KnownIds('track ids', lambda session, after: session.scalars(
+            select(groove.db.track.c.id).where(groove.db.track.c.id > after)
+        ))
+    return _tracks
+
+
+def reset() -> None:
+    """
+    Discard the page cache and the known keys, so that they are reconfigured or reloaded on next use.
+    """
+    global _pages, _slugs, _tracks
+    _pages = None
+    _slugs = None
+    _tracks = None
@@ -12,11 +12,12 @@ from dotenv import load_dotenv
 from rich import print
 from rich.logging import RichHandler
 
-import groove.path
+import groove.settings
 
 from groove.shell import interactive_shell
+from groove.db import counters
 from groove.db.manager import database_manager
-from groove.webserver import webserver
+from groove.webserver import assets, webserver
 from groove.exceptions import ConfigurationError
 from groove.console import Console
 
@@ -41,28 +42,100 @@ TRANSCODER=/usr/bin/ffmpeg -i INFILE -c:v libvpx-vp9 -crf 30 -b:v 0 -b:a 256k -c
 # where to cache transcoded media files
 CACHE_ROOT=~/.groove/cache
 
+# where 'groove assets build' writes minified, fingerprinted and precompressed
+# static assets. Defaults to CACHE_ROOT/assets. Run the build again (and send
+# the server SIGHUP) whenever a theme changes.
+#ASSETS_PATH=~/.groove/cache/assets
+
 # where to store the groove_on_demand.db sqlite database.
 DATABASE_PATH=~
 
+# The number of read-only database connections each server process keeps open
+# for serving pages and tracks. Changes always go through a single connection.
+DB_POOL_SIZE=8
+
+# Override the PRAGMAs applied to each database connection, as a comma-separated
+# list. The defaults are journal_mode=wal, synchronous=normal, mmap_size=268435456,
+# cache_size=-16384, temp_store=memory and busy_timeout=5000. Write-ahead logging
+# lets 'groove scan' and the server use the database at the same time.
+#SQLITE_PRAGMAS=mmap_size=0,busy_timeout=10000
+
 # Try 'groove themes' to see a list of available themes.
 DEFAULT_THEME=blue_train
 
+# How often, in seconds, the server checks themes for changes. Set to 0 to
+# only reload themes when the server receives SIGHUP.
+THEME_RELOAD_INTERVAL=5
+
 # Web interface configuration
 HOST=127.0.0.1
 PORT=2323
 
+# The number of server processes. Each is multi-threaded; see the README for
+# advice on sizing them. With REUSE_PORT set, each worker binds its own socket
+# and the kernel balances connections between them. Workers are replaced after
+# serving MAX_REQUESTS requests (0 means never). On SIGHUP or shutdown, workers
+# get GRACEFUL_TIMEOUT seconds to finish the downloads in progress.
+WORKERS=1
+#REUSE_PORT=1
+MAX_REQUESTS=0
+GRACEFUL_TIMEOUT=30
+
+# Set ASGI to serve with uvicorn (pip install uvicorn) instead, so that slow
+# downloads wait on the event loop rather than occupying a thread each.
+# ASGI_THREADS handles requests and reads files.
+#ASGI=1
+ASGI_THREADS=32
+
 # The URL to use when constructing links. Defaults to http://HOST:PORT.
 #BASE_URL=http://127.0.0.1:2323
 
+# The number of rendered playlist pages to keep in memory; 0 disables the
+# cache. Set PAGE_CACHE_DISK to also keep rendered pages in CACHE_ROOT/pages,
+# so they survive a restart.
+PAGE_CACHE_SIZE=256
+#PAGE_CACHE_DISK=1
+
+# Let a reverse proxy serve tracks and static assets. Set this to
+# X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd); Groove on Demand
+# will then only verify requests and resolve paths. For nginx, the files are
+# redirected to internal locations beneath SENDFILE_PREFIX: /media, /cache,
+# /themes, /static and /assets, corresponding to MEDIA_ROOT, CACHE_ROOT, the
+# installed theme and static asset directories, and ASSETS_PATH (if it is
+# outside CACHE_ROOT). Turn on gzip_static and brotli_static for the location
+# holding the built assets so that nginx serves their precompressed copies.
+#SENDFILE_HEADER=X-Accel-Redirect
+#SENDFILE_PREFIX=/_groove
+
 # Set this to a suitably random string.
 SECRET_KEY=
 
+# To rotate SECRET_KEY without breaking links already handed out, move the old
+# key here before setting a new one.
+#PREVIOUS_SECRET_KEY=
+
+# If non-zero, track links expire after between SIGNATURE_TTL and twice that
+# many seconds. SIGNATURE_CACHE_SIZE is the number of signatures to remember.
+SIGNATURE_TTL=0
+SIGNATURE_CACHE_SIZE=4096
+
 # Console configuration
 EDITOR=vim
 CONSOLE_WIDTH=auto
+
+# The interactive shell completes track and playlist names as you type by
+# querying the database's search index. Set this to 1 to keep the names in
+# memory instead, which makes completion faster but takes about half a kilobyte
+# of memory per track, and a couple of seconds per 100,000 tracks when the shell
+# starts; only worthwhile for small libraries.
+COMPLETION_INDEX=0
 """
 
 app = typer.Typer()
+assets_app = typer.Typer()
+app.add_typer(assets_app, name='assets', help="Manage the web server's static assets.")
+db_app = typer.Typer()
+app.add_typer(db_app, name='db', help="Maintain the Groove on Demand database.")
 
 
 @app.callback()
@@ -73,12 +146,12 @@ def main(
         help="Path to the Groove on Demand environment",
     )
 ):
-    load_dotenv(root.expanduser() / Path('defaults'))
+    config_file = root.expanduser() / Path('defaults')
+    load_dotenv(config_file)
     load_dotenv(stream=io.StringIO(SETUP_HELP))
-    debug = os.getenv('DEBUG', None)
     logging.basicConfig(
         format='%(message)s',
-        level=logging.DEBUG if debug else logging.INFO,
+        level=logging.DEBUG if os.getenv('DEBUG', None) else logging.INFO,
         handlers=[
             RichHandler(rich_tracebacks=True, tracebacks_suppress=[typer])
         ]
@@ -86,10 +159,7 @@ def main(
     logging.getLogger('asyncio').setLevel(logging.ERROR)
 
     try:
-        groove.path.media_root()
-        groove.path.static_root()
-        groove.path.themes_root()
-        groove.path.database()
+        groove.settings.configure(groove.settings.Settings.from_environ(config_file=config_file))
     except ConfigurationError as e:
         sys.stderr.write(f'{e}\n\n{SETUP_HELP}')
         sys.exit(1)
@@ -110,7 +180,7 @@ def themes(context: typer.Context):
     List the available themes.
     """
     print("Available themes:")
-    themes = [theme for theme in groove.path.themes_root().iterdir()]
+    themes = [theme for theme in groove.settings.get().themes_root.iterdir()]
     tags = ('artist', 'title', 'bold', 'dim', 'link', 'prompt', 'bright', 'text', 'help')
     for theme in themes:
         text = ''
@@ -119,6 +189,34 @@ def themes(context: typer.Context):
         Console(theme=theme.name).print(f' ▪ [title]{theme.name}[/title] {text}')
 
 
+@assets_app.command('build')
+def build_assets(
+    context: typer.Context,
+    output: Optional[Path] = typer.Option(
+        None,
+        help="The directory to write built assets to. Defaults to ASSETS_PATH."
+    ),
+):
+    """
+    Minify, fingerprint and precompress theme assets for the web server.
+    """
+    for (theme, manifest) in assets.build(output).items():
+        print(f" ▪ Built {len(manifest)} assets for [b]{theme}[/b]")
+
+
+@db_app.command('verify')
+def verify_db(context: typer.Context):
+    """
+    Recount the playlists, entries and tracks, and correct the stored statistics if they have drifted.
+    """
+    with database_manager() as manager:
+        drifted = counters.recount(manager.session)
+    for (name, (stored, counted)) in drifted.items():
+        print(f" ▪ Corrected the number of [b]{name}[/b] from {stored} to {counted}")
+    if not drifted:
+        print("The database statistics are correct.")
+
+
 @app.command()
 def playlists(context: typer.Context):
     """
@@ -171,13 +269,31 @@ def server(
         False,
         help='Enable debugging output'
     ),
+    workers: Optional[int] = typer.Option(
+        None,
+        help="The number of worker processes. Defaults to WORKERS."
+    ),
+    reuse_port: Optional[bool] = typer.Option(
+        None,
+        help="Give each worker its own SO_REUSEPORT socket. Defaults to REUSE_PORT."
+    ),
+    max_requests: Optional[int] = typer.Option(
+        None,
+        help="Replace workers after this many requests. Defaults to MAX_REQUESTS."
+    ),
+    asgi: Optional[bool] = typer.Option(
+        None,
+        help="Serve asynchronously with uvicorn. Defaults to ASGI."
+    ),
 ):
     """
     Start the Groove on Demand playlsit server.
     """
     with database_manager() as manager:
         manager.import_from_filesystem()
-    webserver.start(host=host, port=port, debug=debug)
+    overrides = dict(workers=workers, reuse_port=reuse_port, max_requests=max_requests, asgi=asgi)
+    settings = groove.settings.get().replace(**{key: value for (key, value) in overrides.items() if value is not None})
+    webserver.start(host=host, port=port, debug=debug, settings=settings)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,3 @@
-import os
-
-from configparser import ConfigParser
-from pathlib import Path
 from textwrap import dedent
 from typing import Union, List
 
@@ -15,7 +11,8 @@ from rich.table import Table, Column
 from prompt_toolkit import prompt as _toolkit_prompt
 from prompt_toolkit.formatted_text import ANSI
 
-from groove.path import theme
+import groove.settings
+from groove.webserver.themes import registry
 
 BASE_STYLE = {
     'help': 'cyan',
@@ -33,14 +30,9 @@ def console_theme(theme_name: Union[str, None] = None) -> dict:
     Args:
         theme_name (str):
     """
-    cfg = ConfigParser()
-    cfg.read_dict({'styles': BASE_STYLE})
-
-    theme_path = theme_name if theme_name else os.environ.get('DEFAULT_THEME', 'blue_train')
-    cfg.read(theme(
-        Path(theme_path) / Path('console.cfg')
-    ))
-    return cfg['styles']
+    styles = dict(BASE_STYLE)
+    styles.update(registry().styles(theme_name if theme_name else groove.settings.get().default_theme))
+    return styles
 
 
 @rich.repr.auto
@@ -114,7 +106,7 @@ class Console(_Console):
         """
         Print text to the console with the current theme's debug style applied, if debugging is enabled.
         """
-        if os.environ.get('DEBUG', None):
+        if groove.settings.get().debug:
             self.print(dedent(txt), style='debug')
 
     def error(self, txt: str, **kwargs) -> None:
@@ -138,7 +130,7 @@ class Console(_Console):
             style=background_style,
         )
         params['min_width'] = 80
-        width = os.environ.get('CONSOLE_WIDTH', 'auto')
+        width = groove.settings.get().console_width
         if width == 'expand':
             params['expand'] = True
         elif width != 'auto':
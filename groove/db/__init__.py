@@ -1,2 +1,3 @@
-from groove.db.schema import metadata, track, playlist, entry
-from groove.db.helpers import windowed_query
+from groove.db.schema import metadata, track, playlist, entry, stats, playlist_snapshot
+from groove.db.helpers import windowed_query, chunked, values_cte
+from groove.db.search import search
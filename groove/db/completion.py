@@ -0,0 +1,282 @@
+import asyncio
+import threading
+
+from array import array
+from collections import defaultdict
+from typing import AsyncGenerator, Iterable, List
+
+from prompt_toolkit.application.current import get_app_or_none
+from prompt_toolkit.completion import Completer, Completion
+from sqlalchemy import Column, func, select
+from sqlalchemy.orm.session import Session
+
+# The number of matches ranked to choose the best.
+CANDIDATES = 500
+
+# How long, in seconds, to wait for the user to stop typing before looking for completions.
+DEBOUNCE = 0.15
+
+# How often, in seconds, to check whether the text has changed while waiting for completions.
+POLL = 0.05
+
+
+def trigrams(value: str) -> set:
+    """
+    Return the distinct three-character substrings of a lower-cased value.
+    """
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TrigramIndex:
+    """
+    SYNOPSIS
+
+        An in-memory index of a column's values, for completing text as it is typed without a database round trip.
+
+    USAGE
+
+        TrigramIndex(column)
+
+    ARGS
+
+        column      The table column to index, eg. groove.db.track.c.relpath
+
+    EXAMPLES
+
+        index = TrigramIndex(groove.db.track.c.relpath)
+        index.build(session)
+        index.search('psyence', limit=2)
+        >>> ['UNKLE/Psyence Fiction/01 Guns Blazing.flac', 'UNKLE/Psyence Fiction/03 Bloodstain.flac']
+
+        # after inserting, deleting or changing rows
+        index.refresh(session, ids=[changed_id])
+
+    INSTANCE ATTRIBUTES
+
+        column      The indexed column
+
+    Values are held in a list, in the order they were added; a position is an index into that list. Each trigram of
+    a lower-cased value maps to an array of the positions of the values containing it, so the index costs a few bytes
+    per trigram rather than a Python object. Removed values leave a hole, which is skipped.
+    """
+
+    def __init__(self, column: Column) -> None:
+        self._column = column
+        self._values = []
+        self._positions = {}
+        self._postings = defaultdict(lambda: array('I'))
+        self._last_id = 0
+
+    @property
+    def column(self) -> Column:
+        return self._column
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _rows(self, session: Session, *criteria) -> Iterable:
+        table = self.column.table
+        return session.execute(select(table.c.id, self.column).where(*criteria).order_by(table.c.id))
+
+    def build(self, session: Session) -> 'TrigramIndex':
+        """
+        Index every row of the column's table.
+        """
+        self.__init__(self.column)
+        return self.refresh(session)
+
+    def refresh(self, session: Session, ids: Iterable[int] = ()) -> 'TrigramIndex':
+        """
+        Index the rows added since the index was last built or refreshed, drop the rows that have been deleted, and
+        re-read the rows with the specified ids, which may have changed.
+        """
+        table = self.column.table
+        ids = list(ids)
+        if ids:
+            for id in ids:
+                self.discard(id)
+            for (id, value) in self._rows(session, table.c.id.in_(ids)):
+                self.add(id, value)
+        for (id, value) in self._rows(session, table.c.id > self._last_id):
+            self.add(id, value)
+
+        if session.execute(select(func.count(table.c.id))).scalar() != len(self):
+            live = set(session.execute(select(table.c.id)).scalars())
+            for id in [id for id in self._positions if id not in live]:
+                self.discard(id)
+        return self
+
+    def add(self, id: int, value: str) -> None:
+        """
+        Index the value of a row, replacing its previous value.
+        """
+        self.discard(id)
+        if value is None:
+            return
+        position = len(self._values)
+        self._values.append(value)
+        self._positions[id] = position
+        self._last_id = max(self._last_id, id)
+        for trigram in trigrams(value.lower()):
+            self._postings[trigram].append(position)
+
+    def discard(self, id: int) -> None:
+        """
+        Remove a row from the index, if it is present.
+        """
+        position = self._positions.pop(id, None)
+        if position is not None:
+            self._values[position] = None
+
+    def _union(self, keys: Iterable[str]) -> Iterable[int]:
+        seen = set()
+        for key in keys:
+            for position in self._postings[key]:
+                if position not in seen:
+                    seen.add(position)
+                    yield position
+
+    def _candidates(self, query: str) -> Iterable[int]:
+        if not query:
+            return range(len(self._values))
+        if len(query) < 3:
+            # Too short to have a trigram of its own, so visit the values of each trigram containing the query.
+            return self._union(key for key in list(self._postings) if query in key)
+        keys = trigrams(query)
+        if any(key not in self._postings for key in keys):
+            return []
+        # The rarest trigram has the fewest values to check.
+        return min((self._postings[key] for key in keys), key=len)
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """
+        Return up to limit values containing the query, ignoring case, best matches first.
+        """
+        query = query.lower()
+        matches = []
+        for position in self._candidates(query):
+            value = self._values[position]
+            if value is None:
+                continue
+            offset = value.lower().find(query)
+            if offset < 0:
+                continue
+            matches.append((offset, len(value), position))
+            # Ranking every match of a common term would take longer than a keystroke.
+            if len(matches) == max(limit, CANDIDATES):
+                break
+        matches.sort()
+        return [self._values[position] for (_, _, position) in matches[:limit]]
+
+
+class IndexCompleter(Completer):
+    """
+    Complete the current line with the best matching values of a TrigramIndex.
+    """
+
+    def __init__(self, index, limit=20):
+        self._index = index
+        self._limit = limit
+
+    def get_completions(self, document, complete_event):
+        line = document.current_line_before_cursor
+        for value in self._index.search(line, limit=self._limit):
+            yield Completion(value, start_position=-len(line))
+
+
+class DebouncedCompleter(Completer):
+    """
+    SYNOPSIS
+
+        Wrap a slow completer so that it only runs once the user pauses typing, in a background thread whose results
+        are shown as they arrive, and is abandoned as soon as the text changes.
+
+    USAGE
+
+        DebouncedCompleter(completer, [ARGS])
+
+    ARGS
+
+        completer   The completer to wrap. If it has a cancel() method, it is called from the event loop's thread to
+                    interrupt a lookup that has been superseded.
+        delay       How long to wait for more input before starting a lookup. Defaults to DEBOUNCE.
+
+    EXAMPLES
+
+        console.prompt([' ?'], completer=DebouncedCompleter(FuzzyTableCompleter(...)), complete_while_typing=True)
+
+    Used outside of a prompt_toolkit application, eg. by get_completions(), the wrapped completer runs immediately.
+    """
+
+    def __init__(self, completer, delay=DEBOUNCE):
+        self._completer = completer
+        self._delay = delay
+
+    @property
+    def completer(self):
+        return self._completer
+
+    def get_completions(self, document, complete_event):
+        return self.completer.get_completions(document, complete_event)
+
+    def _superseded(self, document) -> bool:
+        app = get_app_or_none()
+        if app is None or not hasattr(app, 'current_buffer'):
+            return False
+        return app.current_buffer.document.text_before_cursor != document.text_before_cursor
+
+    async def get_completions_async(self, document, complete_event) -> AsyncGenerator[Completion, None]:
+        await asyncio.sleep(self._delay)
+        if self._superseded(document):
+            return
+
+        loop = asyncio.get_running_loop()
+        results = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def put(result):
+            try:
+                loop.call_soon_threadsafe(results.put_nowait, result)
+            except RuntimeError:  # pragma: no cover
+                # The prompt has exited and closed its event loop; nobody is waiting.
+                cancelled.set()
+
+        def lookup():
+            completions = self.completer.get_completions(document, complete_event)
+            try:
+                for completion in completions:
+                    if cancelled.is_set():
+                        break
+                    put(completion)
+            except Exception as e:
+                if not cancelled.is_set():
+                    put(e)
+            finally:
+                if hasattr(completions, 'close'):
+                    completions.close()
+                put(done)
+
+        thread = threading.Thread(target=lookup, daemon=True)
+        thread.start()
+        try:
+            while True:
+                try:
+                    result = await asyncio.wait_for(results.get(), POLL)
+                except asyncio.TimeoutError:
+                    if self._superseded(document):
+                        return
+                    continue
+                if result is done:
+                    return
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            if thread.is_alive():
+                cancelled.set()
+                if hasattr(self.completer, 'cancel'):
+                    self.completer.cancel()
+                # Don't start another lookup until this one has let go of the completer.
+                while thread.is_alive():
+                    await asyncio.sleep(POLL / 5)
@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm.session import Session
+
+from groove.db.schema import stats
+
+# The counter kept for each table.
+COUNTERS = {
+    'playlist': 'playlists',
+    'entry': 'entries',
+    'track': 'tracks',
+}
+
+Stats = namedtuple('Stats', ' '.join(COUNTERS.values()))
+
+
+def triggers(table: str) -> list:
+    """
+    Return the statements creating the triggers that maintain a table's counter.
+    """
+    name = COUNTERS[table]
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS stats_{table}_insert AFTER INSERT ON {table} BEGIN "
+        f"UPDATE stats SET value = value + 1 WHERE name = '{name}'; END",
+        f"CREATE TRIGGER IF NOT EXISTS stats_{table}_delete AFTER DELETE ON {table} BEGIN "
+        f"UPDATE stats SET value = value - 1 WHERE name = '{name}'; END",
+    ]
+
+
+def get(session: Session) -> Stats:
+    """
+    Return the number of playlists, entries and tracks in the database, without counting them.
+    """
+    values = dict(session.execute(select(stats.c.name, stats.c.value)).all())
+    return Stats(**{name: values.get(name, 0) for name in COUNTERS.values()})
+
+
+def recount(session: Session) -> dict:
+    """
+    Count the rows of every table, correct any counter that has drifted, and return the drifted counters.
+
+    Returns:
+        dict: The (stored, counted) values of each incorrect counter, by name.
+    """
+    stored = get(session)._asdict()
+    drifted = {}
+    for (table, name) in COUNTERS.items():
+        counted = session.execute(select(func.count()).select_from(stats.metadata.tables[table])).scalar()
+        if stored[name] != counted:
+            drifted[name] = (stored[name], counted)
+        session.execute(stats.delete().where(stats.c.name == name))
+        session.execute(stats.insert().values(name=name, value=counted))
+    session.commit()
+    return drifted
@@ -19,3 +19,32 @@ def windowed_query(query, column, window_size):
         for row in chunk:
             yield row
 
+
+# The most rows of values bound to one statement. SQLite before 3.32 allows at most 999 parameters per statement.
+CHUNK_SIZE = 400
+
+
+def chunked(values, size=CHUNK_SIZE):
+    """
+    Break a list into lists of at most size values.
+    """
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def values_cte(name, columns, rows):
+    """
+    Return a WITH clause that names rows of values as a table, which can then be joined like any other, and the
+    parameters to bind to it. SQLite searches the index of the table it is joined to for each row, where it would
+    scan the table to match an IN clause of row values.
+
+    Returns:
+        tuple: The WITH clause and a dictionary of its parameters.
+    """
+    params = {}
+    placeholders = []
+    for (n, row) in enumerate(rows):
+        names = [f"{column}_{n}" for column in columns]
+        params.update(zip(names, row))
+        placeholders.append('(' + ', '.join(f":{name}" for name in names) + ')')
+    return (f"WITH {name}({', '.join(columns)}) AS (VALUES {', '.join(placeholders)})", params)
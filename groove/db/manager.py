@@ -1,46 +1,129 @@
 from prompt_toolkit.completion import Completion, FuzzyCompleter
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-import groove.path
+import groove.settings
 
 from . import metadata
+from .completion import DebouncedCompleter, IndexCompleter, TrigramIndex
+from .migrations import migrate
+from .search import search_query
 
 
 class FuzzyTableCompleter(FuzzyCompleter):
+    """
+    Complete the current line with the best matching rows of a table, using the table's full-text search index.
+    Rows are yielded as they are fetched, and a lookup in progress can be interrupted from another thread by cancel().
+    """
 
-    def __init__(self, table, column, formatter, session):
+    def __init__(self, table, column, formatter, session, limit=20):
         self._table = table
         self._column = column
         self._formatter = formatter
         self._session = session
+        self._limit = limit
+        self._connection = None
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Interrupt the lookup in progress, if any.
+        """
+        self._cancelled = True
+        if self._connection is not None:
+            self._connection.interrupt()
 
     def get_completions(self, document, complete_event):
         line = document.current_line_before_cursor
-        query = self._session.query(self._table).filter(self._column.ilike(f"%{line}%"))
-        for row in query.all():
-            yield Completion(
-                self._formatter(row),
-                start_position=-len(line)
-            )
+        self._cancelled = False
+        self._connection = self._session.connection().connection.dbapi_connection
+        try:
+            for row in search_query(self._session, self._table, line, column=self._column, limit=self._limit):
+                yield Completion(
+                    self._formatter(row),
+                    start_position=-len(line)
+                )
+        except OperationalError:
+            if not self._cancelled:
+                raise
+        finally:
+            self._connection = None
+
+
+def apply_pragmas(engine, pragmas):
+    """
+    Run the specified PRAGMA statements on every new connection made by the engine.
+    """
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for (name, value) in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return engine
 
 
 class DatabaseManager:
     """
     A context manager for working with sqllite database.
+
+    All changes are made through a single writer connection, so writers queue
+    up in the application rather than failing with 'database is locked'.
+    Read-only work, such as serving GET requests, draws on a separate pool of
+    read-only connections, so that readers never wait on one another.
+
+    Every connection applies the SQLITE_PRAGMAS profile. Its default uses
+    write-ahead logging, so readers never wait on a writer either, even one
+    in the middle of a scan.
     """
 
-    def __init__(self):
+    def __init__(self, settings=None):
+        self._settings = settings
         self._engine = None
+        self._reader = None
         self._session = None
+        self._readers = None
+        self._writers = None
+        self._indexes = {}
+
+    @property
+    def settings(self):
+        return self._settings or groove.settings.get()
 
     @property
     def engine(self):
+        """
+        The engine of the writer connection.
+        """
         if not self._engine:
-            path = groove.path.database()
-            self._engine = create_engine(f"sqlite:///{path}?check_same_thread=False", future=True)
+            self._engine = apply_pragmas(create_engine(
+                f"sqlite:///{self.settings.database}?check_same_thread=False",
+                future=True,
+                poolclass=QueuePool,
+                pool_size=1,
+                max_overflow=0,
+            ), self.settings.sqlite_pragmas)
         return self._engine
 
+    @property
+    def reader(self):
+        """
+        The engine of the read-only connection pool, sized by DB_POOL_SIZE.
+        """
+        if not self._reader:
+            # The journal mode is a property of the database file; read-only connections cannot change it.
+            pragmas = [(name, value) for (name, value) in self.settings.sqlite_pragmas if name != 'journal_mode']
+            self._reader = apply_pragmas(create_engine(
+                f"sqlite:///file:{self.settings.database}?mode=ro&uri=true&check_same_thread=False",
+                future=True,
+                poolclass=QueuePool,
+                pool_size=self.settings.db_pool_size,
+                max_overflow=0,
+            ), pragmas)
+        return self._reader
+
     @property
     def session(self):
         if not self._session:
@@ -48,14 +131,60 @@ class DatabaseManager:
             self._session = Session()
         return self._session
 
+    @property
+    def readers(self):
+        """
+        A registry of thread-local, read-only sessions.
+        """
+        if not self._readers:
+            self._readers = scoped_session(sessionmaker(bind=self.reader, future=True))
+        return self._readers
+
+    @property
+    def writers(self):
+        """
+        A registry of thread-local sessions using the writer connection.
+        """
+        if not self._writers:
+            self._writers = scoped_session(sessionmaker(bind=self.engine, future=True))
+        return self._writers
+
+    def dispose(self, close=True):
+        """
+        Discard every pooled connection. A forked worker passes close=False, to abandon the connections it inherited
+        without closing them, since closing a SQLite connection opened by another process can release its locks.
+        """
+        for engine in (self._engine, self._reader):
+            if engine:
+                engine.dispose(close=close)
+
     def import_from_filesystem(self):
         pass
 
     def fuzzy_table_completer(self, table, column, formatter):
-        return FuzzyTableCompleter(table, column, formatter, session=self.session)
+        if str(column) in self._indexes:
+            return IndexCompleter(self._indexes[str(column)])
+        return DebouncedCompleter(FuzzyTableCompleter(table, column, formatter, session=self.session))
+
+    def build_completion_indexes(self, *columns):
+        """
+        Load the values of the specified columns into memory, so that completing them needn't query the database.
+        """
+        for column in columns:
+            self._indexes[str(column)] = TrigramIndex(column).build(self.session)
+
+    def refresh_completion_indexes(self, table=None, ids=()):
+        """
+        Bring the completion indexes up to date with the database, re-reading the rows of the table with the
+        specified ids.
+        """
+        for index in self._indexes.values():
+            if table is None or index.column.table is table:
+                index.refresh(self.session, ids=ids if index.column.table is table else ())
 
     def __enter__(self):
         metadata.create_all(bind=self.engine)
+        migrate(self.engine)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -0,0 +1,221 @@
+import logging
+import time
+
+from collections import namedtuple
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from groove.db import counters, snapshots
+from groove.db.search import SEARCH_COLUMNS
+
+# The number of rows each transaction of a batched migration works on. Other connections can write between batches.
+BATCH_SIZE = 10000
+
+MIGRATIONS = []
+
+Migration = namedtuple('Migration', 'version,description,apply,applied', defaults=(None,))
+
+
+def migration(description, applied=None):
+    """
+    Register a function as the next migration. It is called with the engine and the batch size, and manages its own
+    transactions; it must be safe to run against a database it has already (perhaps partially) been applied to.
+
+    A migration that can fail without stopping the others, eg. for want of a SQLite feature, is given an applied
+    function, which is called with the engine and returns whether the migration has taken effect. Until it has, the
+    migration is run again every time the database is migrated.
+    """
+    def decorator(func):
+        MIGRATIONS.append(Migration(version=len(MIGRATIONS) + 1, description=description, apply=func, applied=applied))
+        return func
+    return decorator
+
+
+def version(engine: Engine) -> int:
+    """
+    Return the version of the database schema; 0 for a database that has never been migrated.
+    """
+    with engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def migrate(engine: Engine, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Apply every migration newer than the database, in order, recording the schema version after each one.
+
+    Returns:
+        int: The number of migrations applied.
+    """
+    current = version(engine)
+    pending = [m for m in MIGRATIONS if m.version > current or (m.applied and not m.applied(engine))]
+    for m in pending:
+        logging.info(f"Migrating the database to version {m.version}: {m.description}")
+        started = time.perf_counter()
+        m.apply(engine, batch_size)
+        if m.version <= current:
+            continue
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version = {m.version:d}")
+        logging.info(f"Migrated the database to version {m.version} in {time.perf_counter() - started:.1f}s.")
+    return len(pending)
+
+
+def _pause(started: float) -> None:
+    """
+    Let go of the database between batches for as long as the last batch held it, so that writers waiting on their
+    busy timeout get their turn rather than being starved until the migration finishes.
+    """
+    time.sleep(min(time.perf_counter() - started, 1))
+
+
+def _columns(conn, table: str) -> list:
+    return [col['name'] for col in inspect(conn).get_columns(table)]
+
+
+@migration("Add playlist.version")
+def add_playlist_version(engine: Engine, batch_size: int) -> None:
+    with engine.begin() as conn:
+        if 'version' not in _columns(conn, 'playlist'):
+            conn.exec_driver_sql("ALTER TABLE playlist ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+@migration("Index the playlists containing each track")
+def index_entry_track_id(engine: Engine, batch_size: int) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_entry_track_id_playlist_id ON entry (track_id, playlist_id)"
+        )
+
+
+def _search_triggers(table: str, columns: tuple) -> list:
+    index = f"{table}_search"
+    cols = ', '.join(columns)
+    new = ', '.join(f"new.{col}" for col in columns)
+    old = ', '.join(f"old.{col}" for col in columns)
+    # While the index is being populated, a row may change before it has been indexed. An external content index
+    # must only be told to delete the values it actually holds, so deletes are guarded by the index's own record
+    # of the rows it contains.
+    indexed = f"EXISTS (SELECT 1 FROM {index}_docsize WHERE id = old.id)"
+    return [
+        f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {index}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} WHEN {indexed} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {index}_update AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, {cols}) SELECT 'delete', old.id, {old} WHERE {indexed}; "
+        f"INSERT INTO {index}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def _create_search_index(engine: Engine, table: str) -> int:
+    columns = SEARCH_COLUMNS[table]
+    index = f"{table}_search"
+    with engine.begin() as conn:
+        for trigger in ('insert', 'delete', 'update'):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {index}")
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {index} USING fts5("
+            f"{', '.join(columns)}, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        for statement in _search_triggers(table, columns):
+            conn.exec_driver_sql(statement)
+        return conn.exec_driver_sql(f"SELECT max(id) FROM {table}").scalar() or 0
+
+
+def _populate_search_index(engine: Engine, table: str, last: int, batch_size: int) -> int:
+    index = f"{table}_search"
+    cols = ', '.join(SEARCH_COLUMNS[table])
+    indexed = 0
+    start = 0
+    while start < last:
+        end = min(start + batch_size, last)
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            indexed += conn.exec_driver_sql(
+                f"INSERT INTO {index}(rowid, {cols}) SELECT id, {cols} FROM {table} "
+                f"WHERE id > ? AND id <= ? AND id NOT IN (SELECT id FROM {index}_docsize)",
+                (start, end)
+            ).rowcount
+        start = end
+        _pause(started)
+    return indexed
+
+
+def rebuild_search_index(engine: Engine, table: str, batch_size: int = BATCH_SIZE) -> int:
+    """
+    (Re)create the full-text search index of a table and populate it from the table's rows, batch_size rows per
+    transaction. The index is kept in sync by triggers from the start, so the table can be written to between
+    batches.
+
+    Returns:
+        int: The number of rows indexed.
+    """
+    last = _create_search_index(engine, table)
+    # Rows added from here on are indexed by the triggers.
+    return _populate_search_index(engine, table, last, batch_size)
+
+
+def _search_indexes_exist(engine: Engine) -> bool:
+    with engine.connect() as conn:
+        names = set(conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    return all(f"{table}_search" in names for table in SEARCH_COLUMNS)
+
+
+@migration("Create the track and playlist search indexes", applied=_search_indexes_exist)
+def create_search_indexes(engine: Engine, batch_size: int) -> None:
+    for table in SEARCH_COLUMNS:
+        try:
+            rows = rebuild_search_index(engine, table, batch_size=batch_size)
+        except OperationalError as e:
+            logging.warning(
+                f"Could not create the {table} search index; completion will be slower until it is created on a "
+                f"later start. ({e})"
+            )
+            return
+        logging.info(f"Indexed {rows} rows of {table} for search.")
+
+
+@migration("Add track.duration")
+def add_track_duration(engine: Engine, batch_size: int) -> None:
+    with engine.begin() as conn:
+        if 'duration' not in _columns(conn, 'track'):
+            conn.exec_driver_sql("ALTER TABLE track ADD COLUMN duration FLOAT")
+
+
+@migration("Count playlists, entries and tracks")
+def count_rows(engine: Engine, batch_size: int) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS stats (name VARCHAR NOT NULL PRIMARY KEY, value INTEGER DEFAULT '0' NOT NULL)"
+        )
+        for (table, name) in counters.COUNTERS.items():
+            for statement in counters.triggers(table):
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(
+                f"INSERT OR REPLACE INTO stats (name, value) SELECT '{name}', count(*) FROM {table}"
+            )
+
+
+@migration("Index tracks by artist and title")
+def index_track_artist_title(engine: Engine, batch_size: int) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_track_artist_title ON track (artist, title)")
+
+
+@migration("Snapshot playlists for serving")
+def snapshot_playlists(engine: Engine, batch_size: int) -> None:
+    # The snapshots themselves are written by the web server when it starts, since they are built by the model.
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS playlist_snapshot ("
+            "playlist_id INTEGER NOT NULL PRIMARY KEY REFERENCES playlist (id), slug VARCHAR, "
+            "version INTEGER NOT NULL, epoch VARCHAR DEFAULT '' NOT NULL, data TEXT NOT NULL)"
+        )
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_playlist_snapshot_slug ON playlist_snapshot (slug)"
+        )
+        for statement in snapshots.triggers():
+            conn.exec_driver_sql(statement)
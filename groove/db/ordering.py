@@ -0,0 +1,93 @@
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from typing import List, Sequence, Tuple, Union
+
+# The distance between the ordering keys (entry.track) of consecutive entries when they are appended or renumbered,
+# leaving room to insert entries between them later without moving their neighbours.
+GAP = 1024
+
+# The entry keys to delete and the (key, track_id) entries to insert to turn one ordering into another.
+Changes = namedtuple('Changes', 'removed,inserted')
+
+
+def keys(count: int, after: int = 0) -> List[int]:
+    """
+    Return the keys of count entries appended after the entry with the key after.
+    """
+    return [after + GAP * n for n in range(1, count + 1)]
+
+
+def common(stored_ids: Sequence[int], track_ids: Sequence[int]) -> dict:
+    """
+    Return the longest common subsequence of two lists of track ids, as a map of positions in track_ids to positions
+    in stored_ids. Those entries are already in order and can stay where they are.
+    """
+    # Edits are usually local, so the entries before and after them are matched without a search.
+    shortest = min(len(stored_ids), len(track_ids))
+    head = 0
+    while head < shortest and stored_ids[head] == track_ids[head]:
+        head += 1
+    tail = 0
+    while tail < shortest - head and stored_ids[-1 - tail] == track_ids[-1 - tail]:
+        tail += 1
+    common = {n: n for n in range(head)}
+    common.update({len(track_ids) - n: len(stored_ids) - n for n in range(1, tail + 1)})
+
+    # Hunt-Szymanski: the longest run of (new, old) matches that is increasing in both, found by patience sorting.
+    occurrences = defaultdict(list)
+    for old in range(head, len(stored_ids) - tail):
+        occurrences[stored_ids[old]].append(old)
+    tails = []
+    tail_matches = []
+    matches = []
+    for new in range(head, len(track_ids) - tail):
+        for old in reversed(occurrences.get(track_ids[new], ())):
+            i = bisect_left(tails, old)
+            matches.append((new, old, tail_matches[i - 1] if i else None))
+            if i == len(tails):
+                tails.append(old)
+                tail_matches.append(len(matches) - 1)
+            else:
+                tails[i] = old
+                tail_matches[i] = len(matches) - 1
+    match = tail_matches[-1] if tail_matches else None
+    while match is not None:
+        (new, old, match) = matches[match]
+        common[new] = old
+    return common
+
+
+def changes(stored: Sequence[Tuple[int, int]], track_ids: Sequence[int]) -> Union[Changes, None]:
+    """
+    Work out the fewest entries to remove and insert to turn a playlist's stored entries into the specified tracks.
+
+    Args:
+        stored (list): The (key, track_id) of each stored entry, in order.
+        track_ids (list): The track ids the playlist should have, in order.
+
+    Returns:
+        Changes: The keys of the entries to delete, and the (key, track_id) entries to insert once they have been. An
+            entry that moves is both. None if there is no room between the keys of two entries for those that belong
+            between them, in which case the playlist must be renumbered.
+    """
+    kept = common([track_id for (_, track_id) in stored], track_ids)
+    kept_old = set(kept.values())
+
+    removed = [key for (old, (key, _)) in enumerate(stored) if old not in kept_old]
+    inserted = []
+    run = []
+    lower = 0
+    for (new, track_id) in enumerate(track_ids):
+        if new not in kept:
+            run.append(track_id)
+            continue
+        upper = stored[kept[new]][0]
+        if run:
+            if len(run) > upper - lower - 1:
+                return None
+            step = (upper - lower) // (len(run) + 1)
+            inserted.extend((lower + step * n, run_id) for (n, run_id) in enumerate(run, start=1))
+            run = []
+        lower = upper
+    inserted.extend(zip(keys(len(run), after=lower), run))
+    return Changes(removed=removed, inserted=inserted)
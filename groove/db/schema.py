@@ -1,5 +1,5 @@
 from sqlalchemy import MetaData
-from sqlalchemy import Table, Column, Integer, String, UnicodeText, ForeignKey, PrimaryKeyConstraint
+from sqlalchemy import Table, Column, Integer, Float, String, UnicodeText, ForeignKey, PrimaryKeyConstraint, Index
 
 metadata = MetaData()
 
@@ -10,6 +10,9 @@ track = Table(
     Column("relpath", UnicodeText, index=True, unique=True),
     Column("artist", UnicodeText),
     Column("title", UnicodeText),
+    Column("duration", Float),
+    # Playlists are saved from the editor as artist and title pairs.
+    Index("ix_track_artist_title", "artist", "title"),
 )
 
 playlist = Table(
@@ -19,6 +22,7 @@ playlist = Table(
     Column("name", String),
     Column("description", UnicodeText),
     Column("slug", String, index=True, unique=True),
+    Column("version", Integer, nullable=False, default=1, server_default="1"),
 )
 
 entry = Table(
@@ -28,4 +32,26 @@ entry = Table(
     Column("playlist_id", Integer, ForeignKey("playlist.id")),
     Column("track_id", Integer, ForeignKey("track.id")),
     PrimaryKeyConstraint("playlist_id", "track"),
+    # The primary key finds a playlist's entries in order; this finds the playlists containing a track.
+    Index("ix_entry_track_id_playlist_id", "track_id", "playlist_id"),
+)
+
+# Row counts of the tables above, kept up to date by triggers.
+stats = Table(
+    "stats",
+    metadata,
+    Column("name", String, primary_key=True),
+    Column("value", Integer, nullable=False, default=0, server_default="0"),
+)
+
+# The playlist and its entries as served, so that serving a playlist reads one row. It is written when the playlist
+# is saved, and deleted by triggers when anything it was built from changes.
+playlist_snapshot = Table(
+    "playlist_snapshot",
+    metadata,
+    Column("playlist_id", Integer, ForeignKey("playlist.id"), primary_key=True, autoincrement=False),
+    Column("slug", String, index=True, unique=True),
+    Column("version", Integer, nullable=False),
+    Column("epoch", String, nullable=False, default='', server_default=''),
+    Column("data", UnicodeText, nullable=False),
 )
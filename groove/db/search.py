@@ -0,0 +1,75 @@
+import weakref
+
+from typing import Iterable, Union
+
+from sqlalchemy import Column, Table, text
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.session import Session
+
+# The columns of each table covered by its full-text search index, {table}_search, which is created by a migration.
+SEARCH_COLUMNS = {
+    'track': ('relpath', 'artist', 'title'),
+    'playlist': ('name', 'slug'),
+}
+
+# The number of matches ranked to choose the best.
+CANDIDATES = 500
+
+# The search indexes present in each engine's database.
+_available = weakref.WeakKeyDictionary()
+
+
+def _has_index(session: Session, table: Table) -> bool:
+    engine = session.get_bind()
+    if engine not in _available:
+        _available[engine] = {
+            row[0] for row in session.execute(text("SELECT name FROM sqlite_master WHERE name LIKE '%_search'"))
+        }
+    return f"{table.name}_search" in _available[engine]
+
+
+def search_query(session: Session,
+                 table: Table,
+                 query: str,
+                 column: Union[Column, None] = None,
+                 limit: int = 20) -> Query:
+    """
+    Like search(), but return the query, so that its rows can be fetched as they are found.
+    """
+    if column is None:
+        column = table.c[SEARCH_COLUMNS[table.name][0]]
+    # The trigram index cannot match fewer than three characters.
+    if len(query) < 3 or table.name not in SEARCH_COLUMNS or not _has_index(session, table):
+        return session.query(table).filter(column.ilike(f"%{query}%")).limit(limit)
+
+    # Ranking every match of a common term would take longer than a keystroke, so only the first CANDIDATES matches
+    # are ranked; when there are fewer, the ranking is exact.
+    phrase = '"' + query.replace('"', '""') + '"'
+    index = f"{table.name}_search"
+    return session.query(table).from_statement(text(
+        f"SELECT {table.name}.* FROM ("
+        f"SELECT rowid, rank FROM {index} WHERE {index} MATCH :phrase LIMIT :candidates"
+        f") AS matches JOIN {table.name} ON {table.name}.id = matches.rowid ORDER BY matches.rank LIMIT :limit"
+    ).bindparams(phrase=phrase, candidates=max(limit, CANDIDATES), limit=limit))
+
+
+def search(session: Session,
+           table: Table,
+           query: str,
+           column: Union[Column, None] = None,
+           limit: int = 20) -> Iterable:
+    """
+    Return up to limit rows of the table containing the query, best matches first.
+
+    Args:
+        session (Session): The database session.
+        table (Table): The table to search.
+        query (str): The text to look for.
+        column (Column): The column to search if the table has no search index, or the query is too short to use
+            it. Defaults to the first of the table's searchable columns.
+        limit (int): The maximum number of rows to return.
+
+    Returns:
+        Iterable: The matching rows.
+    """
+    return search_query(session, table, query, column=column, limit=limit).all()
@@ -0,0 +1,194 @@
+import heapq
+import json
+
+from collections import namedtuple
+from typing import Callable, Iterable, List, Union
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm.session import Session
+
+import groove.settings
+from groove.db.schema import playlist_snapshot
+from groove.exceptions import ConfigurationError
+
+# A snapshot's data is a line of JSON holding the playlist's details, followed by one line for each of its entries, in
+# order: the entry's ordering key (entry.track), a tab, and the entry as JSON. JSON never contains a raw tab or
+# newline, so entries can be found by key, added and removed without parsing the rest of the playlist.
+SEPARATORS = (',', ':')
+
+# json.dumps() creates an encoder for every call made with non-default arguments.
+_encode = json.JSONEncoder(separators=SEPARATORS).encode
+
+
+def triggers() -> list:
+    """
+    Return the statements creating the triggers that delete a playlist's snapshot when the playlist, its entries or
+    their tracks change, so that a snapshot is never served stale.
+    """
+    statement = "DELETE FROM playlist_snapshot WHERE playlist_id"
+    containing = "IN (SELECT playlist_id FROM entry WHERE track_id = old.id)"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_playlist_update AFTER UPDATE ON playlist BEGIN "
+        f"{statement} = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_playlist_delete AFTER DELETE ON playlist BEGIN "
+        f"{statement} = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_entry_insert AFTER INSERT ON entry BEGIN "
+        f"{statement} = new.playlist_id; END",
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_entry_update AFTER UPDATE ON entry BEGIN "
+        f"{statement} = old.playlist_id; {statement} = new.playlist_id; END",
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_entry_delete AFTER DELETE ON entry BEGIN "
+        f"{statement} = old.playlist_id; END",
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_track_update AFTER UPDATE OF relpath, artist, title, duration ON track "
+        f"BEGIN {statement} {containing}; END",
+        f"CREATE TRIGGER IF NOT EXISTS snapshot_track_delete AFTER DELETE ON track BEGIN "
+        f"{statement} {containing}; END",
+    ]
+
+
+def _details(playlist: dict) -> str:
+    return _encode({key: value for (key, value) in playlist.items() if key != 'entries'})
+
+
+def _line(entry: dict) -> str:
+    return f"{entry['track']:d}\t{_encode(entry)}"
+
+
+def _key(line: str) -> int:
+    return int(line[:line.index('\t')])
+
+
+def _find(lines: List[str], key: int) -> int:
+    """
+    Return the position of the first of the entry lines, which are in order, whose key is not less than key.
+    """
+    (lower, upper) = (0, len(lines))
+    while lower < upper:
+        middle = (lower + upper) // 2
+        if _key(lines[middle]) < key:
+            lower = middle + 1
+        else:
+            upper = middle
+    return lower
+
+
+def dumps(playlist: dict) -> str:
+    """
+    Return a playlist, as returned by Playlist.as_dict, as a snapshot's data.
+    """
+    return '\n'.join([_details(playlist)] + [_line(entry) for entry in playlist['entries']])
+
+
+def _sign(sign: Callable[[list], str], entries: list) -> str:
+    try:
+        return sign(entries)
+    except ConfigurationError:
+        # Signed when it is read, instead.
+        return ''
+
+
+class Snapshot(namedtuple('Snapshot', 'playlist_id,slug,version,epoch,data')):
+    """
+    A playlist and its entries as they were when it was last saved, read from a single row.
+    """
+
+    @property
+    def playlist(self) -> dict:
+        """
+        Return the playlist, as Playlist.as_dict would, with each entry's URL as it was signed in the snapshot's epoch.
+        """
+        (details, _, entries) = self.data.partition('\n')
+        playlist = json.loads(details)
+        playlist['entries'] = json.loads(
+            '[' + ','.join(line[line.index('\t') + 1:] for line in entries.split('\n') if line) + ']'
+        )
+        playlist['url'] = f"{groove.settings.get().base_url}/playlist/{self.slug}"
+        return playlist
+
+
+def _store(session: Session, playlist: dict, epoch: str, data: str) -> None:
+    session.execute(delete(playlist_snapshot).where(playlist_snapshot.c.playlist_id == playlist['id']))
+    session.execute(insert(playlist_snapshot).values(
+        playlist_id=playlist['id'],
+        slug=playlist['slug'],
+        version=playlist['version'],
+        epoch=epoch,
+        data=data,
+    ))
+
+
+def write(session: Session, playlist: dict, sign: Callable[[list], str]) -> None:
+    """
+    Write the snapshot of a playlist, as returned by Playlist.as_dict, replacing any previous snapshot. The caller is
+    responsible for committing the transaction.
+
+    Args:
+        session (Session): The database session.
+        playlist (dict): The playlist and its entries.
+        sign (callable): A function adding a signed URL to each of a list of entries, and returning the epoch of the
+            signatures.
+    """
+    epoch = _sign(sign, playlist['entries'])
+    _store(session, playlist, epoch, dumps(playlist))
+
+
+def patch(session: Session,
+          snapshot: Snapshot,
+          playlist: dict,
+          removed: Iterable[int],
+          inserted: List[dict],
+          sign: Callable[[list], str]) -> bool:
+    """
+    Write the snapshot of a playlist by applying the changes to its entries to its previous snapshot, signing only the
+    entries inserted, so that the work done in python is proportional to the number of changes rather than to the
+    length of the playlist. The caller is responsible for committing the transaction.
+
+    Args:
+        session (Session): The database session.
+        snapshot (Snapshot): The playlist's snapshot before the changes, read in the same transaction.
+        playlist (dict): The playlist's details, as returned by Playlist.as_dict, without its entries.
+        removed (list): The keys of the entries removed.
+        inserted (list): The entries inserted, as returned by Playlist.as_dict, in order.
+        sign (callable): As write().
+
+    Returns:
+        bool: False, having written nothing, if the snapshot's signatures are from another epoch, in which case the
+            snapshot must be rebuilt with write().
+    """
+    epoch = _sign(sign, inserted)
+    if epoch != snapshot.epoch:
+        return False
+    (_, _, data) = snapshot.data.partition('\n')
+    lines = data.split('\n') if data else []
+    added = [_line(entry) for entry in inserted]
+    removed = list(removed)
+    if (len(removed) + len(added)) ** 2 > len(lines):
+        # Too many changes to make one at a time.
+        removed = set(removed)
+        lines = list(heapq.merge([line for line in lines if _key(line) not in removed], added, key=_key))
+    else:
+        for key in removed:
+            position = _find(lines, key)
+            if position < len(lines) and _key(lines[position]) == key:
+                del lines[position]
+        for line in added:
+            lines.insert(_find(lines, _key(line)), line)
+    _store(session, playlist, epoch, '\n'.join([_details(playlist)] + lines))
+    return True
+
+
+def read(session: Session, slug: str) -> Union[Snapshot, None]:
+    """
+    Return the snapshot of the playlist with the specified slug, or None if it has none.
+    """
+    row = session.execute(select(playlist_snapshot).where(playlist_snapshot.c.slug == slug)).one_or_none()
+    return Snapshot(*row) if row else None
+
+
+def read_by_id(session: Session, playlist_id: int) -> Union[Snapshot, None]:
+    """
+    Return the snapshot of the playlist with the specified id, or None if it has none.
+    """
+    row = session.execute(
+        select(playlist_snapshot).where(playlist_snapshot.c.playlist_id == playlist_id)
+    ).one_or_none()
+    return Snapshot(*row) if row else None
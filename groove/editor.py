@@ -4,6 +4,8 @@ import subprocess
 import yaml
 
 from yaml.scanner import ScannerError
+
+import groove.settings
 from groove.exceptions import PlaylistValidationError
 
 
@@ -50,6 +52,12 @@ EDITOR_TEMPLATE = """
 # playlist, its slug will be regnenerated, breaking previous web links to said playlist.
 """
 
+# The template is written in two parts, with the entries streamed in between.
+(EDITOR_HEADER, EDITOR_FOOTER) = EDITOR_TEMPLATE.split('{entries}\n')
+
+# Use the libyaml parser when PyYAML was built with it; it reads long playlists many times faster.
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 
 class PlaylistEditor:
     """
@@ -61,14 +69,14 @@ class PlaylistEditor:
     @property
     def path(self):
         if not self._path:
-            self._path = NamedTemporaryFile(prefix='groove_on_demand-', delete=False)
+            self._path = NamedTemporaryFile(mode='w', encoding='utf-8', prefix='groove_on_demand-', delete=False)
         return self._path
 
     def edit(self, playlist):
         try:
             with self.path as fh:
-                fh.write(playlist.as_yaml.encode())
-            subprocess.check_call([os.environ.get('EDITOR', 'vim'), self.path.name])
+                playlist.write_yaml(fh)
+            subprocess.check_call([groove.settings.get().editor, self.path.name])
         except (IOError, OSError, FileNotFoundError) as e:
             logging.error(e)
             raise RuntimeError("Could not invoke the editor! If the error persists, try enabling DEBUG mode.")
@@ -85,7 +93,7 @@ class PlaylistEditor:
 
     def read(self):
         with open(self.path.name, 'rb') as fh:
-            return yaml.safe_load(fh)
+            return yaml.load(fh, Loader=Loader)
 
     def cleanup(self):
         if self._path:
@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import os
 
 from itertools import chain
 from pathlib import Path
@@ -21,9 +20,10 @@ from sqlalchemy import func
 from sqlalchemy.exc import NoResultFound
 
 import groove.db
-import groove.path
+import groove.settings
 
 from groove.exceptions import InvalidPathError
+from groove.playlist import Playlist
 
 
 @rich.repr.auto(angular=True)
@@ -45,7 +45,7 @@ class MediaScanner:
         glob        A pattern to search for. Defaults to MEDIA_GLOB.  Multiple
                     patterns can be specifed as a comma-separated-list.
         path        The path to scan. Defaults to MEDIA_ROOT.
-        root        The media root, as specified by MEDIA_ROOT
+        settings    The Settings to use. Defaults to the current settings.
 
     EXAMPLES
 
@@ -67,10 +67,12 @@ class MediaScanner:
         path: Union[Path, None] = None,
         glob: Union[str, None] = None,
         console: Union[Console, None] = None,
+        settings: Union[groove.settings.Settings, None] = None,
     ) -> None:
+        settings = settings or groove.settings.get()
         self._db = db
-        self._glob = tuple((glob or os.environ.get('MEDIA_GLOB', '*.mp3,*.flac,*.m4a')).split(','))
-        self._root = groove.path.media_root()
+        self._glob = tuple(glob.split(',')) if glob else settings.media_glob
+        self._root = settings.media_root
         self._console = console or Console()
         self._scanned = 0
         self._imported = 0
@@ -112,6 +114,7 @@ class MediaScanner:
         return {
             'artist': str(tags.resolve('album_artist')),
             'title': str(tags['title']),
+            'duration': tags['#length'].value,
         }
 
     def find_sources(self, pattern):
@@ -172,11 +175,18 @@ class MediaScanner:
         self._scanned += 1
         relpath = str(path.relative_to(self.root))
         try:
-            self.db.query(groove.db.track).filter(
+            existing = self.db.query(groove.db.track).filter(
                 groove.db.track.c.relpath == relpath).one()
-            return
         except NoResultFound:
             pass
+        else:
+            if existing.duration is None:
+                # Imported before durations were recorded.
+                self.db.execute(groove.db.track.update().where(groove.db.track.c.id == existing.id).values(
+                    duration=self._get_tags(path)['duration']
+                ))
+                self.db.commit()
+            return
 
         columns = self._get_tags(path)
         columns['relpath'] = relpath
@@ -202,5 +212,7 @@ class MediaScanner:
             self.find_sources(pattern) for pattern in self.glob
         )
         self.import_tracks(combined_sources)
+        # Recording the durations of existing tracks drops the snapshots of the playlists containing them.
+        Playlist.refresh_snapshots(self.db)
         newcount = self.db.query(func.count(groove.db.track.c.relpath)).scalar() - count
         return newcount
@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import os
 import subprocess
 
 from typing import Union, List
@@ -16,7 +15,7 @@ from rich.progress import (
     TimeRemainingColumn
 )
 
-import groove.path
+import groove.settings
 
 
 @rich.repr.auto(angular=True)
@@ -28,13 +27,21 @@ class Transcoder:
 
     ARGS
 
+        console     A rich console instance
+        settings    The Settings to use. Defaults to the current settings.
+
     EXAMPLES
 
     INSTANCE ATTRIBUTES
     """
 
-    def __init__(self, console: Union[Console, None] = None) -> None:
+    def __init__(
+        self,
+        console: Union[Console, None] = None,
+        settings: Union[groove.settings.Settings, None] = None,
+    ) -> None:
         self.console = console or Console()
+        self.settings = settings or groove.settings.get()
         self._transcoded = 0
         self._processed = 0
         self._total = 0
@@ -45,11 +52,11 @@ class Transcoder:
         """
         count = len(sources)
 
-        if not os.environ.get('TRANSCODER', None):
+        if not self.settings.transcoder:
             self.console.error("Cannot transcode tracks without a TRANSCODER defined in your environment.")
             return
 
-        cache = groove.path.cache_root()
+        cache = self.settings.cache_root
         if not cache.exists():
             cache.mkdir()
 
@@ -90,13 +97,13 @@ class Transcoder:
             )
 
     def _get_or_create_cache_dir(self, relpath):
-        cached_path = groove.path.transcoded_media(relpath)
+        cached_path = self.settings.transcoded_media(relpath)
         cached_path.parent.mkdir(parents=True, exist_ok=True)
         return cached_path
 
     def _run_transcoder(self, infile, outfile):
         cmd = []
-        for part in os.environ['TRANSCODER'].split():
+        for part in self.settings.transcoder.split():
             if part == 'INFILE':
                 cmd.append(str(infile))
             elif part == 'OUTFILE':
@@ -117,7 +124,7 @@ class Transcoder:
         """
         self._processed += 1
 
-        source_path = groove.path.media(relpath)
+        source_path = self.settings.media(relpath)
         if not source_path.exists():
             logging.error(f"Source does not exist: [link]{source_path}[/link].")
             return
@@ -36,6 +36,13 @@ def cache_root():
     return path
 
 
+def assets_root():
+    path = os.environ.get('ASSETS_PATH', None)
+    if path:
+        return Path(path).expanduser()
+    return cache_root() / Path('assets')
+
+
 def media(relpath):
     path = media_root() / Path(relpath)
     return path
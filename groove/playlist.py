@@ -1,15 +1,20 @@
+import io
+import json
 import logging
-import os
 
+from collections import defaultdict, deque, namedtuple
 from textwrap import indent
 from typing import Union, List
 
-from groove import db
-from groove.editor import PlaylistEditor, EDITOR_TEMPLATE
+import groove.settings
+from groove import cache, db
+from groove.db import ordering, snapshots
+from groove.editor import PlaylistEditor, EDITOR_HEADER, EDITOR_FOOTER
 from groove.exceptions import PlaylistValidationError, TrackNotFoundError
+from groove.webserver import requests
 
 from slugify import slugify
-from sqlalchemy import func, delete
+from sqlalchemy import bindparam, func, delete, select, text
 from sqlalchemy.orm.session import Session
 from sqlalchemy.engine.row import Row
 from sqlalchemy.exc import NoResultFound, MultipleResultsFound
@@ -17,6 +22,38 @@ from sqlalchemy.exc import NoResultFound, MultipleResultsFound
 from yaml.scanner import ScannerError
 
 
+def _quote(value) -> str:
+    """
+    Return a value as a double-quoted YAML string. JSON strings are valid YAML, escapes and all.
+    """
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+class PlaylistSummary(namedtuple('PlaylistSummary', 'id,name,slug,description,tracks,duration')):
+    """
+    A playlist's details and the number and total duration, in seconds, of its tracks.
+    """
+
+    @property
+    def url(self) -> str:
+        return f"{groove.settings.get().base_url}/playlist/{self.slug}"
+
+
+class PlaylistDiff(namedtuple('PlaylistDiff', 'fields,inserted,removed,moved')):
+    """
+    The differences between two playlists: the details that differ, as {field: (old, new)}, and the entries that were
+    inserted, as (position, track_id), removed, as (position, track_id), and moved, as (old position, new position,
+    track_id). Positions count from 0. A diff of two playlists that are the same is empty, and false.
+    """
+
+    def __bool__(self) -> bool:
+        return any(self)
+
+    @property
+    def entries_changed(self) -> bool:
+        return bool(self.inserted or self.removed or self.moved)
+
+
 class Playlist:
     """
     CRUD operations and convenience methods for playlists.
@@ -33,7 +70,7 @@ class Playlist:
             raise PlaylistValidationError("Name cannot be empty.")
         self._slug = slug or slugify(name)
         self._description = description
-        self._entries = []
+        self._entries = None
         self._record = None
         self._create_ok = create_ok
         self._deleted = False
@@ -73,8 +110,7 @@ class Playlist:
 
     @property
     def url(self) -> str:
-        base = os.environ.get('BASE_URL', f"http://{os.environ['HOST']}:{os.environ['PORT']}")
-        return f"{base}/playlist/{self.slug}"
+        return f"{groove.settings.get().base_url}/playlist/{self.slug}"
 
     @property
     def slug(self) -> str:
@@ -103,28 +139,35 @@ class Playlist:
         """
         Cache the list of entries on this playlist and return it.
         """
-        if not self._entries:
+        if self._entries is None:
             if self.record:
                 query = self.session.query(
                     db.entry,
                     db.track
                 ).filter(
-                    (db.playlist.c.id == self._record.id)
-                ).filter(
-                    db.entry.c.playlist_id == db.playlist.c.id
+                    db.entry.c.playlist_id == self._record.id
                 ).filter(
                     db.entry.c.track_id == db.track.c.id
                 ).order_by(
                     db.entry.c.track
                 )
                 self._entries = query.all()
-        return self._entries
+        return self._entries or []
 
     @property
     def as_dict(self) -> dict:
         """
         Return a dictionary of the playlist and its entries.
         """
+        playlist = self._details
+        playlist['entries'] = [dict(entry) for entry in self.entries]
+        return playlist
+
+    @property
+    def _details(self) -> dict:
+        """
+        Return a dictionary of the playlist, without loading its entries.
+        """
         playlist = {
             'name': self.name,
             'slug': self.slug,
@@ -133,46 +176,82 @@ class Playlist:
         }
         if self.record:
             playlist.update(dict(self.record))
-        playlist['entries'] = [dict(entry) for entry in self.entries]
         return playlist
 
     @property
     def as_string(self) -> str:
-        text = self.info
-        for (tracknum, entry) in enumerate(self.entries):
-            text += f"  {tracknum+1:-3d}.  {entry.artist} - {entry.title}\n"
-        return text
+        return self.info + ''.join(
+            f"  {tracknum+1:-3d}.  {entry.artist} - {entry.title}\n" for (tracknum, entry) in enumerate(self.entries)
+        )
 
     @property
     def as_yaml(self) -> str:
-        template_vars = self.as_dict
-        template_vars['description'] = indent(template_vars['description'], prefix='    ')
-        template_vars['entries'] = ''
+        text = io.StringIO()
+        self.write_yaml(text)
+        return text.getvalue()
+
+    def write_yaml(self, fh) -> None:
+        """
+        Write the playlist to a text file in the editor's YAML format, one entry at a time.
+        """
+        fh.write(EDITOR_HEADER.format(name=self.name, description=indent(self.description, prefix='    ')))
         for entry in self.entries:
-            template_vars['entries'] += f'  - "{entry.artist}": "{entry.title}"\n'
-        return EDITOR_TEMPLATE.format(**template_vars)
+            fh.write(f"  - {_quote(entry.artist)}: {_quote(entry.title)}\n")
+        fh.write(EDITOR_FOOTER)
+
+    def _get_tracks(self, keys: List[tuple], columns: tuple, condition: str, describe) -> List:
+        """
+        Retrieve the one track matching each key, in a few queries however many keys there are. The keys are joined
+        to the track table as a table named wanted, with the specified columns, on the specified condition.
+
+        Every key that matches no track, or more than one, is reported at once: TrackNotFoundError is raised if any
+        key matched no track, and MultipleResultsFound if all of them matched but some matched several.
+        """
+        unique = list(dict.fromkeys(keys))
+        matches = defaultdict(set)
+        for chunk in db.chunked(unique):
+            (cte, params) = db.values_cte('wanted', columns, chunk)
+            wanted = ', '.join(f"wanted.{column}" for column in columns)
+            for row in self.session.execute(
+                text(f"{cte} SELECT {wanted}, track.id FROM wanted JOIN track ON {condition}"), params
+            ):
+                matches[tuple(row[:-1])].add(row[-1])
+
+        missing = [key for key in unique if not matches[key]]
+        ambiguous = [key for key in unique if len(matches[key]) > 1]
+        errors = [f"Could not find track {describe(key)}" for key in missing]
+        errors += [f"Found {len(matches[key])} tracks matching {describe(key)}" for key in ambiguous]
+        if missing:
+            raise TrackNotFoundError("\n".join(errors))
+        if ambiguous:
+            raise MultipleResultsFound("\n".join(errors))
+
+        ids = list({id for key in unique for id in matches[key]})
+        tracks = {}
+        for chunk in db.chunked(ids):
+            tracks.update((row.id, row) for row in self.session.query(db.track).filter(db.track.c.id.in_(chunk)))
+        return [tracks[next(iter(matches[key]))] for key in keys]
 
     def _get_tracks_by_path(self, paths: List[str]) -> List:
         """
-        Retrieve tracks from the database that match the specified path fragments. The exceptions NoResultFound and
-        MultipleResultsFound are expected in the case of no matches and multiple matches, respectively.
+        Retrieve the tracks whose paths contain the specified path fragments (case-insensitive). The exceptions
+        TrackNotFoundError and MultipleResultsFound are expected in the case of no matches and multiple matches,
+        respectively.
         """
-        for path in paths:
-            try:
-                yield self.session.query(db.track).filter(
-                    db.track.c.relpath.ilike(f"%{path}%")
-                ).one()
-            except NoResultFound:
-                raise TrackNotFoundError(f'Could not find track for path "{path}"')
+        return self._get_tracks(
+            [(path, ) for path in paths],
+            columns=('path', ),
+            condition="track.relpath LIKE '%' || wanted.path || '%'",
+            describe=lambda key: f'for path "{key[0]}"'
+        )
 
     def _get_tracks_by_artist_and_title(self, entries: List[tuple]) -> List:
-        for (artist, title) in entries:
-            try:
-                yield self.session.query(db.track).filter(
-                    db.track.c.artist == artist, db.track.c.title == title
-                ).one()
-            except NoResultFound:  # pragma: no cover
-                raise TrackNotFoundError(f'Could not find track "{artist}": "{title}"')
+        return self._get_tracks(
+            [tuple(entry) for entry in entries],
+            columns=('artist', 'title'),
+            condition="track.artist = wanted.artist AND track.title = wanted.title",
+            describe=lambda key: f'"{key[0]}": "{key[1]}"'
+        )
 
     def _get(self):
         try:
@@ -186,7 +265,6 @@ class Playlist:
     def _insert(self, values):
         stmt = db.playlist.insert(values)
         results = self.session.execute(stmt)
-        self.session.commit()
         logging.debug(f"Inserted playlist with slug {self.slug}")
         return self.session.query(db.playlist).filter(
             db.playlist.c.id == results.inserted_primary_key[0]
@@ -195,9 +273,8 @@ class Playlist:
     def _update(self, values):
         stmt = db.playlist.update().where(
             db.playlist.c.id == self._record.id
-        ).values(values)
+        ).values(dict(values, version=db.playlist.c.version + 1))
         self.session.execute(stmt)
-        self.session.commit()
         return self.session.query(db.playlist).filter(
             db.playlist.c.id == self._record.id
         ).one()
@@ -208,7 +285,8 @@ class Playlist:
             return
         try:
             new = Playlist.from_yaml(edits, self.session)
-            if new == self:
+            changes = self.diff(new)
+            if not changes:
                 logging.debug("No changes detected.")
                 return
         except (TypeError, ScannerError) as e:
@@ -217,19 +295,58 @@ class Playlist:
                 "An error occurred reading the input file; this is typically "
                 "the result of an error in the YAML structure."
             )
-        except TrackNotFoundError as e:
+        except (TrackNotFoundError, MultipleResultsFound) as e:
             logging.error(e)
             raise PlaylistValidationError(
                 "One or more of the specified tracks "
                 "did not exactly match an entry in the database."
             )
-        logging.debug(f"Updating {self.slug} with new edits.")
+        logging.debug(
+            f"Updating {self.slug} with new edits: {', '.join(changes.fields) or 'no details'} changed; "
+            f"{len(changes.inserted)} entries inserted, {len(changes.removed)} removed and {len(changes.moved)} moved."
+        )
         self._slug = new.slug
         self._name = new.name.strip()
         self._description = new.description.strip()
-        self._entries = new._entries
+        # Entries that haven't been replaced aren't saved.
+        self._entries = new._entries if changes.entries_changed else None
         self.save()
 
+    def diff(self, other: 'Playlist') -> PlaylistDiff:
+        """
+        Compare the details and entries of this playlist with another's, in time proportional to their length.
+
+        Returns:
+            PlaylistDiff: The changes that would turn this playlist into the other.
+        """
+        fields = {
+            key: (getattr(self, key), getattr(other, key))
+            for key in ('name', 'slug', 'description') if getattr(self, key) != getattr(other, key)
+        }
+        old = [entry.id for entry in self.entries]
+        new = [entry.id for entry in other.entries]
+        common = ordering.common(old, new)
+        kept = set(common.values())
+        removed = [(position, track_id) for (position, track_id) in enumerate(old) if position not in kept]
+        inserted = [(position, track_id) for (position, track_id) in enumerate(new) if position not in common]
+
+        # An entry removed from one place and inserted at another has moved.
+        removed_from = defaultdict(deque)
+        for (position, track_id) in removed:
+            removed_from[track_id].append(position)
+        moved = [
+            (removed_from[track_id].popleft(), position, track_id)
+            for (position, track_id) in inserted if removed_from[track_id]
+        ]
+        moved_from = {old_position for (old_position, _, _) in moved}
+        moved_to = {new_position for (_, new_position, _) in moved}
+        return PlaylistDiff(
+            fields=fields,
+            inserted=[entry for entry in inserted if entry[0] not in moved_to],
+            removed=[entry for entry in removed if entry[0] not in moved_from],
+            moved=moved
+        )
+
     def add(self, paths: List[str]) -> int:
         """
         Add entries to the playlist.  Each path should match one and only one track in the database (case-insensitive).
@@ -243,12 +360,9 @@ class Playlist:
         """
         logging.debug(f"Attempting to add tracks matching: {paths}")
         try:
-            return self.create_entries(list(self._get_tracks_by_path(paths)))
-        except NoResultFound:  # pragma: no cover
-            logging.error("One or more of the specified paths do not match any tracks in the database.")
-            return 0
-        except MultipleResultsFound:  # pragma: no cover
-            logging.error("One or more of the specified paths matches multiple tracks in the database.")
+            return self.create_entries(self._get_tracks_by_path(paths))
+        except MultipleResultsFound as e:
+            logging.error(e)
             return 0
 
     def delete(self) -> Union[int, None]:
@@ -265,6 +379,8 @@ class Playlist:
         logging.debug(f"Deleting playlist {plid}: {stmt}")
         self.session.execute(stmt)
         self.session.commit()
+        cache.pages().invalidate(self.slug)
+        cache.known_slugs().discard(self.slug)
         self._record = None
         self._entries = None
         self._deleted = True
@@ -284,6 +400,9 @@ class Playlist:
                 self.save()
 
     def save(self) -> Row:
+        """
+        Save the playlist and its entries in one transaction.
+        """
         values = {
             'slug': self.slug,
             'name': self.name,
@@ -293,21 +412,72 @@ class Playlist:
             raise PlaylistValidationError("This playlist has no name.")
         if not self.slug:
             raise PlaylistValidationError("This playlist has no slug.")
+        previous = snapshots.read_by_id(self.session, self._record.id) if self._record else None
+        renamed = self._record.slug if self._record and self._record.slug != self.slug else None
         self._record = self._update(values) if self._record else self._insert(values)
         logging.debug(f"Saved playlist {self._record.id} with slug {self._record.slug}")
-        self.save_entries()
+        changes = self._save_entries()
+        self._update_snapshot(previous, changes, self._entries or [])
+        self.session.commit()
+        cache.pages().invalidate(self.slug)
+        cache.known_slugs().add(self.slug)
+        if renamed:
+            cache.pages().invalidate(renamed)
+            cache.known_slugs().discard(renamed)
+
+    def save_entries(self) -> int:
+        """
+        Bring the stored entries of the playlist in line with its entries, deleting and inserting only the entries
+        that were removed, added or moved. Entries that haven't been loaded or replaced are left alone. The caller is
+        responsible for committing the transaction.
+
+        Returns:
+            int: The number of entries deleted and inserted.
+        """
+        changes = self._save_entries()
+        return len(changes.removed) + len(changes.inserted) if changes else 0
 
-    def save_entries(self):
+    def _save_entries(self) -> Union[ordering.Changes, None]:
+        """
+        Like save_entries(), but return the changes made, or None if the entries haven't been loaded or replaced.
+        """
+        if self._entries is None:
+            return None
         plid = self.record.id
-        stmt = delete(db.entry).where(db.entry.c.playlist_id == plid)
-        logging.debug(f"Deleting stale entries associated with playlist {plid}: {stmt}")
-        self.session.execute(stmt)
-        return self.create_entries(self.entries)
+        stored = self.session.execute(
+            select(db.entry.c.track, db.entry.c.track_id).where(
+                db.entry.c.playlist_id == plid
+            ).order_by(
+                db.entry.c.track
+            )
+        ).all()
+        track_ids = [obj.id for obj in self._entries]
+        changes = ordering.changes(stored, track_ids)
+        if changes is None:
+            logging.debug(f"Renumbering the entries of playlist {plid}")
+            self.session.execute(delete(db.entry).where(db.entry.c.playlist_id == plid))
+            changes = ordering.Changes(
+                removed=[key for (key, _) in stored],
+                inserted=list(zip(ordering.keys(len(track_ids)), track_ids))
+            )
+        elif changes.removed:
+            self.session.execute(
+                delete(db.entry).where(db.entry.c.playlist_id == plid, db.entry.c.track == bindparam('key')),
+                [{'key': key} for key in changes.removed]
+            )
+        if changes.inserted:
+            self.session.execute(db.entry.insert(), [
+                {'playlist_id': plid, 'track_id': track_id, 'track': key} for (key, track_id) in changes.inserted
+            ])
+        logging.debug(
+            f"Removed {len(changes.removed)} and inserted {len(changes.inserted)} entries of playlist {plid}"
+        )
+        return changes
 
     def create_entries(self, tracks: List[Row]) -> int:
         """
         Append a list of tracks to a playlist by populating the entries table with records referencing the playlist and
-        the specified tracks.
+        the specified tracks, in one transaction.
 
         Args:
             tracks (list): A list of Row objects from the track table.
@@ -315,25 +485,65 @@ class Playlist:
         Returns:
             int: The number of tracks added.
         """
-        if not tracks:
-            tracks = self.entries
         if not tracks:
             return 0
-        maxtrack = self.session.query(func.max(db.entry.c.track)).filter_by(
+        last = self.session.query(func.max(db.entry.c.track)).filter_by(
             playlist_id=self.record.id
-        ).one()[0] or 0
+        ).scalar() or 0
+        previous = snapshots.read_by_id(self.session, self.record.id)
 
+        inserted = list(zip(ordering.keys(len(tracks), after=last), (obj.id for obj in tracks)))
         self.session.execute(
             db.entry.insert(),
-            [
-                {'playlist_id': self.record.id, 'track_id': obj.id, 'track': idx}
-                for (idx, obj) in enumerate(tracks, start=maxtrack+1)
-            ]
+            [{'playlist_id': self.record.id, 'track_id': track_id, 'track': key} for (key, track_id) in inserted]
         )
-        self.session.commit()
+        self.session.execute(
+            db.playlist.update().where(
+                db.playlist.c.id == self.record.id
+            ).values(version=db.playlist.c.version + 1)
+        )
+        self._record = self.session.query(db.playlist).filter(db.playlist.c.id == self._record.id).one()
         self._entries = None
+        self._update_snapshot(previous, ordering.Changes(removed=[], inserted=inserted), tracks)
+        self.session.commit()
+        cache.pages().invalidate(self.slug)
+        cache.known_slugs().add(self.slug)
         return len(tracks)
 
+    def _update_snapshot(self,
+                         previous: Union[snapshots.Snapshot, None],
+                         changes: Union[ordering.Changes, None],
+                         tracks: List[Row]) -> None:
+        """
+        Snapshot the playlist for serving by applying the changes just made to its entries to its previous snapshot,
+        or by rebuilding the snapshot if it had none. The tracks must include those of every entry inserted.
+        """
+        if previous is None:
+            return self._write_snapshot()
+        inserted = []
+        if changes and changes.inserted:
+            wanted = {track_id for (_, track_id) in changes.inserted}
+            columns = [column.name for column in db.track.c]
+            rows = {row.id: row._mapping for row in tracks if row.id in wanted}
+            # The same keys, in the same order, as an entry joined to its track: the entry's columns, then the track's.
+            inserted = [
+                dict({'track': key, 'playlist_id': self._record.id, 'track_id': track_id},
+                     **{name: rows[track_id][name] for name in columns})
+                for (key, track_id) in changes.inserted
+            ]
+        removed = changes.removed if changes else []
+        if not snapshots.patch(self.session, previous, self._details, removed, inserted, sign=requests.sign_entries):
+            logging.debug(f"Rebuilding the snapshot of playlist {self._record.id} signed in another epoch")
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        """
+        Reload the playlist and its entries as they have been saved, and snapshot them for serving.
+        """
+        self._record = self.session.query(db.playlist).filter(db.playlist.c.id == self._record.id).one()
+        self._entries = None
+        snapshots.write(self.session, self.as_dict, sign=requests.sign_entries)
+
     @classmethod
     def by_slug(cls, slug, session):
         try:
@@ -345,6 +555,60 @@ class Playlist:
             raise ex
         return cls.from_row(row, session)
 
+    @classmethod
+    def summaries(cls, session) -> List[PlaylistSummary]:
+        """
+        Summarize every playlist, in order of id, without loading any of their entries.
+        """
+        query = select(
+            db.playlist.c.id,
+            db.playlist.c.name,
+            db.playlist.c.slug,
+            db.playlist.c.description,
+            func.count(db.track.c.id),
+            func.coalesce(func.sum(db.track.c.duration), 0),
+        ).select_from(
+            db.playlist.outerjoin(
+                db.entry, db.entry.c.playlist_id == db.playlist.c.id
+            ).outerjoin(
+                db.track, db.track.c.id == db.entry.c.track_id
+            )
+        ).group_by(
+            db.playlist.c.id
+        ).order_by(
+            db.playlist.c.id
+        )
+        return [PlaylistSummary(*row) for row in session.execute(query)]
+
+    @classmethod
+    def refresh_snapshots(cls, session) -> int:
+        """
+        Snapshot every playlist that has no snapshot, because it has never been saved since snapshots were introduced
+        or something it was built from has changed, and commit.
+
+        Returns:
+            int: The number of playlists snapshotted.
+        """
+        rows = session.query(db.playlist).outerjoin(
+            db.playlist_snapshot, db.playlist_snapshot.c.playlist_id == db.playlist.c.id
+        ).filter(
+            db.playlist_snapshot.c.playlist_id.is_(None)
+        ).all()
+        for row in rows:
+            snapshots.write(session, cls.from_row(row, session).as_dict, sign=requests.sign_entries)
+        session.commit()
+        return len(rows)
+
+    @classmethod
+    def version_by_slug(cls, slug, session) -> Union[int, None]:
+        """
+        Return the current version of the playlist with the specified slug, without loading it. The version changes
+        every time the playlist or its entries are saved.
+        """
+        return session.query(db.playlist.c.version).filter(
+            db.playlist.c.slug == slug
+        ).scalar()
+
     @classmethod
     def from_row(cls, row, session):
         pl = Playlist(
@@ -371,21 +635,15 @@ class Playlist:
             if not source[name]['entries']:
                 pl._entries = []
             else:
-                pl._entries = list(pl._get_tracks_by_artist_and_title(entries=[
+                pl._entries = pl._get_tracks_by_artist_and_title(entries=[
                     list(entry.items())[0] for entry in source[name]['entries']
-                ]))
+                ])
         except (IndexError, KeyError, AttributeError):
             raise PlaylistValidationError("The specified source was not a valid playlist.")
         return pl
 
     def __eq__(self, obj):
-        logging.debug(f"Comparing obj to self:\n{obj.as_string}\n--\n{self.as_string}")
-        return obj.as_string == self.as_string
-        for key in ('slug', 'name', 'description'):
-            if getattr(obj, key) != getattr(self, key):
-                logging.debug(f"{key}: {getattr(obj, key)} != {getattr(self, key)}")
-                return False
-        return True
+        return not self.diff(obj)
 
     def __repr__(self):
         return self.as_string
@@ -0,0 +1,211 @@
+import dataclasses
+import os
+import re
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+from dotenv import load_dotenv
+
+import groove.path
+from groove.exceptions import ConfigurationError
+
+# The PRAGMAs applied to every database connection. SQLITE_PRAGMAS overrides individual values.
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'wal'),
+    ('synchronous', 'normal'),
+    ('mmap_size', '268435456'),
+    ('cache_size', '-16384'),
+    ('temp_store', 'memory'),
+    ('busy_timeout', '5000'),
+)
+
+
+def _sqlite_pragmas(overrides: str) -> tuple:
+    """
+    Merge a comma-separated list of name=value PRAGMAs into the default profile.
+    """
+    pragmas = dict(SQLITE_PRAGMAS)
+    for pragma in filter(None, (part.strip() for part in overrides.split(','))):
+        (name, _, value) = pragma.partition('=')
+        (name, value) = (name.strip().lower(), value.strip())
+        if not re.fullmatch(r'[a-z_]+', name) or not re.fullmatch(r'-?\w+', value):
+            raise ConfigurationError(f"Invalid SQLITE_PRAGMAS entry: {pragma}")
+        pragmas[name] = value
+    return tuple(pragmas.items())
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    """
+    SYNOPSIS
+
+        The Groove on Demand configuration, resolved from the environment and
+        validated once, so that hot paths never read the environment or stat
+        the configured directories.
+
+    USAGE
+
+        Settings.from_environ([config_file])
+
+    ARGS
+
+        config_file     The dotenv file the environment was loaded from, if any. It
+                        is re-read when the settings are reloaded.
+
+    EXAMPLES
+
+        Settings.from_environ().media_root
+        >>> PosixPath('/media/audio/lossless')
+
+        with override(secret_key='fnord'):
+            ...
+
+    """
+    media_root: Path
+    cache_root: Path
+    static_root: Path
+    themes_root: Path
+    assets_root: Path
+    database: Path
+    db_pool_size: int = 8
+    sqlite_pragmas: tuple = SQLITE_PRAGMAS
+    media_glob: tuple = ('*.mp3', '*.flac', '*.m4a')
+    transcoder: str = ''
+    default_theme: str = 'blue_train'
+    theme_reload_interval: float = 5
+    host: Union[str, None] = None
+    port: Union[str, None] = None
+    workers: int = 1
+    reuse_port: bool = False
+    max_requests: int = 0
+    graceful_timeout: float = 30
+    asgi: bool = False
+    asgi_threads: int = 32
+    base_url: str = 'http://127.0.0.1:2323'
+    secret_key: str = ''
+    previous_secret_key: Union[str, None] = None
+    signature_ttl: int = 0
+    signature_cache_size: int = 4096
+    sendfile_header: Union[str, None] = None
+    sendfile_prefix: str = '/_groove'
+    page_cache_size: int = 256
+    page_cache_disk: bool = False
+    username: Union[str, None] = None
+    password: Union[str, None] = None
+    editor: str = 'vim'
+    console_width: str = 'auto'
+    completion_index: bool = False
+    debug: bool = False
+    config_file: Union[Path, None] = None
+
+    @classmethod
+    def from_environ(cls, config_file: Union[Path, None] = None) -> 'Settings':
+        """
+        Resolve and validate the settings from the environment. Raises ConfigurationError if the environment is
+        incomplete or a configured directory doesn't exist.
+        """
+        env = os.environ
+        host = env.get('HOST', None)
+        port = env.get('PORT', None)
+        return cls(
+            media_root=groove.path.media_root(),
+            cache_root=groove.path.cache_root(),
+            static_root=groove.path.static_root(),
+            themes_root=groove.path.themes_root(),
+            assets_root=groove.path.assets_root(),
+            database=groove.path.database(),
+            db_pool_size=int(env.get('DB_POOL_SIZE', 8)),
+            sqlite_pragmas=_sqlite_pragmas(env.get('SQLITE_PRAGMAS', '')),
+            media_glob=tuple(env.get('MEDIA_GLOB', '*.mp3,*.flac,*.m4a').split(',')),
+            transcoder=env.get('TRANSCODER', ''),
+            default_theme=env.get('DEFAULT_THEME', 'blue_train'),
+            theme_reload_interval=float(env.get('THEME_RELOAD_INTERVAL', 5)),
+            host=host,
+            port=port,
+            workers=int(env.get('WORKERS', 1)),
+            reuse_port=bool(env.get('REUSE_PORT', None)),
+            max_requests=int(env.get('MAX_REQUESTS', 0)),
+            graceful_timeout=float(env.get('GRACEFUL_TIMEOUT', 30)),
+            asgi=bool(env.get('ASGI', None)),
+            asgi_threads=int(env.get('ASGI_THREADS', 32)),
+            base_url=env.get('BASE_URL', f"http://{host or '127.0.0.1'}:{port or 2323}"),
+            secret_key=env.get('SECRET_KEY', ''),
+            previous_secret_key=env.get('PREVIOUS_SECRET_KEY', None) or None,
+            signature_ttl=int(env.get('SIGNATURE_TTL', 0) or 0),
+            signature_cache_size=int(env.get('SIGNATURE_CACHE_SIZE', 4096)),
+            sendfile_header=env.get('SENDFILE_HEADER', None) or None,
+            sendfile_prefix=env.get('SENDFILE_PREFIX', '/_groove').rstrip('/'),
+            page_cache_size=int(env.get('PAGE_CACHE_SIZE', 256)),
+            page_cache_disk=bool(env.get('PAGE_CACHE_DISK', None)),
+            username=env.get('USERNAME', None),
+            password=env.get('PASSWORD', None),
+            editor=env.get('EDITOR', 'vim'),
+            console_width=env.get('CONSOLE_WIDTH', 'auto'),
+            completion_index=env.get('COMPLETION_INDEX', '0') not in ('', '0'),
+            debug=bool(env.get('DEBUG', None)),
+            config_file=config_file,
+        )
+
+    def replace(self, **changes) -> 'Settings':
+        return dataclasses.replace(self, **changes)
+
+    def media(self, relpath: str) -> Path:
+        return self.media_root / Path(relpath)
+
+    def transcoded_media(self, relpath: str) -> Path:
+        return self.cache_root / Path(relpath + '.webm')
+
+
+_current = None
+
+
+def get() -> Settings:
+    """
+    Return the current settings, resolving them from the environment if they haven't been configured.
+    """
+    if _current is None:
+        configure(Settings.from_environ())
+    return _current
+
+
+def configure(settings: Settings) -> Settings:
+    """
+    Make the specified settings current.
+    """
+    global _current
+    _current = settings
+    return _current
+
+
+def reload() -> Settings:
+    """
+    Re-read the configuration file, if there is one, and resolve the settings again.
+    """
+    config_file = _current.config_file if _current else None
+    if config_file:
+        load_dotenv(config_file, override=True)
+    return configure(Settings.from_environ(config_file=config_file))
+
+
+def reset() -> None:
+    """
+    Forget the current settings, so that they are resolved again on next use.
+    """
+    global _current
+    _current = None
+
+
+@contextmanager
+def override(**changes):
+    """
+    Temporarily replace some of the current settings.
+    """
+    global _current
+    previous = _current
+    configure(get().replace(**changes))
+    try:
+        yield _current
+    finally:
+        _current = previous
@@ -3,6 +3,7 @@ from collections import namedtuple, defaultdict
 
 from prompt_toolkit.completion import Completer, Completion
 from groove.console import Console
+import groove.settings
 from textwrap import dedent
 
 COMMANDS = defaultdict(dict)
@@ -30,7 +31,7 @@ def command(usage):
 
 class BasePrompt(Completer):
 
-    def __init__(self, manager=None, console=None, parent=None):
+    def __init__(self, manager=None, console=None, parent=None, settings=None):
         super(BasePrompt, self).__init__()
 
         if (not manager and not parent):  # pragma: no cover
@@ -40,6 +41,7 @@ class BasePrompt(Completer):
         self._autocomplete_values = []
         self._parent = parent
         self._manager = manager
+        self._settings = settings
         self._console = None
         self._theme = None
 
@@ -49,8 +51,12 @@ class BasePrompt(Completer):
         except KeyError:
             return self.usage
 
-    def default_completer(self, document, complete_event):
-        raise NotImplementedError(f"Implement the 'default_completer' method of {self.__class__.__name__}")
+    @property
+    def default_completer(self):
+        """
+        The completer for input that doesn't match a command, if any.
+        """
+        return None
 
     @property
     def usage(self):
@@ -83,6 +89,14 @@ class BasePrompt(Completer):
         elif self._parent:
             return self._parent.manager
 
+    @property
+    def settings(self):
+        if self._settings:
+            return self._settings
+        elif self._parent:
+            return self._parent.settings
+        return groove.settings.get()
+
     @property
     def parent(self):
         return self._parent
@@ -95,19 +109,30 @@ class BasePrompt(Completer):
     def autocomplete_values(self):
         return self._autocomplete_values
 
-    def get_completions(self, document, complete_event):  # pragma: no cover
+    def _command_completions(self, document):
         word = document.get_word_before_cursor()
-        found = False
         for value in self.autocomplete_values:
             if word in value:
-                found = True
                 yield Completion(value, start_position=-len(word))
-        if not found:
-            try:
-                for result in self.default_completer(document, complete_event):
-                    yield result
-            except NotImplementedError:
-                pass
+
+    def get_completions(self, document, complete_event):  # pragma: no cover
+        found = False
+        for completion in self._command_completions(document):
+            found = True
+            yield completion
+        completer = self.default_completer
+        if not found and completer:
+            yield from completer.get_completions(document, complete_event)
+
+    async def get_completions_async(self, document, complete_event):  # pragma: no cover
+        found = False
+        for completion in self._command_completions(document):
+            found = True
+            yield completion
+        completer = self.default_completer
+        if not found and completer:
+            async for completion in completer.get_completions_async(document, complete_event):
+                yield completion
 
     def help(self, parts):
         attr = None
@@ -6,18 +6,17 @@ from groove.media.transcoder import Transcoder
 from groove.shell.base import BasePrompt, command
 from groove.exceptions import InvalidPathError
 from groove import db
+from groove.db import counters
 from groove.playlist import Playlist
 
 from rich.table import Column
 from rich import box
 
-from sqlalchemy import func
-
 
 class InteractiveShell(BasePrompt):
 
-    def __init__(self, manager):
-        super().__init__(manager=manager)
+    def __init__(self, manager, settings=None):
+        super().__init__(manager=manager, settings=settings)
         self._playlist = None
         self._completer = None
         self._prompt = [
@@ -26,6 +25,9 @@ class InteractiveShell(BasePrompt):
         ]
         self._subshells = {}
         self._register_subshells()
+        if self.settings.completion_index:
+            with self.console.status("Loading tracks and playlists for completion..."):
+                self.manager.build_completion_indexes(db.track.c.relpath, db.playlist.c.name)
 
     def _register_subshells(self):
         for subclass in BasePrompt.__subclasses__():
@@ -34,9 +36,7 @@ class InteractiveShell(BasePrompt):
             self._subshells[subclass.__name__] = subclass(manager=self.manager, parent=self)
 
     def _get_stats(self):
-        playlists = self.manager.session.query(func.count(db.playlist.c.id)).scalar()
-        entries = self.manager.session.query(func.count(db.entry.c.track)).scalar()
-        tracks = self.manager.session.query(func.count(db.track.c.relpath)).scalar()
+        (playlists, entries, tracks) = counters.get(self.manager.session)
         return f"Database contains {playlists} playlists with a total of {entries} entries, from {tracks} known tracks."
 
     @property
@@ -47,7 +47,8 @@ class InteractiveShell(BasePrompt):
     def autocomplete_values(self):
         return list(self.commands.keys())
 
-    def default_completer(self, document, complete_event):  # pragma: no cover
+    @property
+    def default_completer(self):  # pragma: no cover
         def _formatter(row):
             self._playlist = Playlist.from_row(row, self.manager.session)
             return self.playlist.record.name
@@ -55,7 +56,7 @@ class InteractiveShell(BasePrompt):
             db.playlist,
             db.playlist.c.name,
             _formatter
-         ).get_completions(document, complete_event)
+         )
 
     def process(self, cmd, *parts):
         if cmd in self.commands:
@@ -85,11 +86,12 @@ class InteractiveShell(BasePrompt):
         """
         path = ' '.join(parts) if parts else None
         try:
-            scanner = MediaScanner(path=path, db=self.manager.session, console=self.console)
+            scanner = MediaScanner(path=path, db=self.manager.session, console=self.console, settings=self.settings)
         except InvalidPathError as e:
             self.console.error(str(e))
             return True
         scanner.scan()
+        self.manager.refresh_completion_indexes(db.track)
 
     @command(usage="""
     [title]TRANSCODING[/title]
@@ -110,7 +112,7 @@ class InteractiveShell(BasePrompt):
         Run the transcoder.
         """
         tracks = self.manager.session.query(db.track).filter(db.entry.c.track_id == db.track.c.id).all()
-        transcoder = Transcoder(console=self.console)
+        transcoder = Transcoder(console=self.console, settings=self.settings)
         transcoder.transcode([track['relpath'] for track in tracks])
 
     @command("""
@@ -132,6 +134,7 @@ class InteractiveShell(BasePrompt):
             Column('#', justify='right', width=4),
             Column('Name'),
             Column('Tracks', justify='right', width=4),
+            Column('Time', justify='right', width=8),
             Column('Description'),
             Column('Link'),
             box=box.HORIZONTALS,
@@ -141,14 +144,14 @@ class InteractiveShell(BasePrompt):
             caption_justify='right',
             expand=True
         )
-        query = self.manager.session.query(db.playlist)
-        for row in db.windowed_query(query, db.playlist.c.id, 1000):
-            pl = Playlist.from_row(row, self.manager.session)
+        for pl in Playlist.summaries(self.manager.session):
+            (minutes, seconds) = divmod(int(pl.duration), 60)
             table.add_row(
-                f"[dim]{pl.record.id}[/dim]",
-                f"[title]{pl.record.name}[/title]",
-                f"[text]{len(pl.entries)}[/text]",
-                f"[text]{pl.record.description}[/text]",
+                f"[dim]{pl.id}[/dim]",
+                f"[title]{pl.name}[/title]",
+                f"[text]{pl.tracks}[/text]",
+                f"[text]{minutes}:{seconds:02d}[/text]" if pl.duration else '',
+                f"[text]{pl.description}[/text]",
                 f"[link]{pl.url}[/link]",
             )
         self.console.print(table)
@@ -185,6 +188,7 @@ class InteractiveShell(BasePrompt):
             create_ok=True
         )
         self._subshells['_playlist'].start()
+        self.manager.refresh_completion_indexes(db.playlist)
         return True
 
     @command(usage="""
@@ -1,7 +1,5 @@
 from .base import BasePrompt, command
 
-import os
-
 from sqlalchemy.exc import NoResultFound
 from textwrap import dedent, wrap
 from rich.table import Column
@@ -26,13 +24,13 @@ class _playlist(BasePrompt):
             f"You are currently editing the [b]{self.parent.playlist.name}[/b]"
             f" playlist. From this prompt you can quickly append new tracks "
             f"to the playlist. You can invoke your editor "
-            f"([link]{os.environ['EDITOR']}[/link]) to change the playlist "
+            f"([link]{self.settings.editor}[/link]) to change the playlist "
             f"name and description, or reorder or remove tracks. You can also "
             f"delete the playlist."
         )
 
         try:
-            width = int(os.environ.get('CONSOLE_WIDTH', '80'))
+            width = int(self.settings.console_width)
         except ValueError:  # pragma: no cover
             width = 80
         synopsis = '\n        '.join(wrap(synopsis, width=width))
@@ -91,6 +89,7 @@ class _playlist(BasePrompt):
         except PlaylistValidationError as e:  # pragma: no cover
             self.console.error(f"Changes were not saved: {e}")
         else:
+            self.manager.refresh_completion_indexes(db.playlist, ids=[self.parent.playlist.record.id])
             self.show()
         return True
 
@@ -136,9 +135,9 @@ class _playlist(BasePrompt):
     your library will be suggested automatically. To accept a match, hit <TAB>,
     or use the arrow keys to choose a different suggestion.
 
-    Hit <ENTER> to add your selected track to the current playlist. You can
-    then add another track, or hit <ENTER> again to return to the playlist
-    editor.
+    Hit <ENTER> to select your track. You can then select another track, or
+    hit <ENTER> again to add the selected tracks to the current playlist and
+    return to the playlist editor.
 
     [title]USAGE[/title]
 
@@ -149,7 +148,7 @@ class _playlist(BasePrompt):
         self.console.print(
             "Add tracks one at a time by title. Hit Enter to finish."
         )
-        added = False
+        tracks = []
         while True:
             text = self.console.prompt(
                 [' ?'],
@@ -158,24 +157,24 @@ class _playlist(BasePrompt):
                     db.track.c.relpath,
                     lambda row: row.relpath
                 ),
-                complete_in_thread=True, complete_while_typing=True
+                complete_while_typing=True
             )
             if not text:
-                if added:
+                if tracks:
+                    self.parent.playlist.create_entries(tracks)
                     self.show()
                 return True
-            self._add_track(text)
-            added = True
+            track = self._find_track(text)
+            if track:
+                tracks.append(track)
 
-    def _add_track(self, text):
+    def _find_track(self, text):
         sess = self.parent.manager.session
         try:
-            track = sess.query(db.track).filter(db.track.c.relpath == text).one()
-            self.parent.playlist.create_entries([track])
+            return sess.query(db.track).filter(db.track.c.relpath == text).one()
         except NoResultFound:  # pragma: no cover
-            self.console.error("No match for '{text}'")
-            return
-        return text
+            self.console.error(f"No match for '{text}'")
+            return None
 
     @command("""
     [title]DELETING A PLAYLIST[/title]
@@ -203,6 +202,7 @@ class _playlist(BasePrompt):
             return True
 
         self.parent.playlist.delete()
+        self.manager.refresh_completion_indexes(db.playlist)
         self.console.print("Deleted the playlist.")
         self.parent._playlist = None
         return False
@@ -0,0 +1,208 @@
+import asyncio
+import io
+import logging
+import sys
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Union
+
+from groove.exceptions import ConfigurationError
+from groove.webserver.streaming import CHUNK_SIZE
+
+try:
+    import uvicorn
+except ImportError:  # pragma: no cover
+    uvicorn = None
+
+
+class FileWrapper:
+    """
+    The wsgi.file_wrapper of ASGI requests. It lets Application recognize file responses and read them a chunk at a
+    time, so that a thread is only occupied while a chunk is read from disk, not while it is sent to a slow client.
+    """
+
+    def __init__(self, filelike, block_size: int = CHUNK_SIZE) -> None:
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def read(self) -> bytes:
+        return self.filelike.read(self.block_size)
+
+    def __iter__(self):
+        return iter(self.read, b'')
+
+    def close(self) -> None:
+        if hasattr(self.filelike, 'close'):
+            self.filelike.close()
+
+
+_STOP = object()
+
+
+def _next(iterator):
+    return next(iterator, _STOP)
+
+
+class Application:
+    """
+    SYNOPSIS
+
+        Serve the Groove on Demand routes to an ASGI server. Each request is routed and
+        handled, including its database queries, in a worker thread, but response bodies
+        are sent from the event loop, so a slow listener occupies a coroutine rather than
+        a thread for the length of a download.
+
+    USAGE
+
+        Application([ARGS])
+
+    ARGS
+
+        wsgi_app    The WSGI application whose routes to serve. Defaults to the
+                    Groove on Demand bottle app.
+        executor    The executor that handles requests and reads files. Defaults to
+                    a thread pool of ASGI_THREADS threads.
+
+    EXAMPLES
+
+        uvicorn.run(Application(), host='127.0.0.1', port=2323)
+
+    """
+
+    def __init__(self, wsgi_app: Union[Callable, None] = None, executor: Union[Executor, None] = None) -> None:
+        if wsgi_app is None:  # pragma: no cover
+            from groove.webserver import webserver
+            wsgi_app = webserver.server
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+        if self.executor is None:  # pragma: no cover
+            import groove.settings
+            self.executor = ThreadPoolExecutor(
+                max_workers=groove.settings.get().asgi_threads,
+                thread_name_prefix='groove-asgi'
+            )
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                from groove.webserver import themes
+                await self._run(themes.registry().preload)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope: dict, receive: Callable, send: Callable) -> None:
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                break
+
+        (status, headers, result) = await self._run(self._call_wsgi, environ(scope, body))
+        disconnected = asyncio.ensure_future(self._disconnected(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if scope['method'] == 'HEAD':
+                pass
+            elif isinstance(result, FileWrapper):
+                read = result.read
+                while not disconnected.done():
+                    chunk = await self._run(read)
+                    if not chunk:
+                        break
+                    await send({'type': 'http.response.body', 'body': bytes(chunk), 'more_body': True})
+            elif isinstance(result, (list, tuple)):
+                for chunk in result:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                iterator = iter(result)
+                while not disconnected.done():
+                    chunk = await self._run(_next, iterator)
+                    if chunk is _STOP:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': bytes(chunk), 'more_body': True})
+            if disconnected.done():
+                logging.debug(f"Client disconnected from {scope['path']}")
+            else:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+            if hasattr(result, 'close'):
+                await self._run(result.close)
+
+    async def _disconnected(self, receive: Callable) -> None:
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    def _call_wsgi(self, environ: dict) -> tuple:
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for (name, value) in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        return (response['status'], response['headers'], result)
+
+
+def environ(scope: dict, body: bytes = b'') -> dict:
+    """
+    Translate an ASGI HTTP connection scope into a WSGI environment.
+    """
+    (server_name, server_port) = scope.get('server') or ('localhost', 80)
+    env = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': FileWrapper,
+    }
+    for (name, value) in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            env[name] = value
+            continue
+        key = f"HTTP_{name}"
+        env[key] = f"{env[key]},{value}" if key in env else value
+    return env
+
+
+def run(app: Application, host: str, port: int) -> None:  # pragma: no cover
+    """
+    Serve the application with uvicorn.
+    """
+    if not uvicorn:
+        raise ConfigurationError(
+            "The ASGI server requires uvicorn. Install it with 'pip install uvicorn' or use the default server."
+        )
+    uvicorn.run(app, host=host, port=int(port), log_level='warning', lifespan='on')
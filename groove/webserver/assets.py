@@ -0,0 +1,228 @@
+import gzip
+import io
+import json
+import logging
+import re
+
+from collections import namedtuple
+from hashlib import blake2b
+from pathlib import Path, PurePosixPath
+from typing import Union
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+import groove.settings
+from groove.webserver import themes
+
+# Assets worth compressing; images and icons are compressed already.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+
+# Precompressed variants, in order of preference, and the suffixes under which they are written.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+Manifest = namedtuple('Manifest', 'version,urls,files')
+
+_EMPTY_MANIFEST = Manifest(version='', urls={}, files={})
+
+# Content hashes of static assets, keyed by path and modification time.
+_fingerprints = {}
+
+# Build manifests, keyed by theme name.
+_manifests = {}
+
+
+def fingerprint(asset: themes.StaticFile) -> str:
+    """
+    Return a short hash of a static asset's contents. Raises OSError if the asset cannot be read.
+
+    The asset's modification time is checked on every call rather than taken from the theme registry, which only
+    notices changes once per reload interval (or never, if the checks are disabled); an asset edited in place must
+    never be served under its old fingerprint, which clients cache forever.
+    """
+    key = (asset.path, asset.path.stat().st_mtime_ns)
+    if key not in _fingerprints:
+        digest = blake2b(digest_size=8)
+        with asset.path.open('rb') as fh:
+            for chunk in iter(lambda: fh.read(64 * 1024), b''):
+                digest.update(chunk)
+        _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+
+def url(filepath: str, theme: themes.Theme) -> str:
+    """
+    Return the fingerprinted URL of a static asset, for use in templates. Built assets use their content-hashed
+    file names; other assets carry their fingerprint in the query string. Either way the URL changes whenever the
+    asset does, so it may be cached forever.
+    """
+    hashed = manifest(theme.name).urls.get(filepath)
+    if hashed:
+        return f"/static/{hashed}"
+    asset = themes.registry().static(filepath, theme.name)
+    if not asset:
+        return f"/static/{filepath}"
+    try:
+        return f"/static/{filepath}?v={fingerprint(asset)}"
+    except OSError:  # pragma: no cover
+        return f"/static/{filepath}"
+
+
+def _minify_css(text: str) -> str:
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip() + '\n'
+
+
+def _minify_js(text: str) -> str:
+    """
+    Conservatively minify javascript by removing indentation, blank lines and comments that occupy whole lines.
+    Line breaks are preserved so that automatic semicolon insertion behaves as it did in the original.
+    """
+    lines = []
+    in_comment = False
+    for line in text.splitlines():
+        line = line.strip()
+        if in_comment:
+            in_comment = '*/' not in line
+            continue
+        if line.startswith('/*') and not line.startswith('/*!'):
+            in_comment = '*/' not in line
+            continue
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def minify(relpath: str, content: bytes) -> bytes:
+    suffix = PurePosixPath(relpath).suffix
+    if suffix == '.css':
+        return _minify_css(content.decode()).encode()
+    if suffix == '.js':
+        return _minify_js(content.decode()).encode()
+    return content
+
+
+def _gzip(content: bytes) -> bytes:
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as fh:
+        fh.write(content)
+    return buf.getvalue()
+
+
+def build(output: Union[Path, None] = None) -> dict:
+    """
+    Minify and fingerprint the static assets of every theme, write gzip (and, if the brotli module is installed,
+    brotli) variants of those worth compressing, and write a manifest.json mapping each asset to its content-hashed
+    file name. Assets from earlier builds are kept, so pages that still refer to them keep working.
+
+    Args:
+        output (Path): The directory to write assets to. Defaults to ASSETS_PATH.
+
+    Returns:
+        dict: The manifest of each theme, keyed by theme name.
+    """
+    output = Path(output or groove.settings.get().assets_root)
+    registry = themes.registry()
+    manifests = {}
+    for name in registry.available():
+        theme_output = output / Path(name)
+        urls = {}
+        for (relpath, asset) in sorted(registry.get(name).static.items()):
+            content = minify(relpath, asset.path.read_bytes())
+            relative = PurePosixPath(relpath)
+            digest = blake2b(content, digest_size=8).hexdigest()
+            hashed = relative.with_name(f"{relative.stem}.{digest}{relative.suffix}").as_posix()
+            target = theme_output / Path(hashed)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(content)
+            if relative.suffix in COMPRESSIBLE:
+                target.with_name(target.name + '.gz').write_bytes(_gzip(content))
+                if brotli:  # pragma: no cover
+                    target.with_name(target.name + '.br').write_bytes(brotli.compress(content, quality=11))
+            logging.debug(f"Built {relpath} as {hashed} ({asset.size} -> {len(content)} bytes)")
+            urls[relpath] = hashed
+        theme_output.mkdir(parents=True, exist_ok=True)
+        (theme_output / Path('manifest.json')).write_text(json.dumps(urls, indent=2, sort_keys=True))
+        manifests[name] = urls
+    reset()
+    return manifests
+
+
+def manifest(theme_name: str) -> Manifest:
+    """
+    Return the build manifest of the specified theme, loading it on first use. Themes that have not been built have
+    an empty manifest.
+    """
+    if theme_name not in _manifests:
+        theme_output = groove.settings.get().assets_root / Path(theme_name)
+        try:
+            source = (theme_output / Path('manifest.json')).read_bytes()
+        except OSError:
+            _manifests[theme_name] = _EMPTY_MANIFEST
+        else:
+            urls = json.loads(source)
+            _manifests[theme_name] = Manifest(
+                version=blake2b(source, digest_size=8).hexdigest(),
+                urls=urls,
+                files={hashed: _variants(theme_output / Path(hashed)) for hashed in urls.values()},
+            )
+    return _manifests[theme_name]
+
+
+def _variants(path: Path) -> dict:
+    """
+    Map each content encoding available for a built asset to the file containing it. None maps to the original.
+    """
+    variants = {None: path}
+    for (encoding, suffix) in ENCODINGS:
+        variant = path.with_name(path.name + suffix)
+        if variant.exists():
+            variants[encoding] = variant
+    return variants
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(','):
+        (coding, _, params) = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def negotiate(variants: dict, accept_encoding: str) -> tuple:
+    """
+    Select the best precompressed variant of a built asset acceptable to the client.
+
+    Args:
+        variants (dict): The asset's variants, as found in Manifest.files.
+        accept_encoding (str): The value of the request's Accept-Encoding header.
+
+    Returns:
+        tuple: The path of the variant to serve, and its content encoding (None for the uncompressed asset).
+    """
+    accepted = _accepted_encodings(accept_encoding or '')
+    for (encoding, _) in ENCODINGS:
+        if encoding in accepted and encoding in variants:
+            return (variants[encoding], encoding)
+    return (variants[None], None)
+
+
+def reset() -> None:
+    """
+    Forget every loaded manifest, so that new builds are picked up.
+    """
+    _manifests.clear()
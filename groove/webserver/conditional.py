@@ -0,0 +1,49 @@
+from typing import Union
+
+from bottle import HTTPResponse, parse_date, request
+
+# Responses that may be cached, but must be revalidated on every use.
+REVALIDATE = 'no-cache'
+
+# Tracks rarely change once imported, and are revalidated cheaply when they do.
+TRACKS = 'public, max-age=86400'
+
+# Fingerprinted assets never change under the same URL.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def not_modified(etag: str, last_modified: Union[float, None] = None) -> bool:
+    """
+    Return True if the current request's If-None-Match or If-Modified-Since header shows that the client's copy of
+    the resource is still current. If-None-Match takes precedence when both are present.
+
+    Args:
+        etag (str): The entity tag of the current representation, including quotes.
+        last_modified (float): The modification time of the resource, if it has one.
+    """
+    if_none_match = request.environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        if if_none_match.strip() == '*':
+            return True
+        return _weak(etag) in [_weak(tag) for tag in if_none_match.split(',')]
+
+    if_modified_since = request.environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since and last_modified is not None:
+        since = parse_date(if_modified_since.split(';')[0].strip())
+        return since is not None and since >= int(last_modified)
+    return False
+
+
+def not_modified_response(headers: dict) -> HTTPResponse:
+    """
+    Return a 304 response carrying the validators and caching headers of the full response.
+    """
+    return HTTPResponse(status=304, body='', headers={
+        key: value for (key, value) in headers.items()
+        if key in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+    })
@@ -0,0 +1,290 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from typing import Callable, Union
+
+from paste.httpserver import WSGIHandler, WSGIServer
+
+from groove.exceptions import ConfigurationError
+
+
+def listen(host: str, port: int, reuse_port: bool = False, backlog: int = 128) -> socket.socket:
+    """
+    Open a listening TCP socket. With reuse_port, several processes may bind the same address and the kernel
+    balances new connections between them.
+    """
+    (family, _, _, _, address) = socket.getaddrinfo(host, int(port), type=socket.SOCK_STREAM)[0]
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        if not hasattr(socket, 'SO_REUSEPORT'):  # pragma: no cover
+            raise ConfigurationError("REUSE_PORT is not supported on this platform.")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    return sock
+
+
+class WorkerServer(WSGIServer):
+    """
+    SYNOPSIS
+
+        A threaded paste server that accepts connections on a socket it was handed,
+        rather than one it binds itself, so that several processes can share it.
+
+    USAGE
+
+        WorkerServer(app, listener, [ARGS])
+
+    ARGS
+
+        app             The WSGI application.
+        listener        A listening socket.
+        handler         The request handler class. Defaults to paste's WSGIHandler.
+        max_requests    Stop accepting connections after this many. 0 means never.
+
+    EXAMPLES
+
+        WorkerServer(app, listen('127.0.0.1', 2323), max_requests=1000).serve()
+
+    Setting alive to False (eg. from a signal handler) stops the server accepting
+    connections; serve() then returns once every request in progress is complete.
+    """
+
+    # How often serve() checks whether it should stop, in seconds.
+    timeout = 1
+
+    def __init__(self,
+                 app: Callable,
+                 listener: socket.socket,
+                 handler: Union[type, None] = None,
+                 max_requests: int = 0) -> None:
+        self._listener = listener
+        self.max_requests = max_requests
+        self.requests = 0
+        self.alive = True
+        super().__init__(app, listener.getsockname()[:2], handler or WSGIHandler)
+
+    def server_bind(self) -> None:
+        self.socket.close()
+        self.socket = self._listener
+        (host, port) = self.socket.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+
+    def server_activate(self) -> None:
+        pass
+
+    def get_request(self) -> tuple:
+        # The listener is non-blocking, because another process may accept the connection first.
+        (conn, address) = self.socket.accept()
+        conn.setblocking(True)
+        return (conn, address)
+
+    def process_request(self, request, client_address) -> None:
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            logging.debug(f"Worker {os.getpid()} has served {self.requests} requests; recycling it.")
+            self.alive = False
+        super().process_request(request, client_address)
+
+    def serve(self) -> None:
+        self.socket.setblocking(False)
+        while self.alive:
+            self.handle_request()
+        # Closes this process' copy of the listener and waits for requests in progress.
+        self.server_close()
+
+
+class Arbiter:
+    """
+    SYNOPSIS
+
+        Pre-fork worker processes that serve a WSGI application from a shared
+        listening socket, replacing workers that exit and reloading gracefully.
+
+    USAGE
+
+        Arbiter(app, host, port, [ARGS]).run()
+
+    ARGS
+
+        app                 The WSGI application.
+        host                The address to listen on.
+        port                The port to listen on.
+        workers             The number of worker processes.
+        reuse_port          If True, each worker binds its own SO_REUSEPORT socket and
+                            the kernel balances connections between them. Otherwise the
+                            workers share a single socket opened before forking.
+        max_requests        Replace each worker after it has served this many requests.
+                            0 means never.
+        graceful_timeout    How long, in seconds, a retiring worker may take to finish
+                            its requests in progress before it is killed.
+        handler             The request handler class.
+        post_fork           Called in each worker after forking, eg. to discard database
+                            connections inherited from the parent.
+        on_reload           Called in the parent on SIGHUP, before new workers are forked.
+
+    EXAMPLES
+
+        Arbiter(app, '0.0.0.0', 2323, workers=4, max_requests=1000).run()
+
+    SIGHUP calls on_reload, forks a new generation of workers and asks the old
+    one to finish its requests in progress and exit, so active track downloads
+    are not interrupted. SIGTERM and SIGINT stop every worker the same way.
+    """
+
+    def __init__(self,
+                 app: Callable,
+                 host: str,
+                 port: int,
+                 workers: int = 2,
+                 reuse_port: bool = False,
+                 max_requests: int = 0,
+                 graceful_timeout: float = 30,
+                 handler: Union[type, None] = None,
+                 post_fork: Union[Callable, None] = None,
+                 on_reload: Union[Callable, None] = None) -> None:
+        self.app = app
+        self.host = host
+        self.port = int(port)
+        self.workers = max(1, int(workers))
+        self.reuse_port = reuse_port
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.handler = handler
+        self.post_fork = post_fork
+        self.on_reload = on_reload
+        self._listener = None
+        self._children = {}
+        self._retiring = {}
+        self._generation = 0
+        self._reload = False
+        self._stopping = False
+
+    @property
+    def pids(self) -> list:
+        return sorted(self._children)
+
+    def run(self) -> None:
+        if not self.reuse_port:
+            self._listener = listen(self.host, self.port)
+        signal.signal(signal.SIGHUP, self._request_reload)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        logging.info(f"Serving on {self.host}:{self.port} with {self.workers} workers.")
+        try:
+            while not self._stopping:
+                if self._reload:
+                    self._reload = False
+                    self.reload()
+                self._reap()
+                self._spawn_missing()
+                time.sleep(0.25)
+        finally:
+            self.stop()
+
+    def _request_reload(self, signum, frame) -> None:
+        self._reload = True
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _spawn_missing(self) -> None:
+        current = [pid for (pid, generation) in self._children.items()
+                   if generation == self._generation and pid not in self._retiring]
+        for _ in range(self.workers - len(current)):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            logging.debug(f"Started worker {pid}.")
+            self._children[pid] = self._generation
+            return
+        status = 0
+        try:
+            self._work()
+        except Exception:
+            logging.exception(f"Worker {os.getpid()} failed.")
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _work(self) -> None:
+        for signum in (signal.SIGHUP, signal.SIGINT):
+            signal.signal(signum, signal.SIG_IGN)
+        listener = self._listener or listen(self.host, self.port, reuse_port=True)
+        if self.post_fork:
+            self.post_fork()
+        server = WorkerServer(self.app, listener, handler=self.handler, max_requests=self.max_requests)
+
+        def _retire(signum, frame):
+            server.alive = False
+        signal.signal(signal.SIGTERM, _retire)
+        server.serve()
+
+    def _retire(self, pid: int) -> None:
+        if pid in self._retiring:
+            return
+        self._retiring[pid] = time.monotonic() + self.graceful_timeout
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:  # pragma: no cover
+            pass
+
+    def _reap(self) -> None:
+        while self._children:
+            try:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:  # pragma: no cover
+                self._children.clear()
+                break
+            if not pid:
+                break
+            logging.debug(f"Worker {pid} exited with status {status}.")
+            self._children.pop(pid, None)
+            self._retiring.pop(pid, None)
+        now = time.monotonic()
+        for (pid, deadline) in list(self._retiring.items()):
+            if now > deadline:
+                logging.warning(f"Worker {pid} did not finish in {self.graceful_timeout} seconds; killing it.")
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:  # pragma: no cover
+                    pass
+                self._retiring[pid] = float('inf')
+
+    def reload(self) -> None:
+        """
+        Replace every worker with one forked after calling on_reload, letting the old workers finish first. If
+        on_reload fails, eg. because the new settings are invalid, the current workers are left to carry on.
+        """
+        logging.info("Reloading workers.")
+        if self.on_reload:
+            try:
+                self.on_reload()
+            except Exception as e:
+                logging.error(f"Could not reload; the current workers will carry on. ({e})")
+                return
+        old = list(self._children)
+        self._generation += 1
+        self._spawn_missing()
+        for pid in old:
+            self._retire(pid)
+
+    def stop(self) -> None:
+        """
+        Ask every worker to finish its requests in progress and exit, and wait for them to do so.
+        """
+        for pid in list(self._children):
+            self._retire(pid)
+        while self._children:
+            self._reap()
+            time.sleep(0.05)
+        if self._listener:
+            self._listener.close()
+            self._listener = None
@@ -1,7 +1,148 @@
+import threading
+import time
+
+from collections import OrderedDict
 from hashlib import blake2b
 from hmac import compare_digest
-from typing import List
-import os
+from typing import List, Union
+
+import groove.settings
+from groove.exceptions import ConfigurationError
+
+
+class Signer:
+    """
+    SYNOPSIS
+
+        Sign and verify requests with a keyed blake2b hash. The keyed hash state is
+        derived once and cloned for every signature, and signatures are remembered
+        in a bounded LRU cache, so signing a request already seen is a dict lookup.
+
+    USAGE
+
+        Signer(key, [ARGS])
+
+    ARGS
+
+        key             The secret key.
+        previous_key    A key that was recently rotated out. Signatures made with it
+                        remain valid, so that links already handed out keep working.
+        ttl             If non-zero, signatures embed an expiry time and are valid
+                        for between ttl and 2*ttl seconds.
+        cache_size      The number of signatures to remember.
+
+    EXAMPLES
+
+        Signer('fnord').sign('/track\\x001')
+        >>> '6a0d...'
+
+    """
+
+    def __init__(self, key: str, previous_key: Union[str, None] = None, ttl: int = 0, cache_size: int = 4096):
+        self._state = blake2b(digest_size=16, key=key.encode())
+        self._previous = blake2b(digest_size=16, key=previous_key.encode()) if previous_key else None
+        self._key_id = blake2b(key.encode(), digest_size=4).hexdigest()
+        self._ttl = ttl
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> int:
+        return self._ttl
+
+    @property
+    def epoch(self) -> str:
+        """
+        Identify the current set of signatures; it changes when the key is rotated or signatures start to expire.
+        """
+        return f"{self._key_id}:{self._expiry()}"
+
+    def _expiry(self) -> int:
+        """
+        Return the expiry time for signatures made now, rounded so that it is shared by every signature made within
+        the same ttl-long window.
+        """
+        if not self._ttl:
+            return 0
+        return (int(time.time()) // self._ttl + 2) * self._ttl
+
+    def _digest(self, state, request: str, expires: int) -> str:
+        h = state.copy()
+        h.update(request.encode())
+        if expires:
+            h.update(f"\0{expires:x}".encode())
+        return h.hexdigest()
+
+    def sign(self, request: str) -> str:
+        expires = self._expiry()
+        cache_key = (request, expires)
+        with self._lock:
+            signature = self._cache.get(cache_key)
+            if signature:
+                self._cache.move_to_end(cache_key)
+                return signature
+        signature = self._digest(self._state, request, expires)
+        if expires:
+            signature = f"{signature}.{expires:x}"
+        with self._lock:
+            self._cache[cache_key] = signature
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return signature
+
+    def validate(self, request: str, signature: str) -> bool:
+        """
+        Return True if the signature is a valid, unexpired signature of the request.
+        """
+        (digest, _, expires) = signature.partition('.')
+        if self._ttl:
+            try:
+                expires = int(expires, 16)
+            except ValueError:
+                return False
+            if expires < time.time():
+                return False
+        elif expires:
+            return False
+        else:
+            expires = 0
+        if compare_digest(self._digest(self._state, request, expires), digest):
+            return True
+        return bool(self._previous) and compare_digest(self._digest(self._previous, request, expires), digest)
+
+
+_signer = None
+_signer_config = None
+
+
+def signer() -> Signer:
+    """
+    Return the signer for the current settings, creating a new one whenever the secret keys or signature settings
+    change, so keys can be rotated by reloading the settings instead of restarting.
+    """
+    global _signer, _signer_config
+    settings = groove.settings.get()
+    config = (
+        settings.secret_key,
+        settings.previous_secret_key,
+        settings.signature_ttl,
+        settings.signature_cache_size,
+    )
+    if config != _signer_config:
+        (key, previous_key, ttl, cache_size) = config
+        if not key:
+            raise ConfigurationError(
+                "It seems like SECRET_KEY is not set in your current environment.\n"
+                "Running 'groove setup' may help you fix this problem."
+            )
+        _signer = Signer(key, previous_key=previous_key, ttl=ttl, cache_size=cache_size)
+        _signer_config = config
+    return _signer
+
+
+def _request(args: List, uri: str) -> str:
+    return uri + '\0' + '\0'.join(args)
 
 
 def encode(args: List, uri: str) -> str:
@@ -19,21 +160,39 @@ def encode(args: List, uri: str) -> str:
     Returns:
         String: A cryptographically signed request.
     """
-    return sign(uri + '\0' + '\0'.join(args))
+    return sign(_request(args, uri))
 
 
 def sign(request):
     """
     Sign a request with a cryptographic hash.  Returns the hex digest.
     """
-    h = blake2b(digest_size=16, key=bytes(os.environ['SECRET_KEY'].encode()))
-    h.update(request.encode())
-    return h.hexdigest()
+    return signer().sign(request)
+
+
+def sign_entries(entries: List[dict]) -> str:
+    """
+    Add a signed URL to each of a playlist's entries.
+
+    Returns:
+        str: The epoch of the signatures.
+    """
+    for entry in entries:
+        entry['url'] = f"/track/{encode([str(entry['track_id'])], uri='/track')}/{entry['track_id']}"
+    return signer().epoch
 
 
 def verify(request, digest):
     return compare_digest(request, digest)
 
 
+def validate(signature: str, args: List, uri: str) -> bool:
+    """
+    Return True if the signature is a valid, unexpired signature of the encoded request.
+    """
+    return signer().validate(_request(args, uri), signature)
+
+
 def url():
-    return f"http://{os.environ['HOST']}:{os.environ['PORT']}"
+    settings = groove.settings.get()
+    return f"http://{settings.host}:{settings.port}"
@@ -0,0 +1,82 @@
+import logging
+
+from bottle import HTTPResponse, PluginError
+
+from groove.db.manager import DatabaseManager
+
+
+class SessionPlugin:
+    """
+    SYNOPSIS
+
+        A bottle plugin that passes a database session to every route accepting a
+        'db' argument. GET and HEAD routes receive a thread-local session from the
+        read-only pool, which is never committed; other routes receive a session
+        using the writer connection, committed when the route succeeds.
+
+    USAGE
+
+        server.install(SessionPlugin(manager, [ARGS]))
+
+    ARGS
+
+        manager     The DatabaseManager providing the sessions.
+        keyword     The name of the argument. Defaults to 'db'.
+
+    EXAMPLES
+
+        @server.route('/playlist/<slug>')
+        def serve_playlist(slug, db):
+            ...
+
+    """
+    name = 'groove_sessions'
+    api = 2
+
+    def __init__(self, manager: DatabaseManager, keyword: str = 'db') -> None:
+        self.manager = manager
+        self.keyword = keyword
+
+    def setup(self, app) -> None:
+        for other in app.plugins:
+            if other is not self and getattr(other, 'keyword', None) == self.keyword:
+                raise PluginError(f"Found another plugin using the keyword '{self.keyword}'.")
+
+    def apply(self, callback, route):
+        if self.keyword not in route.get_callback_args():
+            return callback
+        if route.method in ('GET', 'HEAD'):
+            return self._read_only(callback)
+        return self._read_write(callback)
+
+    def _read_only(self, callback):
+        sessions = self.manager.readers
+
+        def wrapper(*args, **kwargs):
+            kwargs[self.keyword] = sessions()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                sessions.remove()
+        return wrapper
+
+    def _read_write(self, callback):
+        sessions = self.manager.writers
+
+        def wrapper(*args, **kwargs):
+            session = sessions()
+            kwargs[self.keyword] = session
+            try:
+                result = callback(*args, **kwargs)
+                session.commit()
+                return result
+            except HTTPResponse:
+                session.commit()
+                raise
+            except Exception:
+                logging.debug("Rolling back the session after an error.")
+                session.rollback()
+                raise
+            finally:
+                sessions.remove()
+        return wrapper
@@ -0,0 +1,373 @@
+import logging
+import mimetypes
+import os
+import socket
+import uuid
+
+from collections import namedtuple
+from email.utils import formatdate
+from pathlib import Path
+from typing import List, Union
+from urllib.parse import quote
+
+from bottle import HTTPResponse, parse_date, request
+from paste.httpserver import WSGIHandler
+
+import groove.settings
+from groove.exceptions import ConfigurationError
+from groove.webserver import conditional
+
+# The size of the buffer used when streaming a file through python.
+CHUNK_SIZE = 64 * 1024
+
+# Requests asking for more ranges than this are served in full, to limit the cost of abusive Range headers.
+MAX_RANGES = 16
+
+# Headers understood by reverse proxies that can serve a file on our behalf.
+OFFLOAD_HEADERS = ('X-Accel-Redirect', 'X-Sendfile')
+
+ByteRange = namedtuple('ByteRange', 'start,end')
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def etag(stat: os.stat_result) -> str:
+    """
+    Return a strong entity tag for a file, derived from its inode, size and modification time.
+    """
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Union[List[ByteRange], None]:
+    """
+    Parse the value of a Range header against a resource of the specified size.
+
+    Args:
+        header (str): The value of the Range header, eg. "bytes=0-499,-500".
+        size (int): The length of the resource, in bytes.
+
+    Returns:
+        None:   If the header is malformed and should be ignored
+        List:   A list of ByteRanges with inclusive ends, sorted and coalesced.
+                An empty list means the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    parts = spec.split(',')
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        start, sep, end = part.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if not start:
+                # a suffix range: the last N bytes of the resource
+                length = int(end)
+                if length <= 0 or not size:
+                    # an empty resource has no last bytes to satisfy it
+                    continue
+                ranges.append(ByteRange(max(size - length, 0), size - 1))
+                continue
+            start = int(start)
+            end = int(end) if end else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start >= size:
+            continue
+        ranges.append(ByteRange(start, size - 1 if end is None else min(end, size - 1)))
+
+    coalesced = []
+    for byte_range in sorted(ranges):
+        if coalesced and byte_range.start <= coalesced[-1].end + 1:
+            coalesced[-1] = ByteRange(coalesced[-1].start, max(coalesced[-1].end, byte_range.end))
+        else:
+            coalesced.append(byte_range)
+    return coalesced
+
+
+def _if_range_matches(if_range: Union[str, None], tag: str, mtime: float) -> bool:
+    """
+    Return True if a Range header should be honoured under the supplied If-Range condition.
+    """
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == tag
+    return parse_date(if_range) == int(mtime)
+
+
+class FileRange:
+    """
+    A contiguous byte range of an open file, streamed in chunks through a single reused buffer.
+
+    The object is file-like so that bottle hands it to the server's wsgi.file_wrapper, which allows
+    SendfileHandler (and servers like gunicorn) to copy the bytes with os.sendfile instead.
+    """
+    def __init__(self, fh, start: int, length: int, buffer: Union[bytearray, None] = None):
+        self._fh = fh
+        self._start = start
+        self._length = length
+        self._remaining = length
+        self._buffer = buffer or bytearray(CHUNK_SIZE)
+        self._fh.seek(start)
+
+    @property
+    def file(self):
+        return self._fh
+
+    @property
+    def start(self) -> int:
+        return self._start
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    def fileno(self) -> int:
+        return self._fh.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fh.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def chunks(self):
+        """
+        Yield memoryviews over the shared buffer. Each view is only valid until the next one is requested.
+        """
+        view = memoryview(self._buffer)
+        while self._remaining > 0:
+            count = self._fh.readinto(view[:min(len(view), self._remaining)])
+            if not count:
+                break
+            self._remaining -= count
+            yield view[:count]
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield bytes(chunk)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class MultipartFileRanges:
+    """
+    Several byte ranges of an open file, streamed as a multipart/byteranges body.
+    """
+    def __init__(self, fh, ranges: List[ByteRange], size: int, mimetype: str):
+        self._fh = fh
+        self._ranges = ranges
+        self.boundary = uuid.uuid4().hex
+        self._buffer = bytearray(CHUNK_SIZE)
+        self._headers = [
+            (
+                f"--{self.boundary}\r\n"
+                f"Content-Type: {mimetype}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode()
+            for (start, end) in ranges
+        ]
+        self._trailer = f"--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_length(self) -> int:
+        parts = sum(len(header) + (end - start + 1) + 2 for (header, (start, end)) in zip(self._headers, self._ranges))
+        return parts + len(self._trailer)
+
+    def __iter__(self):
+        for (header, (start, end)) in zip(self._headers, self._ranges):
+            yield header
+            yield from FileRange(self._fh, start, end - start + 1, buffer=self._buffer)
+            yield b'\r\n'
+        yield self._trailer
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def serve_file(path: Path,
+               mimetype: Union[str, None] = None,
+               tag: Union[str, None] = None,
+               cache_control: str = conditional.REVALIDATE,
+               headers: Union[dict, None] = None) -> HTTPResponse:
+    """
+    Serve a file in response to the current request, honouring conditional, Range and If-Range headers.
+
+    Args:
+        path (Path): The file to serve.
+        mimetype (str): The Content-Type of the response. Guessed from the file name by default.
+        tag (str): The entity tag of the file. Derived from the file's stats by default.
+        cache_control (str): The value of the Cache-Control header.
+        headers (dict): Additional headers to include in the response.
+
+    Returns:
+        HTTPResponse: A 200, 206, 304, 404 or 416 response.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return HTTPResponse(status=404, body="Not found")
+    size = stat.st_size
+    tag = tag or etag(stat)
+    headers = dict({
+        'Accept-Ranges': 'bytes',
+        'ETag': tag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+    }, **(headers or {}))
+    if conditional.not_modified(tag, stat.st_mtime):
+        return conditional.not_modified_response(headers)
+
+    try:
+        fh = open(path, 'rb')
+    except OSError:  # pragma: no cover
+        return HTTPResponse(status=404, body="Not found")
+    mimetype = mimetype or mimetypes.guess_type(str(path))[0] or 'application/octet-stream'
+
+    ranges = None
+    range_header = request.environ.get('HTTP_RANGE')
+    if range_header and _if_range_matches(request.environ.get('HTTP_IF_RANGE'), tag, stat.st_mtime):
+        ranges = parse_range(range_header, size)
+
+    if ranges is None:
+        return HTTPResponse(status=200, body=FileRange(fh, 0, size), headers=dict(
+            headers, **{'Content-Type': mimetype, 'Content-Length': str(size)}
+        ))
+
+    if not ranges:
+        fh.close()
+        return HTTPResponse(status=416, body='', headers=dict(headers, **{'Content-Range': f"bytes */{size}"}))
+
+    if len(ranges) == 1:
+        (start, end) = ranges[0]
+        logging.debug(f"Serving bytes {start}-{end}/{size} of {path.name}")
+        return HTTPResponse(status=206, body=FileRange(fh, start, end - start + 1), headers=dict(
+            headers, **{
+                'Content-Type': mimetype,
+                'Content-Length': str(end - start + 1),
+                'Content-Range': f"bytes {start}-{end}/{size}",
+            }
+        ))
+
+    body = MultipartFileRanges(fh, ranges, size, mimetype)
+    logging.debug(f"Serving {len(ranges)} ranges of {path.name}")
+    return HTTPResponse(status=206, body=body, headers=dict(
+        headers, **{
+            'Content-Type': f"multipart/byteranges; boundary={body.boundary}",
+            'Content-Length': str(body.content_length),
+        }
+    ))
+
+
+def _internal_uri(path: Path) -> Union[str, None]:
+    """
+    Map a file beneath one of the Groove on Demand roots to the proxy's internal location for that root.
+    """
+    settings = groove.settings.get()
+    roots = (
+        ('media', settings.media_root),
+        ('cache', settings.cache_root),
+        ('themes', settings.themes_root),
+        ('static', settings.static_root),
+        ('assets', settings.assets_root),
+    )
+    for (name, root) in roots:
+        try:
+            relpath = path.relative_to(root)
+        except ValueError:
+            continue
+        return f"{settings.sendfile_prefix}/{name}/{quote(relpath.as_posix())}"
+    return None
+
+
+def offload(path: Path,
+            mimetype: Union[str, None] = None,
+            cache_control: Union[str, None] = None,
+            headers: Union[dict, None] = None) -> Union[HTTPResponse, None]:
+    """
+    If SENDFILE_HEADER is set, return an empty response instructing the reverse proxy to serve the file itself.
+    X-Accel-Redirect (nginx) responses point at an internal location beneath SENDFILE_PREFIX; X-Sendfile
+    (Apache, lighttpd) responses contain the absolute path of the file. Any additional headers are passed to the
+    proxy as they are.
+
+    Returns:
+        HTTPResponse:   The offload response.
+        None:           If offloading is disabled or the file isn't beneath a known root.
+    """
+    header = groove.settings.get().sendfile_header
+    if not header:
+        return None
+    if header not in OFFLOAD_HEADERS:
+        raise ConfigurationError(
+            f"SENDFILE_HEADER must be one of {', '.join(OFFLOAD_HEADERS)}, not {header}."
+        )
+    if header == 'X-Accel-Redirect':
+        value = _internal_uri(path)
+        if not value:
+            logging.warning(f"Cannot offload {path}; it is not beneath a known root.")
+            return None
+    else:
+        value = str(path.absolute())
+    logging.debug(f"Offloading {path.name} to the proxy: {header}: {value}")
+    headers = dict(headers or {})
+    headers[header] = value
+    headers['Content-Type'] = mimetype or mimetypes.guess_type(str(path))[0] or 'application/octet-stream'
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    return HTTPResponse(status=200, body='', headers=headers)
+
+
+class SendfileHandler(WSGIHandler):
+    """
+    A paste request handler that provides a wsgi.file_wrapper, so FileRange responses are copied from the file
+    to the client socket by the kernel with os.sendfile. Connections that cannot use sendfile (eg. SSL) fall back
+    to writing chunks from the FileRange's reused buffer.
+    """
+
+    def wsgi_setup(self, environ=None):
+        super().wsgi_setup(environ)
+        self.wsgi_environ['wsgi.file_wrapper'] = self._file_wrapper
+
+    def _file_wrapper(self, filelike, block_size=CHUNK_SIZE):
+        if isinstance(filelike, FileRange):
+            return _closing(self._stream(filelike), filelike)
+        return _closing(iter(lambda: filelike.read(block_size), b''), filelike)
+
+    def _can_sendfile(self):
+        return type(self.connection) is socket.socket and hasattr(os, 'sendfile')
+
+    def _stream(self, filerange: FileRange):
+        if not self._can_sendfile():
+            yield from filerange.chunks()
+            return
+        # an empty chunk makes paste send the status line and headers, after which we own the socket.
+        yield b''
+        self.wfile.flush()
+        self.connection.sendfile(filerange.file, offset=filerange.start, count=filerange.length)
+
+
+class _closing:
+    """
+    Wrap an iterator so the WSGI server can close the underlying file when the response is finished.
+    """
+    def __init__(self, iterator, filelike):
+        self._iterator = iterator
+        self._filelike = filelike
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        if hasattr(self._filelike, 'close'):
+            self._filelike.close()
@@ -1,33 +1,31 @@
 import logging
-import os
+import threading
+import time
 from collections import namedtuple
+from configparser import ConfigParser
 from pathlib import Path
+from typing import Union
 
-from groove.exceptions import ThemeConfigurationError, ConfigurationError
+from groove.exceptions import ThemeConfigurationError, ThemeMissingException, ConfigurationError
 
-import groove.path
+import groove.settings
 
 
 Theme = namedtuple('Theme', 'name,path,author,author_link,version,about')
 
+StaticFile = namedtuple('StaticFile', 'path,mtime_ns,size')
+
+_Loaded = namedtuple('_Loaded', 'theme,error,styles,static,templates,watched')
+
 
 def load_theme(name=None):
-    name = name or os.environ.get('DEFAULT_THEME', None)
+    name = name or groove.settings.get().default_theme
     if not name:  # pragma: no cover
         raise ConfigurationError(
             "It seems like DEFAULT_THEME is not set in your current environment.\n"
             "Running 'groove setup' may help you fix this problem."
         )
-    theme_path = groove.path.theme(name)
-    theme_info = _get_theme_info(theme_path)
-    try:
-        return Theme(
-            name=name,
-            path=theme_path,
-            **theme_info
-        )
-    except TypeError:
-        raise ThemeConfigurationError(f"The {name} them is misconfigured. Does the README.md contain a credits secton?")
+    return registry().theme(name)
 
 
 def _get_theme_info(theme_path):
@@ -66,3 +64,199 @@ def _get_theme_info(theme_path):
             logging.debug(f"Setting theme '{key}' to '{value}'.")
             config[key] = value
     return config
+
+
+def _get_console_styles(theme_path):
+    cfg = ConfigParser()
+    cfg.read(theme_path / Path('console.cfg'))
+    return dict(cfg['styles']) if cfg.has_section('styles') else {}
+
+
+def _get_static_files(*roots):
+    """
+    Map the relative path of every file beneath the specified roots to its StaticFile. Later roots take precedence.
+    """
+    files = {}
+    for root in roots:
+        if not root.is_dir():
+            continue
+        for path in root.rglob('*'):
+            if path.is_dir():
+                continue
+            stat = path.stat()
+            files[path.relative_to(root).as_posix()] = StaticFile(path, stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ThemeRegistry:
+    """
+    SYNOPSIS
+
+        Load themes once and cache their credits, console styles, templates and
+        static file maps, so that requests never parse theme files.
+
+    USAGE
+
+        ThemeRegistry([ARGS])
+
+    ARGS
+
+        root            The directory containing themes. Defaults to the configured themes root.
+        static_root     The directory containing shared static assets. Defaults to the configured static root.
+        interval        Check loaded themes for changes at most this often, in seconds.
+                        Defaults to THEME_RELOAD_INTERVAL, or 5. 0 disables the checks,
+                        so themes are only reloaded by reload() (eg. on SIGHUP).
+
+    EXAMPLES
+
+        ThemeRegistry().theme('blue_train').author
+        >>> '@evilchili'
+
+    """
+
+    def __init__(self,
+                 root: Union[Path, None] = None,
+                 static_root: Union[Path, None] = None,
+                 interval: Union[float, None] = None) -> None:
+        settings = groove.settings.get()
+        self._root = Path(root or settings.themes_root)
+        self._static_root = Path(static_root or settings.static_root)
+        if interval is None:
+            interval = settings.theme_reload_interval
+        self._interval = interval
+        self._checked = time.monotonic()
+        self._themes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def available(self) -> list:
+        return sorted(path.name for path in self._root.iterdir() if path.is_dir())
+
+    def _load(self, name: str) -> _Loaded:
+        path = self._root / Path(name)
+        if not path.is_dir():
+            raise ThemeMissingException(
+                f"A theme directory named {name} does not exist or isn't a directory. "
+                "Perhaps there is a typo in the name?\n"
+                f"Available themes: {','.join(self.available())}"
+            )
+        logging.debug(f"Loading theme {name} from {path}")
+        theme = None
+        error = None
+        try:
+            theme = Theme(name=name, path=path, **_get_theme_info(path))
+        except TypeError:
+            error = f"The {name} them is misconfigured. Does the README.md contain a credits secton?"
+
+        templates_path = path / Path('templates')
+        templates = {}
+        if templates_path.is_dir():
+            templates = {tpl.stem: _mtime(tpl) for tpl in templates_path.glob('*.tpl')}
+
+        # Static files are watched too, since editing one in place changes no directory's modification time.
+        static = _get_static_files(self._static_root, path / Path('static'))
+        watched = [
+            path / Path('README.md'),
+            path / Path('console.cfg'),
+            path / Path('static'),
+            templates_path,
+            self._static_root,
+        ] + [templates_path / Path(f"{tpl}.tpl") for tpl in templates] + [asset.path for asset in static.values()]
+
+        return _Loaded(
+            theme=theme,
+            error=error,
+            styles=_get_console_styles(path),
+            static=static,
+            templates=templates,
+            watched={watched_path: _mtime(watched_path) for watched_path in watched},
+        )
+
+    def _check(self) -> None:
+        """
+        Discard any loaded theme whose files have changed since it was loaded, at most once per interval.
+        """
+        if not self._interval:
+            return
+        now = time.monotonic()
+        if now - self._checked < self._interval:
+            return
+        self._checked = now
+        for (name, loaded) in list(self._themes.items()):
+            if any(_mtime(path) != mtime for (path, mtime) in loaded.watched.items()):
+                logging.info(f"Theme {name} has changed; reloading it.")
+                with self._lock:
+                    self._themes.pop(name, None)
+
+    def get(self, name: str) -> _Loaded:
+        self._check()
+        loaded = self._themes.get(name)
+        if not loaded:
+            loaded = self._load(name)
+            with self._lock:
+                self._themes[name] = loaded
+        return loaded
+
+    def preload(self) -> None:
+        """
+        Load every available theme.
+        """
+        for name in self.available():
+            self.get(name)
+
+    def reload(self) -> None:
+        """
+        Discard every loaded theme, so that each is reloaded on next use.
+        """
+        logging.info("Reloading themes.")
+        with self._lock:
+            self._themes.clear()
+
+    def theme(self, name: str) -> Theme:
+        loaded = self.get(name)
+        if loaded.error:
+            raise ThemeConfigurationError(loaded.error)
+        return loaded.theme
+
+    def styles(self, name: str) -> dict:
+        """
+        Return the console styles defined by the theme's console.cfg.
+        """
+        return self.get(name).styles
+
+    def static(self, relpath: str, name: str) -> Union[StaticFile, None]:
+        """
+        Return the static asset at the specified path, preferring the theme's copy over the shared one.
+        """
+        return self.get(name).static.get(relpath)
+
+    def template_mtime(self, name: str, template_name: str) -> Union[int, None]:
+        return self.get(name).templates.get(template_name)
+
+
+_registry = None
+
+
+def registry() -> ThemeRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ThemeRegistry()
+    return _registry
+
+
+def reset() -> None:
+    """
+    Discard the theme registry, so that it is recreated on next use.
+    """
+    global _registry
+    _registry = None
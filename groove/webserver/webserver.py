@@ -1,55 +1,139 @@
+import functools
 import logging
 import json
-import os
+import mimetypes
+import signal
+
+from hashlib import blake2b
+from typing import Union
 
 import bottle
-from bottle import HTTPResponse, template, static_file
-from bottle.ext import sqlalchemy
+from bottle import HTTPResponse, template
 from sqlalchemy.exc import NoResultFound, MultipleResultsFound
 
 import groove.db
+import groove.settings
+from groove import cache
 from groove.auth import is_authenticated
+from groove.db import counters, snapshots
 from groove.db.manager import database_manager
 from groove.playlist import Playlist
-from groove.webserver import requests, themes
+from groove.webserver import asgi, assets, conditional, prefork, requests, sessions, streaming, themes
 
 server = bottle.Bottle()
 
 
-def start(host: str = '127.0.0.1', port: int = 2323, debug: bool = False) -> None:  # pragma: no cover
+def start(host: str = '127.0.0.1',
+          port: int = 2323,
+          debug: bool = False,
+          settings: groove.settings.Settings = None) -> None:  # pragma: no cover
     """
-    Start the Bottle app.
+    Start the Bottle app. If more than one worker is configured, or workers are recycled, serve it from pre-forked
+    worker processes; if ASGI is set, serve it asynchronously with uvicorn; otherwise serve it from a single
+    multi-threaded process.
     """
-    logging.debug(f"Configuring sqllite using {os.environ.get('DATABASE_PATH')}")
+    if settings:
+        groove.settings.configure(settings)
+    settings = groove.settings.get()
+    logging.debug(f"Configuring sqllite using {settings.database}")
+
+    themes.registry().preload()
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, _reload_on_signal)
 
     with database_manager() as manager:
-        server.install(sqlalchemy.Plugin(
-            manager.engine,
-            groove.db.metadata,
-            keyword='db',
-            create=True,
-            commit=True,
-        ))
+        # Snapshot the playlists that have never been snapshotted or have changed since, eg. in a scan.
+        logging.info(f"Snapshotted {Playlist.refresh_snapshots(manager.writers())} playlists.")
+        manager.writers.remove()
+        # Loaded before any workers are forked, so that they share them.
+        cache.known_slugs().load(manager.readers())
+        cache.known_tracks().load(manager.readers())
+        manager.readers.remove()
+        server.install(sessions.SessionPlugin(manager))
         logging.debug(f"Configuring webserver with host={host}, port={port}, debug={debug}")
+        if settings.asgi:
+            bottle.debug(debug)
+            asgi.run(asgi.Application(server), host=settings.host or host, port=settings.port or port)
+            return
+        if settings.workers > 1 or settings.max_requests or settings.reuse_port:
+            bottle.debug(debug)
+            # Close the connections opened so far, so that the workers don't inherit them.
+            manager.dispose()
+            prefork.Arbiter(
+                server,
+                host=settings.host or host,
+                port=settings.port or port,
+                workers=settings.workers,
+                reuse_port=settings.reuse_port,
+                max_requests=settings.max_requests,
+                graceful_timeout=settings.graceful_timeout,
+                handler=streaming.SendfileHandler,
+                post_fork=functools.partial(manager.dispose, close=False),
+                on_reload=reload_and_preload,
+            ).run()
+            return
         server.run(
-            host=os.getenv('HOST', host),
-            port=os.getenv('PORT', port),
+            host=settings.host or host,
+            port=settings.port or port,
             debug=debug,
             server='paste',
+            handler=streaming.SendfileHandler,
             quiet=True
         )
 
 
-def serve(template_name, theme=None, **template_args):
-    theme = themes.load_theme(theme)
-    return HTTPResponse(status=200, body=template(
+def reload() -> None:
+    """
+    Reload the settings, themes and built assets.
+    """
+    groove.settings.reload()
+    themes.reset()
+    cache.reset()
+    assets.reset()
+
+
+def _reload_on_signal(signum, frame) -> None:
+    """
+    Reload on SIGHUP, carrying on with the current settings if the new ones are invalid.
+    """
+    try:
+        reload()
+    except Exception as e:
+        logging.error(f"Could not reload; carrying on with the current settings. ({e})")
+
+
+def reload_and_preload() -> None:  # pragma: no cover
+    """
+    Reload, then load every theme, so that workers forked afterwards inherit them.
+    """
+    reload()
+    themes.registry().preload()
+
+
+def serve(template_name, theme=None, headers=None, **template_args):
+    if not isinstance(theme, themes.Theme):
+        theme = themes.load_theme(theme)
+    return HTTPResponse(status=200, headers=headers, body=template(
         str(theme.path / groove.path.theme_template(template_name)),
         url=requests.url(),
         theme=theme,
+        static_url=lambda filepath: assets.url(filepath, theme=theme),
         **template_args
     ))
 
 
+def page_etag(template_name, theme, *args) -> str:
+    """
+    Return an entity tag for a rendered page, derived from the theme, the template's modification time, the asset
+    build, and any additional arguments that identify the version of the page's content.
+    """
+    mtime = themes.registry().template_mtime(theme.name, template_name)
+    build = assets.manifest(theme.name).version
+    digest = blake2b(digest_size=12)
+    digest.update('\0'.join(str(arg) for arg in (template_name, theme.name, mtime, build, *args)).encode())
+    return f'"{digest.hexdigest()}"'
+
+
 @server.route('/')
 def index():
     return "Groovy."
@@ -58,31 +142,78 @@ def index():
 @server.route('/static/<filepath:path>')
 def serve_static(filepath):
     theme = themes.load_theme()
-    path = groove.path.static(filepath, theme=theme)
-    logging.debug(f"Serving asset {path.name} from {path.parent}")
-    return static_file(path.name, root=path.parent)
+    built = assets.manifest(theme.name).files.get(filepath)
+    if built:
+        return serve_built_asset(built)
+    asset = themes.registry().static(filepath, theme.name)
+    if not asset:
+        return HTTPResponse(status=404, body="Not found")
+    try:
+        version = assets.fingerprint(asset)
+    except OSError:
+        return HTTPResponse(status=404, body="Not found")
+    cache_control = conditional.IMMUTABLE if bottle.request.query.get('v') == version else conditional.REVALIDATE
+    logging.debug(f"Serving asset {asset.path.name} from {asset.path.parent}")
+    return (
+        streaming.offload(asset.path, cache_control=cache_control) or
+        streaming.serve_file(asset.path, tag=f'"{version}"', cache_control=cache_control)
+    )
+
+
+def serve_built_asset(variants):
+    """
+    Serve a minified, content-hashed asset produced by 'groove assets build', precompressed if the client allows.
+    """
+    original = variants[None]
+    mimetype = mimetypes.guess_type(str(original))[0]
+    nginx = groove.settings.get().sendfile_header == 'X-Accel-Redirect'
+    if nginx:
+        # nginx drops Content-Encoding from X-Accel-Redirect responses, so it is sent the original, and its
+        # gzip_static and brotli_static modules choose the precompressed variant.
+        offloaded = streaming.offload(original, mimetype=mimetype, cache_control=conditional.IMMUTABLE)
+        if offloaded:
+            return offloaded
+    (path, encoding) = assets.negotiate(variants, bottle.request.environ.get('HTTP_ACCEPT_ENCODING'))
+    headers = {'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if not nginx:
+        offloaded = streaming.offload(path, mimetype=mimetype, cache_control=conditional.IMMUTABLE, headers=headers)
+        if offloaded:
+            return offloaded
+    logging.debug(f"Serving built asset {path.name}")
+    return streaming.serve_file(path, mimetype=mimetype, cache_control=conditional.IMMUTABLE, headers=headers)
 
 
 @server.route('/track/<request>/<track_id>')
 def serve_track(request, track_id, db):
 
-    expected = requests.encode([track_id], '/track')
-    if not requests.verify(request, expected):  # pragma: no cover
+    if not requests.validate(request, [track_id], '/track'):
         return HTTPResponse(status=404, body="Not found")
 
     try:
         track_id = int(track_id)
+    except ValueError:
+        return HTTPResponse(status=404, body="Not found")
+    if not cache.known_tracks().contains(track_id, db):
+        return HTTPResponse(status=404, body="Not found")
+
+    try:
         track = db.query(groove.db.track).filter(
             groove.db.track.c.id == track_id
         ).one()
     except (NoResultFound, MultipleResultsFound):
         return HTTPResponse(status=404, body="Not found")
 
-    path = groove.path.transcoded_media(track['relpath'])
+    settings = groove.settings.get()
+    path = settings.transcoded_media(track['relpath'])
     if not path.exists():
-        path = groove.path.media(track['relpath'])
+        path = settings.media(track['relpath'])
     logging.debug(f"Serving track {path.name}")
-    return static_file(path.name, root=path.parent)
+    return (
+        streaming.offload(path, cache_control=conditional.TRACKS) or
+        streaming.serve_file(path, cache_control=conditional.TRACKS)
+    )
 
 
 @server.route('/playlist/<slug>')
@@ -90,21 +221,57 @@ def serve_playlist(slug, db):
     """
     Retrieve a playlist and its entries by a slug.
     """
+    if not cache.known_slugs().contains(slug, db):
+        return HTTPResponse(status=404, body="Not found")
+
     logging.debug(f"Looking up playlist: {slug}...")
-    try:
-        playlist = Playlist.by_slug(slug, session=db)
-    except NoResultFound:
+    version = Playlist.version_by_slug(slug, session=db)
+    if version is None:
         logging.debug(f"Playist {slug} doesn't exist.")
         return HTTPResponse(status=404, body="Not found")
-    logging.debug(f"Loaded {playlist.record}")
-    logging.debug(playlist.as_dict['entries'])
 
-    pl = playlist.as_dict
-    for entry in pl['entries']:
-        sig = requests.encode([str(entry['track_id'])], uri='/track')
-        entry['url'] = f"/track/{sig}/{entry['track_id']}"
+    theme = themes.load_theme()
+    headers = {
+        'ETag': page_etag('playlist', theme, slug, version, requests.signer().epoch),
+        'Cache-Control': conditional.REVALIDATE,
+    }
+    if conditional.not_modified(headers['ETag']):
+        return conditional.not_modified_response(headers)
+
+    page = cache.pages().get(slug, headers['ETag'])
+    if page is not None:
+        logging.debug(f"Serving cached page for {slug}")
+        return HTTPResponse(status=200, headers=headers, body=page)
+
+    # Only a page that has to be rendered reads the snapshot's data.
+    pl = _playlist(slug, snapshots.read(db, slug), db)
+    if pl is None:  # pragma: no cover
+        logging.debug(f"Playist {slug} doesn't exist.")
+        return HTTPResponse(status=404, body="Not found")
+
+    response = serve('playlist', theme=theme, headers=headers, playlist=pl)
+    cache.pages().set(slug, headers['ETag'], response.body)
+    return response
+
 
-    return serve('playlist', playlist=pl)
+def _playlist(slug, snapshot, db) -> Union[dict, None]:
+    """
+    Return a playlist and its entries, with signed URLs, from its snapshot if it has one, or else from its entries.
+    """
+    if snapshot:
+        pl = snapshot.playlist
+        if snapshot.epoch != requests.signer().epoch:
+            # The key has been rotated or the signatures have expired since the snapshot was written.
+            requests.sign_entries(pl['entries'])
+        return pl
+    try:
+        playlist = Playlist.by_slug(slug, session=db)
+    except NoResultFound:
+        return None
+    logging.debug(f"Loaded {playlist.record} without a snapshot")
+    pl = playlist.as_dict
+    requests.sign_entries(pl['entries'])
+    return pl
 
 
 @server.route('/build')
@@ -113,14 +280,27 @@ def build():
     return "Authenticated. Groovy."
 
 
+@server.route('/stats')
+@bottle.auth_basic(is_authenticated)
+def serve_stats(db):
+    """
+    Return the number of playlists, entries and tracks in the database.
+    """
+    return HTTPResponse(
+        status=200,
+        content_type='application/json',
+        headers={'Cache-Control': conditional.REVALIDATE},
+        body=json.dumps(counters.get(db)._asdict())
+    )
+
+
 @bottle.auth_basic(is_authenticated)
 @server.route('/build/search/playlist/<slug>')
 def search_playlist(slug, db):
-    try:
-        playlist = Playlist.by_slug(slug, session=db)
-    except NoResultFound:
+    pl = _playlist(slug, snapshots.read(db, slug), db)
+    if pl is None:
         logging.debug(f"Playlist {slug} doesn't exist.")
         body = {}
     else:
-        body = json.dumps(playlist.as_dict)
+        body = json.dumps(pl)
     return HTTPResponse(status=200, content_type='application/json', body=body)
@@ -1,13 +1,18 @@
 import pytest
 import os
+import re
 
 from pathlib import Path
 from dotenv import load_dotenv
 
+import groove.cache
 import groove.db
+import groove.settings
+from groove.db.migrations import migrate
 from groove.playlist import Playlist
+from groove.webserver import assets, themes
 
-from sqlalchemy import create_engine, insert
+from sqlalchemy import create_engine, event, insert
 from sqlalchemy.orm import sessionmaker
 
 from unittest.mock import MagicMock
@@ -19,6 +24,11 @@ def env(monkeypatch):
     monkeypatch.setattr('groove.path.root', MagicMock(return_value=str(root)))
     load_dotenv(Path('test/fixtures/env'))
     os.environ['MEDIA_ROOT'] = str(root / Path('media'))
+    os.environ['CACHE_ROOT'] = str(root / Path('cache'))
+    groove.settings.reset()
+    groove.cache.reset()
+    themes.reset()
+    assets.reset()
     return os.environ
 
 
@@ -43,10 +53,27 @@ def in_memory_db(in_memory_engine):
     Session = sessionmaker(bind=in_memory_engine, future=True)
     session = Session()
     groove.db.metadata.create_all(bind=in_memory_engine)
+    migrate(in_memory_engine)
     yield session
     session.close()
 
 
+@pytest.fixture(scope='function')
+def statements(in_memory_engine):
+    """
+    Record the SELECT, UPDATE and DELETE statements, and queries with a WITH clause, executed by the database engine.
+    """
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if re.match(r'\s*(WITH|SELECT|UPDATE|DELETE)\b', statement):
+            recorded.append((statement, parameters))
+
+    event.listen(in_memory_engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(in_memory_engine, 'before_cursor_execute', record)
+
+
 @pytest.fixture(scope='function')
 def db(in_memory_db):
     """
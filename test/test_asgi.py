@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+
+from concurrent.futures import Executor, Future
+
+from groove.webserver import asgi, requests, webserver
+
+
+class InlineExecutor(Executor):
+    """
+    Run jobs in the calling thread, so the in-memory test database can be shared with the routes.
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class SessionPlugin:
+    name = 'test_db'
+    api = 2
+
+    def __init__(self, session):
+        self.session = session
+
+    def apply(self, callback, route):
+        if 'db' not in route.get_callback_args():
+            return callback
+
+        def wrapper(*args, **kwargs):
+            kwargs['db'] = self.session
+            return callback(*args, **kwargs)
+        return wrapper
+
+
+@pytest.fixture
+def app(db):
+    plugin = webserver.server.install(SessionPlugin(db))
+    yield asgi.Application(webserver.server, executor=InlineExecutor())
+    webserver.server.uninstall(plugin)
+
+
+def request(app, path, method='GET', headers=None, disconnect=False):
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(name.lower().encode(), value.encode()) for (name, value) in (headers or {}).items()],
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    if disconnect:
+        messages.append({'type': 'http.disconnect'})
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+        await asyncio.sleep(0)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return (start['status'], dict((k.decode(), v.decode()) for (k, v) in start['headers']), body, sent)
+
+
+def test_environ():
+    env = asgi.environ({
+        'method': 'GET',
+        'path': '/static/test.css',
+        'query_string': b'v=1',
+        'headers': [(b'range', b'bytes=0-1'), (b'accept', b'a'), (b'accept', b'b')],
+    })
+    assert env['PATH_INFO'] == '/static/test.css'
+    assert env['QUERY_STRING'] == 'v=1'
+    assert env['HTTP_RANGE'] == 'bytes=0-1'
+    assert env['HTTP_ACCEPT'] == 'a,b'
+
+
+def test_playlist(app):
+    (status, headers, body, _) = request(app, '/playlist/playlist-one')
+    assert status == 200
+    assert headers['content-type'].startswith('text/html')
+    (status, _, _, _) = request(app, '/playlist/playlist-one', headers={'If-None-Match': headers['etag']})
+    assert status == 304
+    (status, _, _, _) = request(app, '/playlist/nope')
+    assert status == 404
+
+
+def test_track(app):
+    path = f"/track/{requests.encode(['1'], '/track')}/1"
+    (status, headers, body, sent) = request(app, path)
+    assert status == 200
+    assert len(body) == int(headers['content-length'])
+    assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+
+    (status, headers, ranged, _) = request(app, path, headers={'Range': 'bytes=2-5'})
+    assert status == 206
+    assert ranged == body[2:6]
+
+    (status, _, _, _) = request(app, f"/track/{requests.encode(['2'], '/track')}/1")
+    assert status == 404
+
+
+def test_track_disconnect(app):
+    path = f"/track/{requests.encode(['1'], '/track')}/1"
+    (status, _, _, sent) = request(app, path, disconnect=True)
+    assert status == 200
+    assert sent[-1].get('more_body', True)
+
+
+def test_static(app):
+    (status, _, body, _) = request(app, '/static/test.css')
+    assert status == 200
+    assert body == b'/* test.css */\n'
+
+
+def test_head(app):
+    (status, headers, body, _) = request(app, '/static/test.css', method='HEAD')
+    assert status == 200
+    assert body == b''
@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+import pytest
+
+from boddle import boddle
+
+import groove.settings
+from groove.webserver import assets, conditional, themes, webserver
+
+
+@pytest.fixture
+def built(tmp_path):
+    with groove.settings.override(assets_root=tmp_path):
+        yield assets.build()
+
+
+def test_build(built, tmp_path):
+    assert set(built) == set(themes.registry().available())
+    manifest = json.loads((tmp_path / 'default_theme' / 'manifest.json').read_text())
+    hashed = manifest['test.css']
+    assert hashed.startswith('test.') and hashed.endswith('.css')
+    content = (tmp_path / 'default_theme' / hashed).read_bytes()
+    assert gzip.decompress((tmp_path / 'default_theme' / (hashed + '.gz')).read_bytes()) == content
+    assert not (tmp_path / 'default_theme' / (manifest['favicon.ico'] + '.gz')).exists()
+
+
+def test_url_uses_manifest(built):
+    theme = themes.load_theme('default_theme')
+    assert assets.url('test.css', theme) == f"/static/{built['default_theme']['test.css']}"
+
+
+def test_url_without_build():
+    theme = themes.load_theme('default_theme')
+    assert assets.url('test.css', theme).startswith('/static/test.css?v=')
+    assert assets.url('missing.css', theme) == '/static/missing.css'
+
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=0, deflate', None),
+    ('', None),
+])
+def test_serve_built_asset(built, accept, encoding):
+    with boddle(headers={'Accept-Encoding': accept}):
+        response = webserver.serve_static(built['default_theme']['test.css'])
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == conditional.IMMUTABLE
+        assert response.headers['Content-Type'] == 'text/css'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.headers.get('Content-Encoding') == encoding
+
+
+@pytest.mark.parametrize('header, suffix, encoding', [
+    ('X-Accel-Redirect', '', None),
+    ('X-Sendfile', '.gz', 'gzip'),
+])
+def test_offload_built_asset(built, header, suffix, encoding):
+    hashed = built['default_theme']['test.css']
+    with groove.settings.override(sendfile_header=header):
+        with boddle(headers={'Accept-Encoding': 'gzip'}):
+            response = webserver.serve_static(hashed)
+    assert response.headers[header].endswith(f"/{hashed}{suffix}")
+    if header == 'X-Accel-Redirect':
+        assert response.headers[header].startswith('/_groove/assets/')
+    assert response.headers['Content-Type'] == 'text/css'
+    assert response.headers.get('Content-Encoding') == encoding
+    assert response.headers.get('Vary') == ('Accept-Encoding' if encoding else None)
+
+
+@pytest.mark.parametrize('relpath, source, expected', [
+    ('a.css', b'/* comment */\nbody {\n  color: red;\n  margin: 0 auto;\n}\n', b'body{color:red;margin:0 auto}\n'),
+    ('a.css', b'/*! license */ a :hover { }', b'/*! license */ a :hover{}\n'),
+    ('a.js', b'/*!\n * license\n */\n/**\n * doc\n */\nvar a = 1; // one\n\n  // two\n  a++;\n',
+     b'/*!\n* license\n*/\nvar a = 1; // one\na++;\n'),
+    ('a.png', b'  binary  ', b'  binary  '),
+])
+def test_minify(relpath, source, expected):
+    assert assets.minify(relpath, source) == expected
+
+
+def test_fingerprint_follows_edits(tmp_path):
+    path = tmp_path / 'styles.css'
+    path.write_text('/* original */')
+    os.utime(path, ns=(0, 1))
+    asset = themes.StaticFile(path, 1, path.stat().st_size)
+    original = assets.fingerprint(asset)
+    path.write_text('/* edited! */')
+    os.utime(path, ns=(0, 2))
+    assert assets.fingerprint(asset) != original
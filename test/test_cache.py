@@ -0,0 +1,145 @@
+import logging
+import pytest
+
+from unittest.mock import MagicMock
+
+import groove.settings
+from groove import cache
+
+
+@pytest.fixture
+def pages(tmp_path):
+    return cache.PageCache(size=2, path=tmp_path)
+
+
+def test_get_set(pages):
+    assert pages.get('slug', 'v1') is None
+    pages.set('slug', 'v1', 'page one')
+    assert pages.get('slug', 'v1') == 'page one'
+    assert pages.get('slug', 'v2') is None
+
+
+def test_eviction():
+    pages = cache.PageCache(size=2)
+    pages.set('one', 'v1', 'one')
+    pages.set('two', 'v1', 'two')
+    pages.get('one', 'v1')
+    pages.set('three', 'v1', 'three')
+    assert pages.get('two', 'v1') is None
+    assert pages.get('one', 'v1') == 'one'
+
+
+def test_disk_tier(pages, tmp_path):
+    pages.set('slug', '"v1"', 'page one')
+    restarted = cache.PageCache(size=2, path=tmp_path)
+    assert restarted.get('slug', '"v1"') == 'page one'
+
+
+def test_disk_tier_keeps_latest_version(pages, tmp_path):
+    pages.set('slug', '"v1"', 'page one')
+    pages.set('other', '"v1"', 'other page')
+    pages.set('slug', '"v2"', 'page two')
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['other.v1.html', 'slug.v2.html']
+    restarted = cache.PageCache(size=2, path=tmp_path)
+    assert restarted.get('slug', '"v1"') is None
+    assert restarted.get('slug', '"v2"') == 'page two'
+
+
+def test_invalidate(pages, tmp_path):
+    pages.set('slug', 'v1', 'page one')
+    pages.set('other', 'v1', 'other page')
+    pages.invalidate('slug')
+    assert pages.get('slug', 'v1') is None
+    assert pages.get('other', 'v1') == 'other page'
+    assert not list(tmp_path.glob('slug.*'))
+
+
+def test_disabled():
+    pages = cache.PageCache(size=0)
+    pages.set('slug', 'v1', 'page one')
+    assert pages.get('slug', 'v1') is None
+
+
+def test_configured_from_settings(tmp_path):
+    with groove.settings.override(page_cache_size=10, page_cache_disk=True, cache_root=tmp_path):
+        assert cache.pages().size == 10
+        assert cache.pages().path == tmp_path / 'pages'
+
+
+@pytest.fixture
+def keys():
+    rows = {'one', 'two'}
+    query = MagicMock(side_effect=lambda session: list(rows))
+    return (cache.KnownKeys('keys', query, interval=60), rows, query)
+
+
+def test_known_keys(keys):
+    (known, rows, query) = keys
+    assert known.contains('one', None)
+    assert not known.contains('three', None)
+    assert query.call_count == 1
+    known.add('three')
+    assert known.contains('three', None)
+    known.discard('one')
+    assert not known.contains('one', None)
+    assert query.call_count == 1
+
+
+def test_known_keys_reloaded(monkeypatch, keys):
+    (known, rows, query) = keys
+    now = 1000
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now)
+    assert not known.contains('three', None)
+    rows.add('three')
+    assert not known.contains('three', None)
+    assert query.call_count == 1
+    now += 60
+    assert known.contains('three', None)
+    assert query.call_count == 2
+
+
+def test_bitmap():
+    bitmap = cache.Bitmap([3, 1, 700])
+    assert (len(bitmap), bitmap.highest) == (3, 700)
+    assert 1 in bitmap and 700 in bitmap
+    assert 2 not in bitmap and 701 not in bitmap and 10 ** 6 not in bitmap
+    assert -1 not in bitmap and '1' not in bitmap
+    bitmap.add(1)
+    bitmap.discard(700)
+    bitmap.discard(5)
+    assert (len(bitmap), bitmap.highest) == (2, 700)
+    assert 700 not in bitmap
+
+
+def test_known_ids_reloaded(monkeypatch):
+    rows = [1, 2, 3]
+    query = MagicMock(side_effect=lambda session, after: [i for i in rows if i > after])
+    known = cache.KnownIds('ids', query, interval=60)
+    now = 1000
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now)
+    assert known.contains(2, None)
+    assert not known.contains(4, None)
+    rows.append(4)
+    now += 60
+    assert known.contains(4, None)
+    assert [call.args[1] for call in query.call_args_list] == [0, 3]
+    known.discard(4)
+    assert not known.contains(4, None)
+    assert known.load(None) == 4
+    assert query.call_args.args[1] == 0
+
+
+def test_known_keys_misses_logged(monkeypatch, caplog, keys):
+    (known, rows, query) = keys
+    now = 1000
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now)
+    with caplog.at_level(logging.INFO):
+        for n in range(100):
+            known.contains(f"missing-{n}", None)
+        now += cache.MISS_LOG_INTERVAL
+        known.contains('missing-100', None)
+    messages = [record.getMessage() for record in caplog.records if record.name == 'root']
+    assert messages == [
+        "Rejected 1 lookup(s) of unknown keys, most recently 'missing-0'.",
+        "Rejected 100 lookup(s) of unknown keys, most recently 'missing-100'.",
+    ]
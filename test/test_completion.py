@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+import threading
+
+from prompt_toolkit.completion import Completer, Completion
+from prompt_toolkit.document import Document
+from sqlalchemy import insert, update, delete, literal_column, text
+
+import groove.db
+import groove.settings
+from groove.db.completion import DebouncedCompleter, TrigramIndex, IndexCompleter
+from groove.db.manager import FuzzyTableCompleter, database_manager
+from groove.shell import interactive_shell
+
+
+@pytest.fixture
+def index(db):
+    return TrigramIndex(groove.db.track.c.relpath).build(db)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('unkle (main', ['UNKLE/Psyence Fiction/02 UNKLE (Main Title Theme).flac']),
+    ('BLOOD', ['UNKLE/Psyence Fiction/03 Bloodstain.flac']),
+    ('psyence', 3),
+    ('nope', []),
+    ('un', 3),
+    ('0', 3),
+    ('', 3),
+])
+def test_search(index, query, expected):
+    values = index.search(query)
+    if isinstance(expected, int):
+        assert len(values) == expected
+    else:
+        assert values == expected
+
+
+def test_search_best_first(index):
+    assert index.search('unkle', limit=1) == ['UNKLE/Psyence Fiction/03 Bloodstain.flac']
+    assert len(index.search('psyence', limit=2)) == 2
+
+
+def test_refresh(db, index):
+    db.execute(insert(groove.db.track), {'id': 4, 'relpath': 'Kid Koala/Drunk Trumpet.flac'})
+    db.execute(delete(groove.db.track).where(groove.db.track.c.id == 3))
+    db.execute(update(groove.db.track).where(groove.db.track.c.id == 1).values(relpath='UNKLE/Lonely Soul.flac'))
+    index.refresh(db)
+    assert index.search('koala') == ['Kid Koala/Drunk Trumpet.flac']
+    assert index.search('blood') == []
+    assert index.search('lonely') == []
+    index.refresh(db, ids=[1])
+    assert index.search('lonely') == ['UNKLE/Lonely Soul.flac']
+    assert index.search('guns') == []
+    assert len(index) == 3
+
+
+def test_completer(index):
+    completions = list(IndexCompleter(index, limit=2).get_completions(Document('fiction'), None))
+    assert len(completions) == 2
+    assert completions[0].start_position == -len('fiction')
+
+
+def test_shell_uses_index(in_memory_engine, db):
+    with groove.settings.override(completion_index=True):
+        with database_manager() as manager:
+            manager._session = db
+            interactive_shell.InteractiveShell(manager)
+            completer = manager.fuzzy_table_completer(groove.db.playlist, groove.db.playlist.c.name, str)
+            assert isinstance(completer, IndexCompleter)
+            db.execute(insert(groove.db.playlist), {'name': 'playlist four', 'slug': 'playlist-four'})
+            manager.refresh_completion_indexes(groove.db.playlist)
+            assert [c.text for c in completer.get_completions(Document('four'), None)] == ['playlist four']
+
+
+def test_shell_without_index(in_memory_engine, db):
+    assert not groove.settings.get().completion_index
+    with database_manager() as manager:
+        manager._session = db
+        interactive_shell.InteractiveShell(manager)
+        completer = manager.fuzzy_table_completer(groove.db.track, groove.db.track.c.relpath, str)
+        assert not isinstance(completer, IndexCompleter)
+
+
+class SlowCompleter(Completer):
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def get_completions(self, document, complete_event):
+        yield Completion('first')
+        self.cancelled.wait(5)
+        yield Completion('too late')
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+async def collect(completer, text, count=None):
+    completions = []
+    results = completer.get_completions_async(Document(text), None)
+    try:
+        async for completion in results:
+            completions.append(completion.text)
+            if len(completions) == count:
+                break
+    finally:
+        await results.aclose()
+    return completions
+
+
+def test_debounced(index):
+    completer = DebouncedCompleter(IndexCompleter(index, limit=2), delay=0)
+    assert len(asyncio.run(collect(completer, 'fiction'))) == 2
+
+
+def test_debounced_streams_and_cancels():
+    slow = SlowCompleter()
+    assert asyncio.run(collect(DebouncedCompleter(slow, delay=0), 'x', count=1)) == ['first']
+    assert slow.cancelled.is_set()
+
+
+def test_debounced_superseded(monkeypatch):
+    slow = SlowCompleter()
+    completer = DebouncedCompleter(slow, delay=0)
+    monkeypatch.setattr(completer, '_superseded', lambda document: True)
+    assert asyncio.run(collect(completer, 'x')) == []
+    assert not slow.cancelled.is_set()
+
+
+def test_cancel_lookup(monkeypatch, db):
+    forever = db.query(literal_column('x')).from_statement(
+        text("WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT x FROM n WHERE x < 0")
+    )
+    monkeypatch.setattr('groove.db.manager.search_query', lambda *args, **kwargs: forever)
+    completer = FuzzyTableCompleter(groove.db.track, groove.db.track.c.relpath, str, db)
+    threading.Timer(0.1, completer.cancel).start()
+    assert list(completer.get_completions(Document('fiction'), None)) == []
@@ -0,0 +1,25 @@
+from sqlalchemy import insert, delete
+
+import groove.db
+from groove.db import counters
+from groove.playlist import Playlist
+
+
+def test_get(db):
+    assert counters.get(db) == counters.Stats(playlists=4, entries=6, tracks=3)
+
+
+def test_counters_follow_writes(db):
+    playlist = Playlist.by_slug('playlist-one', session=db)
+    playlist.delete()
+    assert counters.get(db) == counters.Stats(playlists=3, entries=3, tracks=3)
+    db.execute(insert(groove.db.track), {'relpath': 'Kid Koala/Drunk Trumpet.flac'})
+    db.execute(delete(groove.db.track).where(groove.db.track.c.id == 1))
+    assert counters.get(db).tracks == 3
+
+
+def test_recount(db):
+    assert counters.recount(db) == {}
+    db.execute(groove.db.stats.update().where(groove.db.stats.c.name == 'tracks').values(value=42))
+    assert counters.recount(db) == {'tracks': (42, 3)}
+    assert counters.get(db).tracks == 3
@@ -0,0 +1,109 @@
+import pytest
+
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import groove.db
+import groove.settings
+from groove.db import migrations
+from groove.db.manager import DatabaseManager
+from groove.playlist import Playlist
+
+# The schema as it was created before migrations were introduced.
+LEGACY_SCHEMA = [
+    "CREATE TABLE track (id INTEGER NOT NULL PRIMARY KEY, relpath TEXT UNIQUE, artist TEXT, title TEXT)",
+    "CREATE TABLE playlist (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR, description TEXT, slug VARCHAR UNIQUE)",
+    "CREATE TABLE entry (track INTEGER NOT NULL, playlist_id INTEGER REFERENCES playlist (id), "
+    "track_id INTEGER REFERENCES track (id), PRIMARY KEY (playlist_id, track))",
+    "INSERT INTO track (id, relpath, artist, title) VALUES "
+    "(1, 'UNKLE/Psyence Fiction/01 Guns Blazing.flac', 'UNKLE', 'Guns Blazing'), "
+    "(2, 'UNKLE/Psyence Fiction/03 Bloodstain.flac', 'UNKLE', 'Bloodstain'), "
+    "(5, 'Kid Koala/Drunk Trumpet.flac', 'Kid Koala', 'Drunk Trumpet')",
+    "INSERT INTO playlist (id, name, description, slug) VALUES (1, 'playlist one', '', 'playlist-one')",
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'groove_on_demand.db'}", future=True)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def legacy(engine):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    return engine
+
+
+def integrity_check(conn, table):
+    conn.exec_driver_sql(f"INSERT INTO {table}_search({table}_search, rank) VALUES ('integrity-check', 1)")
+
+
+def test_fresh_database(engine):
+    groove.db.metadata.create_all(bind=engine)
+    assert migrations.version(engine) == 0
+    assert migrations.migrate(engine) == len(migrations.MIGRATIONS)
+    assert migrations.version(engine) == len(migrations.MIGRATIONS)
+    assert migrations.migrate(engine) == 0
+
+
+def test_search_indexes_retried(monkeypatch, engine):
+    groove.db.metadata.create_all(bind=engine)
+    rebuild = migrations.rebuild_search_index
+    monkeypatch.setattr(migrations, 'rebuild_search_index', MagicMock(
+        side_effect=OperationalError('CREATE VIRTUAL TABLE', None, Exception('no such module: fts5'))
+    ))
+    migrations.migrate(engine)
+    assert migrations.version(engine) == len(migrations.MIGRATIONS)
+    assert not migrations._search_indexes_exist(engine)
+    monkeypatch.setattr(migrations, 'rebuild_search_index', rebuild)
+    assert migrations.migrate(engine) == 1
+    assert migrations._search_indexes_exist(engine)
+    assert migrations.version(engine) == len(migrations.MIGRATIONS)
+    assert migrations.migrate(engine) == 0
+
+
+def test_upgrade_legacy_database(legacy, tmp_path):
+    settings = groove.settings.get().replace(database=tmp_path / 'groove_on_demand.db')
+    with DatabaseManager(settings=settings) as manager:
+        assert migrations.version(manager.engine) == len(migrations.MIGRATIONS)
+        assert manager.session.execute(text("SELECT version FROM playlist")).scalar() == 1
+        indexes = [row[1] for row in manager.session.execute(text("PRAGMA index_list(entry)"))]
+        assert 'ix_entry_track_id_playlist_id' in indexes
+        indexes = [row[1] for row in manager.session.execute(text("PRAGMA index_list(track)"))]
+        assert 'ix_track_artist_title' in indexes
+        assert not manager.session.execute(text("SELECT slug FROM playlist_snapshot")).all()
+        assert Playlist.refresh_snapshots(manager.session) == 1
+        snapshots = manager.session.execute(text("SELECT slug, version FROM playlist_snapshot")).all()
+        assert snapshots == [('playlist-one', 1)]
+        rows = groove.db.search(manager.session, groove.db.track, 'trumpet')
+        assert [row.id for row in rows] == [5]
+        manager.session.close()
+        manager.dispose()
+
+
+def test_rebuild_search_index_in_batches(legacy):
+    assert migrations.rebuild_search_index(legacy, 'track', batch_size=2) == 3
+    with legacy.begin() as conn:
+        integrity_check(conn, 'track')
+
+
+def test_changes_while_populating(legacy):
+    last = migrations._create_search_index(legacy, 'track')
+    with legacy.begin() as conn:
+        conn.exec_driver_sql("UPDATE track SET title = 'Lonely Soul' WHERE id = 1")
+        conn.exec_driver_sql("DELETE FROM track WHERE id = 2")
+        conn.exec_driver_sql(
+            "INSERT INTO track (relpath, artist, title) VALUES ('DJ Shadow/Midnight.flac', 'DJ Shadow', 'Midnight')"
+        )
+    assert migrations._populate_search_index(legacy, 'track', last, batch_size=1) == 1
+    with legacy.begin() as conn:
+        integrity_check(conn, 'track')
+        matches = conn.exec_driver_sql("SELECT rowid FROM track_search WHERE track_search MATCH 'unkle' ORDER BY rowid")
+        assert [row[0] for row in matches] == [1]
+        matches = conn.exec_driver_sql("SELECT rowid FROM track_search WHERE track_search MATCH 'midnight'")
+        assert len(matches.all()) == 1
@@ -0,0 +1,57 @@
+import pytest
+import random
+
+from groove.db.ordering import GAP, Changes, changes, keys
+
+
+def apply(stored, result):
+    removed = set(result.removed)
+    entries = [entry for entry in stored if entry[0] not in removed] + result.inserted
+    return sorted(entries)
+
+
+def test_keys():
+    assert keys(3) == [GAP, GAP * 2, GAP * 3]
+    assert keys(1, after=5) == [5 + GAP]
+    assert keys(0) == []
+
+
+@pytest.mark.parametrize('track_ids, expected', [
+    ([1, 2, 3], Changes(removed=[], inserted=[])),
+    ([1, 2, 3, 4], Changes(removed=[], inserted=[(GAP * 4, 4)])),
+    ([1, 3], Changes(removed=[GAP * 2], inserted=[])),
+    ([1, 4, 2, 3], Changes(removed=[], inserted=[(GAP + GAP // 2, 4)])),
+    ([2, 3, 1], Changes(removed=[GAP], inserted=[(GAP * 4, 1)])),
+    ([], Changes(removed=[GAP, GAP * 2, GAP * 3], inserted=[])),
+])
+def test_changes(track_ids, expected):
+    assert changes(list(zip(keys(3), [1, 2, 3])), track_ids) == expected
+
+
+def test_changes_duplicate_tracks():
+    stored = list(zip(keys(3), [1, 2, 1]))
+    result = changes(stored, [1, 1, 2, 1])
+    assert [track_id for (_, track_id) in apply(stored, result)] == [1, 1, 2, 1]
+    assert result == Changes(removed=[], inserted=[(GAP + GAP // 2, 1)])
+
+
+def test_changes_no_room():
+    stored = [(1, 1), (2, 2)]
+    assert changes(stored, [1, 3, 2]) is None
+    assert changes(stored, [3, 1, 2]) is None
+    assert changes(stored, [1, 2, 3]) == Changes(removed=[], inserted=[(2 + GAP, 3)])
+
+
+def test_changes_random_edits():
+    rnd = random.Random(45)
+    stored = list(zip(keys(200), [rnd.randint(1, 50) for _ in range(200)]))
+    for _ in range(50):
+        track_ids = [track_id for (_, track_id) in stored]
+        for _ in range(rnd.randint(1, 5)):
+            track_ids.insert(rnd.randint(0, len(track_ids)), track_ids.pop(rnd.randrange(len(track_ids))))
+        track_ids[rnd.randrange(len(track_ids))] = rnd.randint(1, 50)
+        result = changes(stored, track_ids)
+        assert result is not None
+        assert len(result.removed) <= 6
+        stored = apply(stored, result)
+        assert [track_id for (_, track_id) in stored] == track_ids
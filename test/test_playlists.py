@@ -3,7 +3,9 @@ import yaml
 
 from unittest.mock import MagicMock
 
+import groove.db
 from groove import playlist, editor
+from groove.db.ordering import GAP
 from groove.exceptions import PlaylistValidationError, TrackNotFoundError
 
 from yaml.scanner import ScannerError
@@ -57,6 +59,21 @@ def test_add_multiple_matches(empty_playlist):
     assert empty_playlist.add('UNKLE',) == 0
 
 
+def test_add_keeps_order_and_duplicates(db, empty_playlist):
+    assert empty_playlist.add(['03 blood', 'guns', '03 blood']) == 3
+    assert [entry.track_id for entry in empty_playlist.entries] == [3, 1, 3]
+
+
+def test_add_reports_every_error(empty_playlist):
+    with pytest.raises(TrackNotFoundError) as e:
+        empty_playlist.add(['no match', 'guns', 'unkle', 'nor this'])
+    assert str(e.value).split('\n') == [
+        'Could not find track for path "no match"',
+        'Could not find track for path "nor this"',
+        'Found 3 tracks matching for path "unkle"',
+    ]
+
+
 def test_delete(empty_playlist):
     expected = empty_playlist.record.id
     assert empty_playlist.delete() == expected
@@ -85,6 +102,18 @@ def test_entries(db):
     assert pl.entries
 
 
+def test_summaries(db):
+    db.execute(groove.db.track.update().where(groove.db.track.c.id != 3).values(duration=60.5))
+    summaries = playlist.Playlist.summaries(db)
+    assert [(pl.slug, pl.tracks, pl.duration) for pl in summaries] == [
+        ('playlist-one', 3, 121),
+        ('playlist-two', 1, 60.5),
+        ('playlist-three', 2, 60.5),
+        ('empty-playlist', 0, 0),
+    ]
+    assert summaries[0].url == playlist.Playlist.by_slug('playlist-one', session=db).url
+
+
 def test_playlist_not_exist_formatted(db):
     pl = playlist.Playlist(name='foo', slug='foo', session=db, create_ok=False)
     assert repr(pl)
@@ -131,6 +160,37 @@ def test_playlist_inequality_tracks_differ(db):
     assert pl != pl2
 
 
+def test_diff(db):
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    edited = playlist.Playlist.from_yaml({'Playlist One': {'description': 'the first one', 'entries': [
+        {'UNKLE': 'UNKLE'},
+        {'UNKLE': 'Bloodstain'},
+        {'UNKLE': 'Guns Blazing'},
+    ]}}, db)
+    changes = pl.diff(edited)
+    assert changes == (
+        {'name': ('playlist one', 'Playlist One')}, [], [], [(0, 2, 1)]
+    )
+    assert changes.entries_changed
+    edited._entries = [edited._entries[n] for n in (0, 1, 1)]
+    assert pl.diff(edited) == ({'name': ('playlist one', 'Playlist One')}, [(1, 3)], [(0, 1)], [])
+    assert not pl.diff(pl)
+    assert pl != edited
+
+
+def test_edit_details_only(monkeypatch, db, statements):
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    monkeypatch.setattr(pl._editor, 'edit', MagicMock(return_value={
+        'playlist one': {'description': 'edited', 'entries': [
+            {'UNKLE': 'Guns Blazing'}, {'UNKLE': 'UNKLE'}, {'UNKLE': 'Bloodstain'}
+        ]}
+    }))
+    pl.edit()
+    assert pl.description == 'edited'
+    assert not [statement for (statement, _) in statements if statement.startswith('DELETE FROM entry')]
+    assert [entry.track_id for entry in pl.entries] == [1, 2, 3]
+
+
 def test_as_yaml(db):
     expected = {
         'playlist one': {
@@ -152,6 +212,47 @@ def test_from_yaml(db):
     assert pl2 == pl
 
 
+def test_yaml_quoting(db):
+    db.execute(groove.db.track.insert(), {
+        'id': 4, 'relpath': 'odd.flac', 'artist': 'A "quoted": artist', 'title': 'C:\\x'
+    })
+    pl = playlist.Playlist.by_slug('playlist-two', db)
+    pl.create_entries(tracks(db, 4))
+    pl2 = playlist.Playlist.from_yaml(yaml.safe_load(pl.as_yaml), db)
+    assert [entry.id for entry in pl2._entries] == [1, 4]
+
+
+def test_editor_round_trip(monkeypatch, db):
+    monkeypatch.setattr('groove.editor.subprocess.check_call', MagicMock())
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    edits = editor.PlaylistEditor().edit(pl)
+    assert edits == yaml.safe_load(pl.as_yaml)
+    assert playlist.Playlist.from_yaml(edits, db) == pl
+
+
+def test_from_yaml_reports_every_missing_track(db):
+    with pytest.raises(TrackNotFoundError) as e:
+        playlist.Playlist.from_yaml({'new': {'description': '', 'entries': [
+            {'UNKLE': 'Nope'},
+            {'UNKLE': 'Bloodstain'},
+            {'Nobody': 'Guns Blazing'},
+        ]}}, db)
+    assert str(e.value).split('\n') == [
+        'Could not find track "UNKLE": "Nope"',
+        'Could not find track "Nobody": "Guns Blazing"',
+    ]
+
+
+def test_from_yaml_many_entries(db, statements):
+    ids = [(n * 7) % 3 + 1 for n in range(1000)]
+    titles = {1: 'Guns Blazing', 2: 'UNKLE', 3: 'Bloodstain'}
+    pl = playlist.Playlist.from_yaml({'new': {'description': '', 'entries': [
+        {'UNKLE': titles[id]} for id in ids
+    ]}}, db)
+    assert [track.id for track in pl._entries] == ids
+    assert len(statements) <= 2
+
+
 @pytest.mark.parametrize('src', [
     {'missing description': {'entries': []}},
     {'missing entries': {'description': 'foo'}},
@@ -214,3 +315,61 @@ def test_save_no_name(name, empty_playlist):
     empty_playlist._name = name
     with pytest.raises(PlaylistValidationError):
         empty_playlist.save()
+
+
+def test_version_changes_on_save(db):
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    version = playlist.Playlist.version_by_slug('playlist-one', db)
+    pl.save()
+    assert playlist.Playlist.version_by_slug('playlist-one', db) > version
+    assert playlist.Playlist.version_by_slug('no-such-playlist', db) is None
+
+
+def tracks(db, *ids):
+    rows = {row.id: row for row in db.query(groove.db.track)}
+    return [rows[id] for id in ids]
+
+
+def stored_entries(db, plid):
+    return [tuple(row) for row in db.query(groove.db.entry.c.track, groove.db.entry.c.track_id).filter(
+        groove.db.entry.c.playlist_id == plid
+    ).order_by(groove.db.entry.c.track)]
+
+
+def test_save_without_entries_keeps_them(db):
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    pl.save()
+    assert stored_entries(db, 1) == [(1, 1), (2, 2), (3, 3)]
+
+
+def test_save_entries_differential(db, empty_playlist):
+    empty_playlist._entries = tracks(db, 1, 2, 3)
+    empty_playlist.save()
+    assert stored_entries(db, 4) == [(GAP, 1), (GAP * 2, 2), (GAP * 3, 3)]
+
+    empty_playlist._entries = tracks(db, 3, 1, 2, 2)
+    assert empty_playlist.save_entries() == 3
+    empty_playlist.session.commit()
+    assert [track_id for (_, track_id) in stored_entries(db, 4)] == [3, 1, 2, 2]
+    assert stored_entries(db, 4)[1:2] == [(GAP, 1)]
+
+    empty_playlist._entries = []
+    empty_playlist.save()
+    assert stored_entries(db, 4) == []
+
+
+def test_save_entries_renumbers(db):
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    pl._entries = tracks(db, 1, 3, 2)
+    pl.save()
+    assert stored_entries(db, 1) == [(GAP, 1), (GAP * 2, 3), (GAP * 3, 2)]
+    assert [entry.track_id for entry in pl.entries] == [1, 3, 2]
+
+
+def test_create_entries(db):
+    pl = playlist.Playlist.by_slug('playlist-one', db)
+    version = playlist.Playlist.version_by_slug('playlist-one', db)
+    assert pl.create_entries(tracks(db, 2, 1)) == 2
+    assert pl.create_entries([]) == 0
+    assert stored_entries(db, 1)[3:] == [(3 + GAP, 2), (3 + GAP * 2, 1)]
+    assert playlist.Playlist.version_by_slug('playlist-one', db) == version + 1
@@ -0,0 +1,142 @@
+import os
+import signal
+import threading
+import time
+import urllib.request
+
+import pytest
+from unittest.mock import MagicMock
+
+from groove.exceptions import ConfigurationError
+from groove.webserver import prefork, streaming
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="requires os.fork")
+
+
+def pid_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+
+def get(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+        return int(response.read())
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = predicate()
+            if result:
+                return result
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise AssertionError("Timed out.")
+
+
+@pytest.fixture
+def listener():
+    sock = prefork.listen('127.0.0.1', 0)
+    yield sock
+    sock.close()
+
+
+def test_worker_max_requests(listener):
+    server = prefork.WorkerServer(pid_app, listener, handler=streaming.SendfileHandler, max_requests=2)
+    server.timeout = 0.05
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    port = listener.getsockname()[1]
+    assert get(port) == os.getpid()
+    assert get(port) == os.getpid()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert server.requests == 2
+
+
+def test_worker_finishes_requests_in_progress(listener):
+    started = threading.Event()
+
+    def slow_app(environ, start_response):
+        started.set()
+        time.sleep(0.5)
+        return pid_app(environ, start_response)
+
+    server = prefork.WorkerServer(slow_app, listener)
+    server.timeout = 0.05
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    responses = []
+    client = threading.Thread(target=lambda: responses.append(get(listener.getsockname()[1])))
+    client.start()
+    assert started.wait(timeout=5)
+    server.alive = False
+    client.join(timeout=5)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert responses == [os.getpid()]
+
+
+def failed_reload():
+    raise ConfigurationError("The media_root directory (MEDIA_ROOT) doesn't exist")
+
+
+@pytest.fixture
+def arbiter(request, listener):
+    port = listener.getsockname()[1]
+    listener.close()
+    on_reload = getattr(request, 'param', None)
+    pid = os.fork()
+    if not pid:  # pragma: no cover
+        status = 0
+        try:
+            prefork.Arbiter(
+                pid_app, '127.0.0.1', port, workers=2, max_requests=3, graceful_timeout=5, on_reload=on_reload
+            ).run()
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+    yield (pid, port)
+    os.kill(pid, signal.SIGTERM)
+    (_, status) = os.waitpid(pid, 0)
+    assert status == 0
+
+
+def test_arbiter(arbiter):
+    (pid, port) = arbiter
+    workers = set(wait_for(lambda: [get(port) for _ in range(12)]))
+    assert pid not in workers
+    # two workers, each replaced after three requests
+    assert len(workers) >= 4
+
+    os.kill(pid, signal.SIGHUP)
+    time.sleep(prefork.WorkerServer.timeout + 0.5)
+    reloaded = set(wait_for(lambda: [get(port) for _ in range(4)]))
+    assert not reloaded & workers
+
+
+@pytest.mark.parametrize('arbiter', [failed_reload], indirect=True)
+def test_arbiter_failed_reload(arbiter):
+    (pid, port) = arbiter
+    wait_for(lambda: get(port))
+    os.kill(pid, signal.SIGHUP)
+    time.sleep(prefork.WorkerServer.timeout + 0.5)
+    assert wait_for(lambda: [get(port) for _ in range(4)])
+
+
+def test_failed_reload_keeps_workers(monkeypatch):
+    arbiter = prefork.Arbiter(pid_app, '127.0.0.1', 0, on_reload=failed_reload)
+    arbiter._children = {1234: 0}
+    monkeypatch.setattr(arbiter, '_spawn', MagicMock())
+    monkeypatch.setattr(arbiter, '_retire', MagicMock())
+    arbiter.reload()
+    assert arbiter.pids == [1234]
+    assert not arbiter._spawn.called
+    assert not arbiter._retire.called
+
+
+def test_arbiter_serves_app_unwrapped():
+    assert prefork.Arbiter(pid_app, '127.0.0.1', 0).app is pid_app
@@ -0,0 +1,103 @@
+import pytest
+import re
+
+from boddle import boddle
+from unittest.mock import MagicMock
+
+import groove.db
+from groove import cache
+from groove.playlist import Playlist
+from groove.webserver import webserver
+
+
+def assert_indexed(db, statements):
+    assert statements
+    for (statement, parameters) in list(statements):
+        plan = [row[3] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        for step in plan:
+            assert not re.match(r'SCAN (entry|track|playlist)\b', step), f"{statement}\n{plan}"
+            assert 'TEMP B-TREE' not in step, f"{statement}\n{plan}"
+
+
+@pytest.fixture
+def known(db, statements):
+    """
+    Load the known slugs and track ids, as the webserver does on startup; loading them reads every row.
+    """
+    cache.known_slugs().load(db)
+    cache.known_tracks().load(db)
+    del statements[:]
+
+
+def test_serve_playlist(monkeypatch, known, db, statements):
+    monkeypatch.setattr(webserver.cache, 'pages', MagicMock(return_value=MagicMock(get=MagicMock(return_value=None))))
+    with boddle():
+        webserver.serve_playlist('playlist-one', db=db)
+    assert_indexed(db, statements)
+
+
+def test_search_playlist(auth, db, statements):
+    with boddle(auth=auth):
+        webserver.search_playlist('playlist-one', db)
+    assert_indexed(db, statements)
+
+
+def test_serve_track(monkeypatch, known, db, statements):
+    monkeypatch.setattr(webserver.requests, 'validate', MagicMock())
+    with boddle():
+        webserver.serve_track('ignored', '1', db=db)
+    assert_indexed(db, statements)
+
+
+def test_playlist_writes(db, statements):
+    playlist = Playlist.by_slug('playlist-one', session=db)
+    playlist.create_entries([db.query(groove.db.track).filter(groove.db.track.c.id == 1).one()])
+    playlist.save()
+    playlist.delete()
+    assert_indexed(db, statements)
+
+
+def test_playlists_containing_track(db, statements):
+    db.query(groove.db.entry.c.playlist_id).filter(groove.db.entry.c.track_id == 1).all()
+    assert_indexed(db, statements)
+
+
+def test_entries_without_playlist_join(db, statements):
+    playlist = Playlist.by_slug('playlist-one', session=db)
+    del statements[:]
+    assert len(playlist.entries) == 3
+    (statement, _) = statements[0]
+    assert re.search(r'FROM entry, track\s+WHERE', statement)
+    assert_indexed(db, statements)
+
+
+def test_from_yaml(db, statements):
+    Playlist.from_yaml({'new': {'description': '', 'entries': [
+        {'UNKLE': 'Bloodstain'}, {'UNKLE': 'Guns Blazing'}
+    ]}}, session=db)
+    assert_indexed(db, statements)
+
+
+def test_serve_playlist_snapshot(monkeypatch, known, db, statements):
+    monkeypatch.setattr(webserver.cache, 'pages', MagicMock(return_value=MagicMock(get=MagicMock(return_value=None))))
+    Playlist.by_slug('playlist-one', session=db).save()
+    del statements[:]
+    with boddle():
+        webserver.serve_playlist('playlist-one', db=db)
+    for (statement, _) in statements:
+        assert not re.search(r'\b(entry|track)\b', statement), statement
+    assert_indexed(db, statements)
+
+
+def test_serve_cached_playlist_skips_snapshot(known, db, statements):
+    Playlist.by_slug('playlist-one', session=db).save()
+    with boddle():
+        etag = webserver.serve_playlist('playlist-one', db=db).headers['ETag']
+    del statements[:]
+    with boddle():
+        assert webserver.serve_playlist('playlist-one', db=db).status_code == 200
+    with boddle(headers={'If-None-Match': etag}):
+        assert webserver.serve_playlist('playlist-one', db=db).status_code == 304
+    assert statements
+    for (statement, _) in statements:
+        assert 'playlist_snapshot' not in statement, statement
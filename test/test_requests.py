@@ -1,3 +1,6 @@
+from unittest.mock import MagicMock
+
+import groove.settings
 from groove.webserver import requests
 
 
@@ -8,8 +11,8 @@ def test_signing():
 
 def test_signing_wrong_secret_key(env):
     signed = requests.encode(['foo', 'bar'], uri='fnord')
-    env['SECRET_KEY'] = 'wrong key'
-    invalid = requests.encode(['foo', 'bar'], uri='fnord')
+    with groove.settings.override(secret_key='wrong key'):
+        invalid = requests.encode(['foo', 'bar'], uri='fnord')
     assert not requests.verify(invalid, signed)
 
 
@@ -17,3 +20,46 @@ def test_signing_wrong_uri(env):
     signed = requests.encode(['foo', 'bar'], uri='fnord')
     invalid = requests.encode(['foo', 'bar'], uri='a bad guess')
     assert not requests.verify(invalid, signed)
+
+
+def test_signatures_are_cached(monkeypatch):
+    signer = requests.signer()
+    assert requests.signer() is signer
+    signed = signer.sign('fnord')
+    monkeypatch.setattr(signer, '_digest', MagicMock(side_effect=AssertionError))
+    assert signer.sign('fnord') == signed
+
+
+def test_signature_cache_is_bounded():
+    signer = requests.Signer('fnord', cache_size=2)
+    for request in ('one', 'two', 'three'):
+        signer.sign(request)
+    assert len(signer._cache) == 2
+
+
+def test_validate():
+    signed = requests.encode(['1'], uri='/track')
+    assert requests.validate(signed, ['1'], '/track')
+    assert not requests.validate(signed, ['2'], '/track')
+    assert not requests.validate(signed + '.ff', ['1'], '/track')
+
+
+def test_rotate_key(env):
+    signed = requests.encode(['1'], uri='/track')
+    with groove.settings.override(previous_secret_key=env['SECRET_KEY'], secret_key='new key'):
+        assert requests.encode(['1'], uri='/track') != signed
+        assert requests.validate(signed, ['1'], '/track')
+        with groove.settings.override(previous_secret_key=None):
+            assert not requests.validate(signed, ['1'], '/track')
+
+
+def test_expiring_signatures(monkeypatch):
+    signer = requests.Signer('fnord', ttl=60)
+    monkeypatch.setattr(requests.time, 'time', MagicMock(return_value=1000))
+    signed = signer.sign('fnord')
+    assert signed.endswith(f".{(1000 // 60 + 2) * 60:x}")
+    assert signer.validate('fnord', signed)
+    assert not signer.validate('fnord', signed.split('.')[0])
+    assert not signer.validate('fnord', signed.split('.')[0] + '.zz')
+    monkeypatch.setattr(requests.time, 'time', MagicMock(return_value=1000 + 121))
+    assert not signer.validate('fnord', signed)
@@ -15,6 +15,7 @@ def test_scanner(monkeypatch, in_memory_db):
         return {
             'artist': 'foo',
             'title': 'bar',
+            'duration': 245.5,
         }
     monkeypatch.setattr(scanner.MediaScanner, '_get_tags', MagicMock(side_effect=mock_loader))
     test_scanner = scanner.MediaScanner(path=Path('UNKLE'), db=in_memory_db)
@@ -30,8 +31,14 @@ def test_scanner(monkeypatch, in_memory_db):
     # verify idempotency
     assert test_scanner.scan() == 0
 
+    # verify durations are filled in for tracks imported without one
+    in_memory_db.execute(track.update().values(duration=None))
+    assert test_scanner.scan() == 0
+    assert in_memory_db.query(track.c.duration).scalar() == 245.5
+
 
 def test_scanner_no_media_root(in_memory_db):
     del os.environ['MEDIA_ROOT']
+    groove.settings.reset()
     with pytest.raises(groove.exceptions.ConfigurationError):
         assert scanner.MediaScanner(path=None, db=in_memory_db)
@@ -0,0 +1,52 @@
+import pytest
+
+from prompt_toolkit.document import Document
+from sqlalchemy import insert, update, delete
+
+import groove.db
+from groove.db.manager import FuzzyTableCompleter
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('unkle', ['UNKLE/Psyence Fiction/02 UNKLE (Main Title Theme).flac']),
+    ('blood', ['UNKLE/Psyence Fiction/03 Bloodstain.flac']),
+    ('psyence', 3),
+    ('nope', []),
+    ('un', 3),
+])
+def test_search(db, query, expected):
+    rows = groove.db.search(db, groove.db.track, query)
+    if isinstance(expected, int):
+        assert len(rows) == expected
+    elif expected:
+        assert rows[0]['relpath'] == expected[0]
+    else:
+        assert rows == []
+
+
+def test_search_limit(db):
+    assert len(groove.db.search(db, groove.db.track, 'psyence', limit=2)) == 2
+
+
+def test_search_playlists(db):
+    rows = groove.db.search(db, groove.db.playlist, 'three')
+    assert [row['slug'] for row in rows] == ['playlist-three']
+
+
+def test_search_index_follows_changes(db):
+    db.execute(insert(groove.db.track), {'relpath': 'Kid Koala/Drunk Trumpet.flac', 'artist': 'Kid Koala'})
+    assert len(groove.db.search(db, groove.db.track, 'koala')) == 1
+    db.execute(update(groove.db.track).where(groove.db.track.c.artist == 'Kid Koala').values(
+        relpath='Kid Koala/Basin Street Blues.flac'
+    ))
+    assert groove.db.search(db, groove.db.track, 'trumpet') == []
+    assert len(groove.db.search(db, groove.db.track, 'basin')) == 1
+    db.execute(delete(groove.db.track).where(groove.db.track.c.artist == 'Kid Koala'))
+    assert groove.db.search(db, groove.db.track, 'koala') == []
+
+
+def test_completer(db):
+    completer = FuzzyTableCompleter(groove.db.track, groove.db.track.c.relpath, lambda row: row.relpath, db, limit=2)
+    completions = list(completer.get_completions(Document('fiction'), None))
+    assert len(completions) == 2
+    assert completions[0].start_position == -len('fiction')
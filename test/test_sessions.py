@@ -0,0 +1,131 @@
+import io
+import pytest
+import sqlite3
+import threading
+
+import bottle
+from sqlalchemy import insert, func, select
+from sqlalchemy.exc import OperationalError
+
+import groove.db
+import groove.settings
+from groove.db.manager import DatabaseManager
+from groove.webserver.sessions import SessionPlugin
+
+
+@pytest.fixture
+def manager(tmp_path):
+    settings = groove.settings.get().replace(database=tmp_path / 'groove_on_demand.db', db_pool_size=2)
+    with DatabaseManager(settings=settings) as manager:
+        yield manager
+        manager.dispose()
+
+
+@pytest.fixture
+def app(manager):
+    app = bottle.Bottle()
+    app.install(SessionPlugin(manager))
+
+    @app.get('/count')
+    def count(db):
+        return str(db.execute(select(func.count(groove.db.track.c.id))).scalar())
+
+    @app.post('/add')
+    def add(db):
+        db.execute(insert(groove.db.track), {'artist': 'a', 'title': 't', 'relpath': 'a/t.flac'})
+        return 'ok'
+
+    @app.post('/fail')
+    def fail(db):
+        db.execute(insert(groove.db.track), {'artist': 'b', 'title': 't', 'relpath': 'b/t.flac'})
+        raise RuntimeError('nope')
+
+    @app.get('/write')
+    def write(db):
+        db.execute(insert(groove.db.track), {'artist': 'c', 'title': 't', 'relpath': 'c/t.flac'})
+        return 'ok'
+
+    return app
+
+
+def call(app, method, path):
+    environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO()}
+    status = []
+    body = app(environ, lambda s, h, exc_info=None: status.append(s))
+    return (int(status[0].split()[0]), b''.join(body).decode())
+
+
+def test_reads_and_writes(app):
+    assert call(app, 'GET', '/count') == (200, '0')
+    assert call(app, 'POST', '/add') == (200, 'ok')
+    assert call(app, 'GET', '/count') == (200, '1')
+
+
+def test_rollback_on_error(app):
+    (status, _) = call(app, 'POST', '/fail')
+    assert status == 500
+    assert call(app, 'GET', '/count') == (200, '0')
+
+
+def test_get_is_read_only(app):
+    (status, _) = call(app, 'GET', '/write')
+    assert status == 500
+    assert call(app, 'GET', '/count') == (200, '0')
+
+
+def test_reader_rejects_writes(manager):
+    with pytest.raises(OperationalError):
+        manager.readers().execute(insert(groove.db.track), {'artist': 'a', 'title': 't', 'relpath': 'a/t.flac'})
+    manager.readers.remove()
+
+
+def test_readers_are_thread_local(manager):
+    sessions = []
+
+    def read():
+        sessions.append(manager.readers())
+        manager.readers().execute(select(func.count(groove.db.track.c.id))).scalar()
+        manager.readers.remove()
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sessions[0] is not sessions[1]
+
+
+def test_pragmas(manager):
+    with manager.engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1
+        assert conn.exec_driver_sql('PRAGMA temp_store').scalar() == 2
+    with manager.reader.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == 5000
+        assert conn.exec_driver_sql('PRAGMA cache_size').scalar() == -16384
+
+
+def test_readers_not_blocked_by_writer(manager):
+    writer = manager.writers()
+    writer.execute(insert(groove.db.track), {'artist': 'a', 'title': 't', 'relpath': 'a/t.flac'})
+    writer.flush()
+    assert manager.readers().execute(select(func.count(groove.db.track.c.id))).scalar() == 0
+    writer.commit()
+    manager.readers.remove()
+    assert manager.readers().execute(select(func.count(groove.db.track.c.id))).scalar() == 1
+    manager.readers.remove()
+    manager.writers.remove()
+
+
+@pytest.mark.parametrize('close', [True, False])
+def test_dispose(manager, close):
+    with manager.reader.connect() as conn:
+        inherited = conn.connection.dbapi_connection
+    manager.dispose(close=close)
+    if close:
+        with pytest.raises(sqlite3.ProgrammingError):
+            inherited.execute('SELECT 1')
+    else:
+        assert inherited.execute('SELECT 1').fetchone() == (1,)
+    with manager.reader.connect() as conn:
+        assert conn.connection.dbapi_connection is not inherited
@@ -0,0 +1,60 @@
+import pytest
+
+from unittest.mock import MagicMock
+
+import groove.path
+import groove.settings
+from groove.exceptions import ConfigurationError
+from groove.media import scanner
+
+
+def test_resolved_once(monkeypatch, env):
+    secret_key = env['SECRET_KEY']
+    settings = groove.settings.get()
+    assert settings.media_root == groove.path.media_root()
+    assert settings.secret_key == secret_key
+    monkeypatch.setattr(groove.path, 'media_root', MagicMock(side_effect=AssertionError))
+    monkeypatch.setenv('SECRET_KEY', 'changed')
+    assert groove.settings.get() is settings
+    assert groove.settings.get().secret_key == secret_key
+
+
+def test_invalid(monkeypatch):
+    monkeypatch.setenv('MEDIA_ROOT', '/dev/null/missing')
+    with pytest.raises(ConfigurationError):
+        groove.settings.Settings.from_environ()
+
+
+def test_override():
+    settings = groove.settings.get()
+    with groove.settings.override(default_theme='fnord') as overridden:
+        assert groove.settings.get() is overridden
+        assert overridden.default_theme == 'fnord'
+        assert overridden.media_root == settings.media_root
+    assert groove.settings.get() is settings
+
+
+def test_reload(monkeypatch, tmp_path):
+    config_file = tmp_path / 'defaults'
+    config_file.write_text('SECRET_KEY=rotated\n')
+    groove.settings.configure(groove.settings.Settings.from_environ(config_file=config_file))
+    monkeypatch.setenv('SECRET_KEY', 'unchanged')
+    assert groove.settings.reload().secret_key == 'rotated'
+
+
+def test_injected(in_memory_db, tmp_path):
+    settings = groove.settings.get().replace(media_root=tmp_path, media_glob=('*.ogg',))
+    test_scanner = scanner.MediaScanner(db=in_memory_db, settings=settings)
+    assert test_scanner.root == tmp_path
+    assert test_scanner.glob == ('*.ogg',)
+
+
+def test_sqlite_pragmas(monkeypatch):
+    monkeypatch.setenv('SQLITE_PRAGMAS', 'mmap_size=0, busy_timeout=100')
+    pragmas = dict(groove.settings.Settings.from_environ().sqlite_pragmas)
+    assert pragmas['mmap_size'] == '0'
+    assert pragmas['busy_timeout'] == '100'
+    assert pragmas['journal_mode'] == 'wal'
+    monkeypatch.setenv('SQLITE_PRAGMAS', 'journal_mode=wal; DROP TABLE track')
+    with pytest.raises(ConfigurationError):
+        groove.settings.Settings.from_environ()
@@ -0,0 +1,144 @@
+import pytest
+
+from boddle import boddle
+from unittest.mock import MagicMock
+from sqlalchemy import update
+
+import groove.db
+from groove.db import snapshots
+from groove.playlist import Playlist
+from groove.webserver import requests, webserver
+
+
+def test_save_writes_snapshot(db):
+    pl = Playlist.by_slug('playlist-one', db)
+    assert snapshots.read(db, 'playlist-one') is None
+    pl.save()
+    snapshot = snapshots.read(db, 'playlist-one')
+    assert snapshot.version == Playlist.version_by_slug('playlist-one', db)
+    playlist = snapshot.playlist
+    assert playlist['name'] == 'playlist one'
+    assert [entry['track_id'] for entry in playlist['entries']] == [1, 2, 3]
+    assert playlist['entries'][0]['url'] == f"/track/{requests.encode(['1'], uri='/track')}/1"
+    assert playlist['url'] == pl.url
+
+
+def test_create_entries_updates_snapshot(db):
+    pl = Playlist.by_slug('playlist-two', db)
+    pl.create_entries([db.query(groove.db.track).filter(groove.db.track.c.id == 3).one()])
+    snapshot = snapshots.read(db, 'playlist-two')
+    assert snapshot.version == Playlist.version_by_slug('playlist-two', db)
+    assert [entry['track_id'] for entry in snapshot.playlist['entries']] == [1, 3]
+
+
+def test_changes_drop_snapshots(db):
+    Playlist.refresh_snapshots(db)
+    db.execute(update(groove.db.track).where(groove.db.track.c.id == 2).values(title='Retitled'))
+    assert snapshots.read(db, 'playlist-one') is None
+    assert snapshots.read(db, 'playlist-two') is not None
+    assert Playlist.refresh_snapshots(db) == 2
+    assert snapshots.read(db, 'playlist-one').playlist['entries'][1]['title'] == 'Retitled'
+
+    Playlist.by_slug('playlist-two', db).delete()
+    assert snapshots.read(db, 'playlist-two') is None
+
+
+def test_stale_signatures(db):
+    Playlist.by_slug('playlist-one', db).save()
+    playlist = snapshots.read(db, 'playlist-one').playlist
+    for entry in playlist['entries']:
+        entry['url'] = 'expired'
+    db.execute(update(groove.db.playlist_snapshot).values(epoch='rotated', data=snapshots.dumps(playlist)))
+    snapshot = snapshots.read(db, 'playlist-one')
+    assert snapshot.playlist['entries'][0]['url'] == 'expired'
+    pl = webserver._playlist('playlist-one', snapshot, db)
+    assert pl['entries'][0]['url'] == f"/track/{requests.encode(['1'], uri='/track')}/1"
+
+
+def test_serve_from_snapshot(db):
+    Playlist.by_slug('playlist-one', db).save()
+    with boddle():
+        from_snapshot = webserver.serve_playlist('playlist-one', db)
+    db.execute(groove.db.playlist_snapshot.delete())
+    with boddle():
+        from_entries = webserver.serve_playlist('playlist-one', db)
+    assert from_snapshot.status_code == 200
+    assert from_snapshot.body == from_entries.body
+
+
+def rebuilt(db, slug):
+    snapshot = snapshots.read(db, slug)
+    db.execute(groove.db.playlist_snapshot.delete())
+    Playlist.refresh_snapshots(db)
+    return (snapshot, snapshots.read(db, slug))
+
+
+@pytest.mark.parametrize('edit', [
+    lambda ids: ids,
+    lambda ids: ids + [1, 2],
+    lambda ids: [2] + ids,
+    lambda ids: ids[:1] + [3] + ids[1:],
+    lambda ids: ids[1:],
+    lambda ids: ids[1:] + ids[:1],
+    lambda ids: ids[::-1],
+    lambda ids: [],
+])
+def test_save_patches_snapshot(db, edit):
+    pl = Playlist.by_slug('playlist-one', db)
+    pl.save()
+    tracks = {row.id: row for row in db.query(groove.db.track)}
+    pl._entries = [tracks[id] for id in edit([entry.track_id for entry in pl.entries])]
+    pl.save()
+    (patched, expected) = rebuilt(db, 'playlist-one')
+    assert patched.version == expected.version
+    assert patched.playlist == expected.playlist
+
+
+def test_create_entries_patches_snapshot(monkeypatch, db):
+    pl = Playlist.by_slug('playlist-one', db)
+    pl.save()
+    monkeypatch.setattr(pl, '_write_snapshot', MagicMock(side_effect=AssertionError("rebuilt")))
+    pl.create_entries([db.query(groove.db.track).filter(groove.db.track.c.id == 2).one()])
+    (patched, expected) = rebuilt(db, 'playlist-one')
+    assert patched.playlist == expected.playlist
+    assert patched.data == expected.data
+
+
+def test_details_patch_snapshot(db):
+    pl = Playlist.by_slug('playlist-one', db)
+    pl.save()
+    pl._description = 'Described.'
+    pl.save()
+    (patched, expected) = rebuilt(db, 'playlist-one')
+    assert patched.playlist['description'] == 'Described.'
+    assert patched.playlist == expected.playlist
+
+
+def test_patch_in_another_epoch(db):
+    pl = Playlist.by_slug('playlist-one', db)
+    pl.save()
+    db.execute(update(groove.db.playlist_snapshot).values(epoch='rotated'))
+    pl.create_entries([db.query(groove.db.track).filter(groove.db.track.c.id == 2).one()])
+    assert snapshots.read(db, 'playlist-one').epoch == requests.signer().epoch
+
+
+@pytest.mark.parametrize('removed, inserted', [
+    ([], [1500]),
+    ([1024, 51200], [10, 2048 * 26, 200000]),
+    (list(range(1024, 102401, 2048)), list(range(1, 100, 3))),
+])
+def test_patch(db, removed, inserted):
+    def entry(key):
+        return {'track': key, 'track_id': key % 7, 'title': f"Track\t{key}\n"}
+
+    def playlist(keys):
+        return {'id': 1, 'slug': 'playlist-one', 'version': 2, 'entries': [entry(key) for key in sorted(keys)]}
+
+    keys = range(1024, 102401, 1024)
+    snapshots.write(db, playlist(keys), sign=lambda entries: 'epoch')
+    previous = snapshots.read(db, 'playlist-one')
+    details = {key: value for (key, value) in playlist([]).items() if key != 'entries'}
+    assert snapshots.patch(db, previous, details, removed, [entry(key) for key in inserted], sign=lambda e: 'epoch')
+    expected = playlist([key for key in keys if key not in removed] + inserted)
+    assert snapshots.read(db, 'playlist-one').data == snapshots.dumps(expected)
+    assert not snapshots.patch(db, previous, details, removed, [], sign=lambda entries: 'rotated')
@@ -0,0 +1,169 @@
+import os
+import pytest
+import socket
+import threading
+import urllib.request
+
+import bottle
+from boddle import boddle
+from paste import httpserver
+
+import groove.path
+import groove.settings
+from groove.exceptions import ConfigurationError
+from groove.webserver import streaming
+
+TRACK = 'UNKLE/Psyence Fiction/01 Guns Blazing (Drums of Death, Part 1).flac'
+
+
+@pytest.fixture
+def track():
+    return groove.path.media(TRACK)
+
+
+def body(response):
+    return b''.join(bytes(chunk) for chunk in response.body)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-3', [(0, 3)]),
+    ('bytes=16-', [(16, 19)]),
+    ('bytes=-4', [(16, 19)]),
+    ('bytes=0-99', [(0, 19)]),
+    ('bytes=0-3,2-5,10-11', [(0, 5), (10, 11)]),
+    ('bytes=99-', []),
+    ('bytes=3-1', None),
+    ('bytes=a-b', None),
+    ('items=0-3', None),
+    ('bytes=', None),
+])
+def test_parse_range(header, expected):
+    assert streaming.parse_range(header, 20) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=-5', 'bytes=0-', 'bytes=0-0'])
+def test_parse_range_empty(header):
+    assert streaming.parse_range(header, 0) == []
+
+
+def test_serve_file(track):
+    with boddle():
+        response = streaming.serve_file(track)
+        assert response.status_code == 200
+        assert response.headers['Content-Length'] == '20'
+        assert response.headers['ETag'].startswith('"')
+        assert body(response) == b'DRUMS OF DEATH YALL\n'
+
+
+def test_serve_file_missing(track):
+    with boddle():
+        response = streaming.serve_file(track.parent / 'nope.flac')
+        assert response.status_code == 404
+
+
+def test_serve_single_range(track):
+    with boddle(headers={'Range': 'bytes=6-7'}):
+        response = streaming.serve_file(track)
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == 'bytes 6-7/20'
+        assert body(response) == b'OF'
+
+
+def test_serve_multiple_ranges(track):
+    with boddle(headers={'Range': 'bytes=0-4,15-18'}):
+        response = streaming.serve_file(track)
+        assert response.status_code == 206
+        assert response.headers['Content-Type'].startswith('multipart/byteranges')
+        content = body(response)
+        assert int(response.headers['Content-Length']) == len(content)
+        assert b'Content-Range: bytes 0-4/20\r\n\r\nDRUMS\r\n' in content
+        assert b'Content-Range: bytes 15-18/20\r\n\r\nYALL\r\n' in content
+
+
+def test_serve_unsatisfiable_range(track):
+    with boddle(headers={'Range': 'bytes=50-60'}):
+        response = streaming.serve_file(track)
+        assert response.status_code == 416
+        assert response.headers['Content-Range'] == 'bytes */20'
+
+
+def test_serve_empty_file_range(tmp_path):
+    empty = tmp_path / 'empty.flac'
+    empty.write_bytes(b'')
+    with boddle(headers={'Range': 'bytes=-5'}):
+        response = streaming.serve_file(empty)
+        assert response.status_code == 416
+        assert response.headers['Content-Range'] == 'bytes */0'
+
+
+@pytest.mark.parametrize('matches', [True, False])
+def test_serve_if_range(track, matches):
+    tag = streaming.etag(os.stat(track)) if matches else '"stale"'
+    with boddle(headers={'Range': 'bytes=6-7', 'If-Range': tag}):
+        response = streaming.serve_file(track)
+        assert response.status_code == (206 if matches else 200)
+
+
+def test_file_range_read(track):
+    with open(track, 'rb') as fh:
+        file_range = streaming.FileRange(fh, 6, 8)
+        assert file_range.read(2) == b'OF'
+        assert file_range.read() == b' DEATH'
+        assert file_range.read() == b''
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('X-Accel-Redirect', (
+        '/_groove/media/UNKLE/Psyence%20Fiction/'
+        '01%20Guns%20Blazing%20%28Drums%20of%20Death%2C%20Part%201%29.flac'
+    )),
+    ('X-Sendfile', None),
+])
+def test_offload(track, header, expected):
+    with groove.settings.override(sendfile_header=header):
+        response = streaming.offload(track)
+    assert response.status_code == 200
+    assert response.headers[header] == (expected or str(track.absolute()))
+    assert response.headers['Content-Type'] == 'audio/flac'
+
+
+def test_offload_disabled(track):
+    with groove.settings.override(sendfile_header=None):
+        assert streaming.offload(track) is None
+
+
+def test_offload_invalid_header(track):
+    with groove.settings.override(sendfile_header='X-Bogus'):
+        with pytest.raises(ConfigurationError):
+            streaming.offload(track)
+
+
+@pytest.fixture
+def sendfile_server(track):
+    app = bottle.Bottle()
+    app.route('/track', callback=lambda: streaming.serve_file(track))
+    server = httpserver.serve(
+        app, host='127.0.0.1', port=0, handler=streaming.SendfileHandler, start_loop=False
+    )
+    thread = threading.Thread(target=server.handle_request, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/track"
+    thread.join(timeout=5)
+    server.server_close()
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({}, b'DRUMS OF DEATH YALL\n'),
+    ({'Range': 'bytes=6-7'}, b'OF'),
+])
+def test_sendfile_handler(monkeypatch, sendfile_server, headers, expected):
+    calls = []
+    sendfile = socket.socket.sendfile
+
+    def spy(self, file, offset=0, count=None):
+        calls.append((offset, count))
+        return sendfile(self, file, offset=offset, count=count)
+    monkeypatch.setattr(socket.socket, 'sendfile', spy)
+    with urllib.request.urlopen(urllib.request.Request(sendfile_server, headers=headers), timeout=5) as response:
+        assert response.read() == expected
+    assert calls == [(6 if headers else 0, len(expected))]
@@ -1,6 +1,13 @@
+import os
+import shutil
+import time
+
 import pytest
+from unittest.mock import MagicMock
+
+import groove.path
 from groove.webserver import themes
-from groove.exceptions import ThemeConfigurationError
+from groove.exceptions import ThemeConfigurationError, ThemeMissingException
 
 
 def test_load_theme():
@@ -14,3 +21,63 @@ def test_load_theme():
 def test_load_broken_theme():
     with pytest.raises(ThemeConfigurationError):
         themes.load_theme('alt_theme')
+
+
+@pytest.fixture
+def theme_root(tmp_path):
+    root = tmp_path / 'themes'
+    shutil.copytree(groove.path.themes_root() / 'default_theme', root / 'default_theme')
+    return root
+
+
+def test_registry_parses_once(monkeypatch):
+    parser = MagicMock(side_effect=themes._get_theme_info)
+    monkeypatch.setattr(themes, '_get_theme_info', parser)
+    for _ in range(3):
+        themes.load_theme('default_theme')
+    assert parser.call_count == 1
+
+
+def test_registry_styles():
+    assert themes.registry().styles('default_theme')
+    assert themes.registry().styles('alt_theme') == {}
+
+
+def test_registry_static_files():
+    registry = themes.registry()
+    assert registry.static('test.css', 'default_theme').path.name == 'test.css'
+    assert registry.static('favicon.ico', 'default_theme').path.parent == groove.path.static_root()
+    assert registry.static('missing.css', 'default_theme') is None
+
+
+def test_registry_reloads_on_change(theme_root):
+    registry = themes.ThemeRegistry(root=theme_root, interval=0.01)
+    assert registry.theme('default_theme').version == '1.3'
+    readme = theme_root / 'default_theme' / 'README.md'
+    readme.write_text(readme.read_text().replace('version: 1.3', 'version: 1.4'))
+    os.utime(readme, ns=(0, 0))
+    time.sleep(0.02)
+    assert registry.theme('default_theme').version == '1.4'
+
+
+def test_registry_reloads_on_static_change(theme_root):
+    registry = themes.ThemeRegistry(root=theme_root, interval=0.01)
+    asset = registry.static('test.css', 'default_theme')
+    asset.path.write_text('/* edited */')
+    os.utime(asset.path, ns=(0, 0))
+    time.sleep(0.02)
+    assert registry.static('test.css', 'default_theme').mtime_ns == 0
+
+
+def test_registry_reload(theme_root):
+    registry = themes.ThemeRegistry(root=theme_root, interval=0)
+    registry.preload()
+    (theme_root / 'default_theme' / 'static' / 'new.css').write_text('/* new */')
+    assert registry.static('new.css', 'default_theme') is None
+    registry.reload()
+    assert registry.static('new.css', 'default_theme')
+
+
+def test_registry_missing_theme():
+    with pytest.raises(ThemeMissingException):
+        themes.registry().theme('no_such_theme')
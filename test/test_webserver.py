@@ -1,3 +1,4 @@
+import json
 import pytest
 import sys
 
@@ -6,7 +7,9 @@ import bottle
 from boddle import boddle
 from unittest.mock import MagicMock
 
-from groove.webserver import webserver
+import groove.settings
+from groove.exceptions import ConfigurationError
+from groove.webserver import assets, conditional, webserver
 
 
 def test_server():
@@ -20,12 +23,20 @@ def test_server():
     ('99', 404)
 ])
 def test_serve_track(monkeypatch, track_id, expected, db):
-    monkeypatch.setattr(webserver.requests, 'verify', MagicMock())
+    monkeypatch.setattr(webserver.requests, 'validate', MagicMock())
     with boddle():
         response = webserver.serve_track('ignored', track_id, db=db)
         assert response.status_code == expected
 
 
+def test_serve_track_signed(db):
+    with boddle():
+        response = webserver.serve_track(webserver.requests.encode(['1'], '/track'), '1', db=db)
+        assert response.status_code == 200
+        response = webserver.serve_track(webserver.requests.encode(['2'], '/track'), '1', db=db)
+        assert response.status_code == 404
+
+
 def test_static_not_from_theme():
     with boddle():
         response = webserver.serve_static('favicon.ico')
@@ -90,3 +101,112 @@ def test_playlist_on_empty_db(in_memory_db):
     with boddle():
         response = webserver.serve_playlist('some-slug', in_memory_db)
         assert response.status_code == 404
+
+
+def test_unknown_playlist(db, statements):
+    with boddle():
+        assert webserver.serve_playlist('playlist-one', db).status_code == 200
+        del statements[:]
+        assert webserver.serve_playlist('wp-login.php', db).status_code == 404
+    assert not statements
+
+
+def test_playlist_known_once_saved(db):
+    with boddle():
+        assert webserver.serve_playlist('new-playlist', db).status_code == 404
+    webserver.Playlist('new playlist', session=db, create_ok=True).save()
+    with boddle():
+        assert webserver.serve_playlist('new-playlist', db).status_code == 200
+    webserver.Playlist.by_slug('new-playlist', db).delete()
+    with boddle():
+        assert webserver.serve_playlist('new-playlist', db).status_code == 404
+
+
+def test_playlist_forgotten_once_renamed(monkeypatch, db):
+    with boddle():
+        assert webserver.serve_playlist('playlist-one', db).status_code == 200
+    playlist = webserver.Playlist.by_slug('playlist-one', db)
+    monkeypatch.setattr(playlist._editor, 'edit', MagicMock(return_value={
+        'renamed': {'description': 'the first one', 'entries': [{'UNKLE': 'Guns Blazing'}]}
+    }))
+    playlist.edit()
+    monkeypatch.setattr(webserver.snapshots, 'read', MagicMock(side_effect=AssertionError))
+    with boddle():
+        assert webserver.serve_playlist('playlist-one', db).status_code == 404
+
+
+def test_playlist_not_modified(db):
+    with boddle():
+        response = webserver.serve_playlist('playlist-one', db)
+        etag = response.headers['ETag']
+    with boddle(headers={'If-None-Match': etag}):
+        response = webserver.serve_playlist('playlist-one', db)
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+
+def test_playlist_etag_changes_on_save(db):
+    with boddle():
+        etag = webserver.serve_playlist('playlist-one', db).headers['ETag']
+    playlist = webserver.Playlist.by_slug('playlist-one', db)
+    playlist.save()
+    with boddle(headers={'If-None-Match': etag}):
+        response = webserver.serve_playlist('playlist-one', db)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+
+def test_track_not_modified(monkeypatch, db):
+    monkeypatch.setattr(webserver.requests, 'validate', MagicMock())
+    with boddle():
+        response = webserver.serve_track('ignored', '1', db=db)
+        assert response.headers['Cache-Control'] == conditional.TRACKS
+        last_modified = response.headers['Last-Modified']
+    with boddle(headers={'If-Modified-Since': last_modified}):
+        response = webserver.serve_track('ignored', '1', db=db)
+        assert response.status_code == 304
+
+
+def test_static_fingerprinted():
+    version = assets.fingerprint(webserver.themes.registry().static('test.css', 'default_theme'))
+    assert assets.url('test.css', theme=webserver.themes.load_theme()) == f"/static/test.css?v={version}"
+    with boddle(query={'v': version}):
+        response = webserver.serve_static('test.css')
+        assert response.headers['Cache-Control'] == conditional.IMMUTABLE
+    with boddle(headers={'If-None-Match': f'"{version}"'}):
+        response = webserver.serve_static('test.css')
+        assert response.status_code == 304
+        assert response.headers['Cache-Control'] == conditional.REVALIDATE
+
+
+def test_static_missing():
+    with boddle():
+        response = webserver.serve_static('no-such-file.css')
+        assert response.status_code == 404
+
+
+def test_playlist_page_cache(monkeypatch, db):
+    with boddle():
+        first = webserver.serve_playlist('playlist-one', db)
+    monkeypatch.setattr(webserver.Playlist, 'by_slug', MagicMock(side_effect=AssertionError))
+    with boddle():
+        second = webserver.serve_playlist('playlist-one', db)
+        assert second.status_code == 200
+        assert second.body == first.body
+
+
+def test_serve_stats(auth, db):
+    with boddle(auth=auth):
+        response = webserver.serve_stats(db)
+        assert response.status_code == 200
+        assert json.loads(response.body) == {'playlists': 4, 'entries': 6, 'tracks': 3}
+
+
+def test_failed_reload_on_signal(monkeypatch, caplog):
+    settings = groove.settings.get()
+    monkeypatch.setattr(groove.settings.Settings, 'from_environ', MagicMock(
+        side_effect=ConfigurationError("The media_root directory (MEDIA_ROOT) doesn't exist")
+    ))
+    webserver._reload_on_signal(None, None)
+    assert groove.settings.get() is settings
+    assert "Could not reload" in caplog.text